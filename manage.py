@@ -3,6 +3,7 @@ from flask_migrate import MigrateCommand
 from flask_script import Manager
 
 from server import bootstrap_app
+from server.services.data_ingest.data_retention_service import DataRetentionService
 from server.services.users.authentication_service import AuthenticationService
 from server.services.users.user_service import UserService, UserDTO
 
@@ -41,5 +42,12 @@ def create_admin(username: str, password: str):
     UserService.create_user(dto)
 
 
+@manager.option('-d', '--dry_run', action='store_true', default=False, help='Log what would be removed')
+@manager.option('-a', '--archive_dir', help='Directory to archive removed data to, as gzipped CSV')
+def apply_retention(archive_dir: str = None, dry_run: bool = False):
+    """ Creates upcoming dmis_data partitions and removes data older than the configured retention period """
+    DataRetentionService.apply_retention(archive_dir, dry_run)
+
+
 if __name__ == '__main__':
     manager.run()
@@ -0,0 +1,41 @@
+"""Composite source index and latest row table for dmis_data
+
+Revision ID: 16a3bd6f893c
+Revises: d0fec9cf65e4
+Create Date: 2026-10-18 10:03:27.540912
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '16a3bd6f893c'
+down_revision = 'd0fec9cf65e4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_dmis_data_data_source_data_received', 'dmis_data',
+                    ['data_source', sa.text('data_received DESC')], unique=False)
+    op.create_table('dmis_data_latest',
+    sa.Column('data_source', sa.String(), nullable=False),
+    sa.Column('data_id', sa.BigInteger(), nullable=False),
+    sa.Column('data_received', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('data_source')
+    )
+
+    # Populate with the latest row we already hold for each source
+    op.execute('''
+        INSERT INTO dmis_data_latest (data_source, data_id, data_received)
+        SELECT DISTINCT ON (data_source) data_source, data_id, data_received
+          FROM dmis_data
+         WHERE data_source IS NOT NULL AND data_received IS NOT NULL
+         ORDER BY data_source, data_received DESC
+    ''')
+
+
+def downgrade():
+    op.drop_table('dmis_data_latest')
+    op.drop_index('ix_dmis_data_data_source_data_received', table_name='dmis_data')
@@ -0,0 +1,108 @@
+"""Partition dmis_data by month on data_received
+
+Requires PostgreSQL 11 or later, for the default partition and the primary key on the partitioned table
+
+Revision ID: 90b03c789b86
+Revises: 16a3bd6f893c
+Create Date: 2026-10-18 11:42:09.118520
+
+"""
+import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '90b03c789b86'
+down_revision = '16a3bd6f893c'
+branch_labels = None
+depends_on = None
+
+MONTHS_AHEAD = 3
+MIN_SERVER_VERSION = 110000  # server_version_num of PostgreSQL 11
+
+
+def create_indexes():
+    op.create_index(op.f('ix_dmis_data_data_id'), 'dmis_data', ['data_id'], unique=False)
+    op.create_index('ix_dmis_data_json_data', 'dmis_data', ['json_data'], unique=False, postgresql_using='gin',
+                    postgresql_ops={'json_data': 'jsonb_path_ops'})
+    op.create_index('ix_dmis_data_data_source_data_received', 'dmis_data',
+                    ['data_source', sa.text('data_received DESC')], unique=False)
+
+
+def drop_indexes():
+    op.drop_index('ix_dmis_data_data_source_data_received', table_name='dmis_data')
+    op.drop_index('ix_dmis_data_json_data', table_name='dmis_data')
+    op.drop_index(op.f('ix_dmis_data_data_id'), table_name='dmis_data')
+
+
+def upgrade():
+    server_version = int(op.get_bind().execute('SHOW server_version_num').scalar())
+    if server_version < MIN_SERVER_VERSION:
+        raise RuntimeError(f'Partitioning dmis_data requires PostgreSQL 11 or later, the server is version '
+                           f'{server_version // 10000}.  Upgrade the server before running this migration')
+
+    drop_indexes()
+    op.execute('ALTER TABLE dmis_data RENAME TO dmis_data_unpartitioned')
+    op.execute('ALTER TABLE dmis_data_unpartitioned DROP CONSTRAINT dmis_data_pkey')
+
+    # data_received is the partition key so can no longer be null
+    op.execute('UPDATE dmis_data_unpartitioned SET data_received = now() WHERE data_received IS NULL')
+
+    op.execute('''
+        CREATE TABLE dmis_data (
+            data_id BIGINT NOT NULL DEFAULT nextval('dmis_data_data_id_seq'),
+            data_source VARCHAR,
+            json_data JSONB,
+            data_received TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            CONSTRAINT dmis_data_pkey PRIMARY KEY (data_id, data_received)
+        ) PARTITION BY RANGE (data_received)
+    ''')
+    op.execute('ALTER SEQUENCE dmis_data_data_id_seq OWNED BY dmis_data.data_id')
+    op.execute('CREATE TABLE dmis_data_default PARTITION OF dmis_data DEFAULT')
+
+    # Monthly partitions from the oldest data we hold, until a few months ahead.  The apply_retention command keeps
+    # creating them from then on
+    oldest_received = op.get_bind().execute('SELECT min(data_received) FROM dmis_data_unpartitioned').scalar()
+    month_start = (oldest_received or datetime.datetime.now()).replace(day=1, hour=0, minute=0, second=0,
+                                                                        microsecond=0)
+    last_month = datetime.datetime.now().replace(day=1)
+    for _ in range(MONTHS_AHEAD):
+        last_month = (last_month + datetime.timedelta(days=32)).replace(day=1)
+
+    while month_start <= last_month:
+        next_month = (month_start + datetime.timedelta(days=32)).replace(day=1)
+        op.execute(f"CREATE TABLE dmis_data_p{month_start:%Y%m} PARTITION OF dmis_data "
+                   f"FOR VALUES FROM ('{month_start:%Y-%m-%d}') TO ('{next_month:%Y-%m-%d}')")
+        month_start = next_month
+
+    op.execute('''
+        INSERT INTO dmis_data (data_id, data_source, json_data, data_received)
+        SELECT data_id, data_source, json_data, data_received FROM dmis_data_unpartitioned
+    ''')
+    op.execute('DROP TABLE dmis_data_unpartitioned')
+    create_indexes()
+
+
+def downgrade():
+    drop_indexes()
+    op.execute('ALTER TABLE dmis_data RENAME TO dmis_data_partitioned')
+    op.execute('ALTER TABLE dmis_data_partitioned DROP CONSTRAINT dmis_data_pkey')
+    op.execute('''
+        CREATE TABLE dmis_data (
+            data_id BIGINT NOT NULL DEFAULT nextval('dmis_data_data_id_seq'),
+            data_source VARCHAR,
+            json_data JSONB,
+            data_received TIMESTAMP WITHOUT TIME ZONE,
+            CONSTRAINT dmis_data_pkey PRIMARY KEY (data_id)
+        )
+    ''')
+    op.execute('ALTER SEQUENCE dmis_data_data_id_seq OWNED BY dmis_data.data_id')
+    op.execute('''
+        INSERT INTO dmis_data (data_id, data_source, json_data, data_received)
+        SELECT data_id, data_source, json_data, data_received FROM dmis_data_partitioned
+    ''')
+    # Dropping the partitioned table drops all its partitions
+    op.execute('DROP TABLE dmis_data_partitioned')
+    create_indexes()
@@ -0,0 +1,26 @@
+"""Add a heartbeat to ingest jobs
+
+Revision ID: a8d4e1f6c273
+Revises: f7c2a5e9b314
+Create Date: 2026-10-18 23:05:41.638204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8d4e1f6c273'
+down_revision = 'f7c2a5e9b314'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('ingest_jobs', sa.Column('heartbeat', sa.DateTime(), nullable=True))
+    # Jobs already processing are timed from when they started, as before
+    op.execute('UPDATE ingest_jobs SET heartbeat = started WHERE started IS NOT NULL')
+
+
+def downgrade():
+    op.drop_column('ingest_jobs', 'heartbeat')
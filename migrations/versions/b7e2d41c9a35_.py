@@ -0,0 +1,37 @@
+"""Ingest job queue for data pushes
+
+Revision ID: b7e2d41c9a35
+Revises: 90b03c789b86
+Create Date: 2026-10-18 18:20:41.307215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e2d41c9a35'
+down_revision = '90b03c789b86'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ingest_jobs',
+    sa.Column('job_id', sa.BigInteger(), nullable=False),
+    sa.Column('data_source', sa.String(), nullable=False),
+    sa.Column('payload', sa.Text(), nullable=True),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('error', sa.String(), nullable=True),
+    sa.Column('created', sa.DateTime(), nullable=False),
+    sa.Column('started', sa.DateTime(), nullable=True),
+    sa.Column('finished', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('job_id')
+    )
+    op.create_index('ix_ingest_jobs_status_job_id', 'ingest_jobs', ['status', 'job_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_ingest_jobs_status_job_id', table_name='ingest_jobs')
+    op.drop_table('ingest_jobs')
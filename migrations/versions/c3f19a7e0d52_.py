@@ -0,0 +1,37 @@
+"""Stream ingest job payloads through large objects
+
+Revision ID: c3f19a7e0d52
+Revises: b7e2d41c9a35
+Create Date: 2026-10-18 19:05:12.648301
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3f19a7e0d52'
+down_revision = 'b7e2d41c9a35'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('ingest_jobs', sa.Column('payload_oid', postgresql.OID(), nullable=True))
+    # Move the payloads of any jobs still waiting into large objects
+    op.execute('''
+        UPDATE ingest_jobs SET payload_oid = lo_from_bytea(0, convert_to(payload, 'UTF8'))
+         WHERE payload IS NOT NULL
+    ''')
+    op.drop_column('ingest_jobs', 'payload')
+
+
+def downgrade():
+    op.add_column('ingest_jobs', sa.Column('payload', sa.Text(), nullable=True))
+    op.execute('''
+        UPDATE ingest_jobs SET payload = convert_from(lo_get(payload_oid), 'UTF8')
+         WHERE payload_oid IS NOT NULL
+    ''')
+    op.execute('SELECT lo_unlink(payload_oid) FROM ingest_jobs WHERE payload_oid IS NOT NULL')
+    op.drop_column('ingest_jobs', 'payload_oid')
@@ -0,0 +1,34 @@
+"""Store dmis_data.json_data as JSONB with a GIN index
+
+Revision ID: d0fec9cf65e4
+Revises: 5e1509728327
+Create Date: 2026-10-18 09:12:41.118304
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'd0fec9cf65e4'
+down_revision = '5e1509728327'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.alter_column('dmis_data', 'json_data',
+                    existing_type=postgresql.JSON(astext_type=sa.Text()),
+                    type_=postgresql.JSONB(astext_type=sa.Text()),
+                    postgresql_using='json_data::jsonb')
+    op.create_index(op.f('ix_dmis_data_json_data'), 'dmis_data', ['json_data'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'json_data': 'jsonb_path_ops'})
+
+
+def downgrade():
+    op.drop_index(op.f('ix_dmis_data_json_data'), table_name='dmis_data')
+    op.alter_column('dmis_data', 'json_data',
+                    existing_type=postgresql.JSONB(astext_type=sa.Text()),
+                    type_=postgresql.JSON(astext_type=sa.Text()),
+                    postgresql_using='json_data::json')
@@ -0,0 +1,53 @@
+"""Per-feature storage of ingested layers
+
+Revision ID: d4a8c61f2e97
+Revises: c3f19a7e0d52
+Create Date: 2026-10-18 20:14:37.512094
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4a8c61f2e97'
+down_revision = 'c3f19a7e0d52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS postgis')
+    op.create_table('dmis_features',
+    sa.Column('feature_id', sa.BigInteger(), nullable=False),
+    sa.Column('data_id', sa.BigInteger(), nullable=False),
+    sa.Column('data_source', sa.String(), nullable=False),
+    sa.Column('feature_index', sa.Integer(), nullable=False),
+    sa.Column('properties', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+    sa.PrimaryKeyConstraint('feature_id')
+    )
+    op.execute('ALTER TABLE dmis_features ADD COLUMN geometry geometry')
+    op.create_index('ix_dmis_features_data_id_feature_index', 'dmis_features', ['data_id', 'feature_index'],
+                    unique=False)
+    op.create_index('ix_dmis_features_data_source', 'dmis_features', ['data_source'], unique=False)
+    op.create_index('ix_dmis_features_geometry', 'dmis_features', ['geometry'], unique=False, postgresql_using='gist')
+
+    # Split the latest FeatureCollection ingested for each source into features.  Lightning is read from S3 instead
+    op.execute('''
+        INSERT INTO dmis_features (data_id, data_source, feature_index, properties, geometry)
+        SELECT d.data_id, d.data_source, f.ordinality - 1, f.feature -> 'properties',
+               ST_SetSRID(ST_GeomFromGeoJSON(f.feature ->> 'geometry'),
+                          COALESCE(NULLIF(split_part(d.json_data #>> '{crs,properties,name}', ':', 2), '')::integer, 0))
+          FROM dmis_data_latest l
+          JOIN dmis_data d ON d.data_id = l.data_id AND d.data_received = l.data_received
+         CROSS JOIN LATERAL jsonb_array_elements(d.json_data -> 'features') WITH ORDINALITY f(feature, ordinality)
+         WHERE d.json_data ->> 'type' = 'FeatureCollection' AND d.data_source <> 'earthnetworks_lightning'
+    ''')
+
+
+def downgrade():
+    op.drop_index('ix_dmis_features_geometry', table_name='dmis_features')
+    op.drop_index('ix_dmis_features_data_source', table_name='dmis_features')
+    op.drop_index('ix_dmis_features_data_id_feature_index', table_name='dmis_features')
+    op.drop_table('dmis_features')
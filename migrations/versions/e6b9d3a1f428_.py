@@ -0,0 +1,53 @@
+"""Key stored features for delta ingest
+
+Revision ID: e6b9d3a1f428
+Revises: d4a8c61f2e97
+Create Date: 2026-10-18 21:02:48.193570
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6b9d3a1f428'
+down_revision = 'd4a8c61f2e97'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('dmis_features', sa.Column('feature_key', sa.String(), nullable=True))
+    op.add_column('dmis_features', sa.Column('content_hash', sa.String(), nullable=True))
+    # Keyed as ingest keys them, on OBJECTID or FID, falling back to position if missing or repeated.  Hashes are left
+    # empty, so each feature is rewritten by the next push
+    op.execute('''
+        UPDATE dmis_features f SET feature_key = k.feature_key
+          FROM (SELECT feature_id,
+                       CASE WHEN feature_id_attribute IS NOT NULL AND row_number() OVER (
+                                 PARTITION BY data_source, feature_id_attribute ORDER BY feature_index) = 1
+                            THEN feature_id_attribute
+                            ELSE COALESCE(feature_id_attribute, '') || '#' || feature_index END AS feature_key
+                  FROM (SELECT feature_id, data_source, feature_index,
+                               COALESCE(properties ->> 'OBJECTID', properties ->> 'FID') AS feature_id_attribute
+                          FROM dmis_features) i) k
+         WHERE f.feature_id = k.feature_id
+    ''')
+    op.alter_column('dmis_features', 'feature_key', nullable=False)
+
+    op.drop_index('ix_dmis_features_data_source', table_name='dmis_features')
+    op.drop_index('ix_dmis_features_data_id_feature_index', table_name='dmis_features')
+    op.create_index('ix_dmis_features_data_source_feature_key', 'dmis_features', ['data_source', 'feature_key'],
+                    unique=True)
+    op.create_index('ix_dmis_features_data_source_feature_index', 'dmis_features', ['data_source', 'feature_index'],
+                    unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_dmis_features_data_source_feature_index', table_name='dmis_features')
+    op.drop_index('ix_dmis_features_data_source_feature_key', table_name='dmis_features')
+    op.create_index('ix_dmis_features_data_id_feature_index', 'dmis_features', ['data_id', 'feature_index'],
+                    unique=False)
+    op.create_index('ix_dmis_features_data_source', 'dmis_features', ['data_source'], unique=False)
+    op.drop_column('dmis_features', 'content_hash')
+    op.drop_column('dmis_features', 'feature_key')
@@ -0,0 +1,25 @@
+"""Drop the GIN index on dmis_data.json_data
+
+Revision ID: f7c2a5e9b314
+Revises: e6b9d3a1f428
+Create Date: 2026-10-18 22:14:05.402817
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'f7c2a5e9b314'
+down_revision = 'e6b9d3a1f428'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # No query reads the index, and maintaining it on multi MB FeatureCollections slows every ingest
+    op.drop_index('ix_dmis_data_json_data', table_name='dmis_data')
+
+
+def downgrade():
+    op.create_index('ix_dmis_data_json_data', 'dmis_data', ['json_data'], unique=False, postgresql_using='gin',
+                    postgresql_ops={'json_data': 'jsonb_path_ops'})
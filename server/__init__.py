@@ -79,9 +79,9 @@ def define_flask_restful_routes(app):
     app.logger.debug('Initialising API Routes')
     api = Api(app, default_mediatype='application/json')
 
-    from server.api.data_api import DataAPI
+    from server.api.data_api import DataAPI, DataJobAPI
     from server.api.layer_api import LayerListAPI, LayerAPI
-    from server.api.maps_api import MapsAPI
+    from server.api.maps_api import MapsAPI, MapsBatchAPI
     from server.api.user_api import LoginAPI, UserAPI, UserListAPI
     from server.api.swagger_docs import SwaggerDocs
 
@@ -90,6 +90,9 @@ def define_flask_restful_routes(app):
     api.add_resource(UserListAPI,   '/api/v1/admin/user/list')
     api.add_resource(LoginAPI,      '/api/v1/authentication/login')
     api.add_resource(DataAPI,       '/api/v1/data/<string:data_source>')
+    api.add_resource(DataJobAPI,    '/api/v1/data/job/<int:job_id>')
     api.add_resource(LayerListAPI,  '/api/v1/layer/list')
-    api.add_resource(MapsAPI,       '/api/v1/map/<string:map_protocol>')
+    api.add_resource(MapsAPI,       '/api/v1/map/<string:map_protocol>',
+                                    '/api/v1/map/<string:map_protocol>/<int:z>/<int:x>/<int:y>')
+    api.add_resource(MapsBatchAPI,  '/api/v1/map/geojson/batch')
     api.add_resource(SwaggerDocs,   '/api/docs')
@@ -1,6 +1,8 @@
 from flask_restful import Resource, request, current_app
 
-from server.services.data_ingest.data_ingest_service import DataIngestService, DataIngestError
+from server.models.postgis.utils import NotFound
+from server.services.data_ingest.data_ingest_service import DataIngestError
+from server.services.data_ingest.ingest_queue_service import IngestQueueService
 from server.services.users.authentication_service import token_auth, dmis
 
 
@@ -10,7 +12,8 @@ class DataAPI(Resource):
     @token_auth.login_required
     def post(self, data_source):
         """
-        Allows third parties to push data into DMIS
+        Allows third parties to push data into DMIS.  The data is queued and ingested in the background, poll the
+        job's status to find out when it's available
         ---
         tags:
           - data
@@ -41,8 +44,8 @@ class DataAPI(Resource):
                           type: string
                           default: sample
         responses:
-          201:
-            description: Request successful
+          202:
+            description: Data queued, the job id and status are returned
           400:
             description: Bad request
           401:
@@ -51,10 +54,53 @@ class DataAPI(Resource):
             description: Internal Server Error
         """
         try:
-            DataIngestService.process_data(data_source, request)
-            return {'Status': 'Success'}, 201
+            job = IngestQueueService.enqueue(data_source, request)
+            return job.to_primitive(), 202, {'Location': f'/api/v1/data/job/{job.job_id}'}
         except DataIngestError as e:
             return {'Error': str(e)}, 400
         except Exception as e:
             current_app.logger.critical('Unhandled exception encountered: {}'.format(e))
             return {'Error': 'Unhandled'}, 500
+
+
+class DataJobAPI(Resource):
+
+    @dmis.admin_only(False)
+    @token_auth.login_required
+    def get(self, job_id):
+        """
+        Get the progress of a data push
+        ---
+        tags:
+          - data
+        produces:
+          - application/json
+        parameters:
+          - in: header
+            name: Authorization
+            description: Base64 encoded bearer
+            required: true
+            type: string
+          - in: path
+            name: job_id
+            description: Job id returned when the data was pushed
+            type: integer
+            required: true
+        responses:
+          200:
+            description: Job status, one of queued, processing, completed or failed
+          401:
+            description: Unauthorized, credentials are invalid
+          404:
+            description: Job not found
+          500:
+            description: Internal Server Error
+        """
+        try:
+            job = IngestQueueService.get_job_dto_by_id(job_id)
+            return job.to_primitive(), 200
+        except NotFound:
+            return {'Error': 'Job not found'}, 404
+        except Exception as e:
+            current_app.logger.critical('Unhandled exception encountered: {}'.format(e))
+            return {'Error': 'Unhandled'}, 500
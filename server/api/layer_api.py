@@ -1,3 +1,4 @@
+from flask import Response
 from flask_restful import request, current_app
 from flask_restful import Resource
 from schematics.exceptions import DataError
@@ -44,8 +45,8 @@ class LayerListAPI(Resource):
         """
         try:
             locale = request.environ.get('HTTP_ACCEPT_LANGUAGE')
-            layers = LayerService.get_all_layers(locale)
-            return layers.to_primitive(), 200
+            layers_json = LayerService.get_all_layers_json(locale)
+            return Response(layers_json, status=200, mimetype='application/json')
         except NotFound:
             return {"Error": "No layers found"}, 404
         except Exception as e:
@@ -8,7 +8,7 @@ class MapsAPI(Resource):
 
     @dmis.admin_only(False)
     @token_auth.login_required
-    def get(self, map_protocol):
+    def get(self, map_protocol, z=None, x=None, y=None):
         """
         Proxies map requests
         ---
@@ -24,7 +24,7 @@ class MapsAPI(Resource):
             type: string
           - in: path
             name: map_protocol
-            description: Mapping protocol requested
+            description: Mapping protocol requested, wms, geojson or mvt.  Vector tiles are requested as mvt/{z}/{x}/{y}
             type: string
             required: true
             default: wms
@@ -38,6 +38,36 @@ class MapsAPI(Resource):
             type: string
             required: false
             default: earthnetworks_lightning
+          - in: query
+            name: since
+            description: Lightning only, ISO 8601 timestamp, only strikes at or after this time are returned
+            type: string
+            required: false
+          - in: query
+            name: bbox
+            description: Only return features within minx,miny,maxx,maxy, in the layer's own coordinate system
+            type: string
+            required: false
+          - in: query
+            name: filter
+            description: Only return features whose property equals the value, as name:value, may be repeated
+            type: string
+            required: false
+          - in: query
+            name: zoom
+            description: Serve a version of the layer simplified for display at this zoom level
+            type: integer
+            required: false
+          - in: query
+            name: tolerance
+            description: Serve a version of the layer simplified to no more than this tolerance, in layer units
+            type: number
+            required: false
+          - in: query
+            name: window
+            description: Lightning only, only strikes from the last N minutes are returned
+            type: integer
+            required: false
         responses:
           200:
             description: Request successful
@@ -50,7 +80,8 @@ class MapsAPI(Resource):
         """
         try:
             query_str = request.query_string.decode('utf-8')
-            response = MapService.handle_map_request(map_protocol, query_str)
+            tile = None if z is None else (z, x, y)
+            response = MapService.handle_map_request(map_protocol, query_str, request.headers, tile)
             return response
         except MapServiceClientError as e:
             return {'Error': str(e)}, 400
@@ -59,3 +90,47 @@ class MapsAPI(Resource):
         except Exception as e:
             current_app.logger.critical('Unhandled exception encountered: {}'.format(e))
             return {'Error': 'Unhandled'}, 500
+
+
+class MapsBatchAPI(Resource):
+
+    @dmis.admin_only(False)
+    @token_auth.login_required
+    def get(self):
+        """
+        Returns the GeoJSON for several layer sources in one response
+        ---
+        tags:
+          - maps
+        produces:
+          - application/json
+        parameters:
+          - in: header
+            name: Authorization
+            description: Base64 encoded bearer
+            required: true
+            type: string
+          - in: query
+            name: layerSources
+            description: Comma separated layer sources, returned as a JSON object keyed on layer source
+            type: string
+            required: true
+            default: earthnetworks_lightning
+        responses:
+          200:
+            description: Request successful
+          400:
+            description: Bad request
+          401:
+            description: Unauthorized, credentials are invalid
+          500:
+            description: Internal Server Error
+        """
+        try:
+            query_str = request.query_string.decode('utf-8')
+            return MapService.handle_geojson_batch_request(query_str, request.headers)
+        except MapServiceClientError as e:
+            return {'Error': str(e)}, 400
+        except Exception as e:
+            current_app.logger.critical('Unhandled exception encountered: {}'.format(e))
+            return {'Error': 'Unhandled'}, 500
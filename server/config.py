@@ -3,17 +3,57 @@ import os
 
 
 class EnvironmentConfig(object):
+    # ArcGIS FeatureSets with more features than the threshold are converted to GeoJSON in chunks, across a pool of
+    # processes, so large pushes use all cores rather than tying up a uWSGI worker for minutes.  Set
+    # DMIS_ARCGIS_PROCESSES lower if concurrent pushes to several workers shouldn't each get every core
+    ARCGIS_PARALLEL_THRESHOLD = 5000
+    ARCGIS_PARALLEL_CHUNK_SIZE = 1000
+    ARCGIS_PARALLEL_PROCESSES = int(os.getenv('DMIS_ARCGIS_PROCESSES', os.cpu_count() or 1))
+    CACHE_DIR = os.getenv('DMIS_CACHE_DIR', '/tmp/dmis-cache')  # Must be shared by all uWSGI workers on the host
+    DMIS_SIMPLIFIED_ZOOMS = (6, 9, 12)  # Zoom levels simplified versions of each GeoJSON layer are built for
+    DMIS_DATA_VERSION_MAX_AGE = 30  # Seconds before the latest version of a source is re-checked against the DB
+    # Days of dmis_data history to keep for each data source, the latest data for a source is always kept
+    DMIS_DATA_RETENTION_DAYS = {
+        'default': 365,
+        'earthnetworks_lightning': 30
+    }
     EARTHNETWORKS_S3_SETTINGS = {
         'aws_access_key_id': os.getenv('EN_ACCESS_KEY', None),
         'aws_secret_access_key': os.getenv('EN_SECRET_KEY', None),
         'bucket_name': 'tw-dmis'
     }
+    EARTHNETWORKS_REFRESH_SECONDS = 300  # How often lightning data is refreshed from S3 in the background
+    # Connections to GeoServer are pooled and kept alive per worker, timeouts are in seconds
+    GEOSERVER_POOL_SIZE = 10
+    GEOSERVER_CONNECT_TIMEOUT = 5
+    GEOSERVER_READ_TIMEOUT = 30
+    GEOSERVER_RETRIES = 2
     GEOSERVER_URL = 'http://mapcloud-geoserver-staging-lb-823669482.eu-west-1.elb.amazonaws.com/geoserver'
+    # Data pushes are queued in ingest_jobs and ingested by a background thread in each worker
+    INGEST_JOB_MAX_ATTEMPTS = 3
+    INGEST_JOB_HEARTBEAT_SECONDS = 30
+    INGEST_JOB_TIMEOUT_SECONDS = 180  # Jobs without a heartbeat for longer are assumed to have lost their worker
+    INGEST_POLL_SECONDS = 5
+    LAYER_LIST_MAX_AGE = 30  # Seconds a cached layer list is served for, before it's rebuilt to see other hosts' edits
     SECRET_KEY = os.getenv('DMIS_SECRET', None)
     SQLALCHEMY_DATABASE_URI = os.getenv('DMIS_DB', None)
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_POOL_SIZE = 5
     SQLALCHEMY_MAX_OVERFLOW = 5
+    # Vector tiles are cut on request, those with features are cached on disk down to VECTOR_TILE_CACHE_MAX_ZOOM
+    VECTOR_TILE_CACHE_DISK_MB = 512  # Expired tiles, then the oldest, are removed from disk beyond this size
+    VECTOR_TILE_CACHE_MAX_AGE = 7 * 86400
+    VECTOR_TILE_CACHE_MAX_ZOOM = 16
+    VECTOR_TILE_CACHE_PRUNE_SECONDS = 300
+    # Rendered GetMap tiles are cached in memory by each worker and on disk, the TTL in seconds is set per layer.
+    # Live layers should be given a short TTL, or 0 to bypass the cache
+    WMS_TILE_CACHE_DIR = os.getenv('DMIS_TILE_CACHE_DIR', CACHE_DIR)
+    WMS_TILE_CACHE_DISK_MB = 1024  # Expired tiles, then the oldest, are removed from disk beyond this size
+    WMS_TILE_CACHE_MEMORY_MB = 64
+    WMS_TILE_CACHE_PRUNE_SECONDS = 300
+    WMS_TILE_CACHE_TTL = {
+        'default': 86400
+    }
 
 
 class ProdConfig(EnvironmentConfig):
@@ -0,0 +1,16 @@
+from schematics import Model
+from schematics.types import StringType, IntType, UTCDateTimeType
+
+
+class IngestJobDTO(Model):
+    """ Describes the progress of a data push through the ingest queue """
+    job_id = IntType(required=True, serialized_name='jobId')
+    data_source = StringType(required=True, serialized_name='dataSource')
+    status = StringType(required=True)
+    # Number of queued jobs ahead of this one, only set while the job is queued
+    queue_position = IntType(serialized_name='queuePosition', serialize_when_none=False)
+    attempts = IntType()
+    error = StringType(serialize_when_none=False)
+    created = UTCDateTimeType()
+    started = UTCDateTimeType(serialize_when_none=False)
+    finished = UTCDateTimeType(serialize_when_none=False)
@@ -1,49 +1,137 @@
 import datetime
-import json
-from typing import List
+from typing import Dict, Iterable, List, Optional, TextIO
 
 
 from flask import current_app
-from sqlalchemy.dialects.postgresql import JSON
+from sqlalchemy import Text, and_, case, cast, literal
+from sqlalchemy.dialects.postgresql import JSONB, insert
 
 from server import db
+from server.models.postgis.dmis_feature import DMISFeature, FEATURE_DELTA_TYPE
+
+
+class DMISDataLatest(db.Model):
+    """ Points at the latest dmis_data row for each data source, maintained on ingest so lookups are constant time """
+    __tablename__ = "dmis_data_latest"
+
+    data_source = db.Column(db.String, primary_key=True)
+    data_id = db.Column(db.BigInteger, nullable=False)
+    data_received = db.Column(db.DateTime, nullable=False)
+
+    @staticmethod
+    def upsert(dmis_data: 'DMISData'):
+        """ Points the data source at the supplied row, unless a more recent row has already been recorded """
+        latest_table = DMISDataLatest.__table__
+        upsert_stmt = insert(latest_table).values(data_source=dmis_data.data_source, data_id=dmis_data.data_id,
+                                                  data_received=dmis_data.data_received)
+        upsert_stmt = upsert_stmt.on_conflict_do_update(
+            index_elements=[latest_table.c.data_source],
+            set_={'data_id': upsert_stmt.excluded.data_id, 'data_received': upsert_stmt.excluded.data_received},
+            where=latest_table.c.data_received <= upsert_stmt.excluded.data_received
+        )
+        db.session.execute(upsert_stmt)
 
 
 class DMISData(db.Model):
-    """ Describes the layer table """
+    """
+    Describes the layer table.  The table is range partitioned by month on data_received, see
+    DataRetentionService, so data_received is part of the primary key
+    """
     __tablename__ = "dmis_data"
 
-    data_id = db.Column(db.BigInteger, primary_key=True, index=True)
+    data_id = db.Column(db.BigInteger, primary_key=True, autoincrement=True, index=True)
     data_source = db.Column(db.String)
-    # TODO postgres recommend using JSONB type as it's more efficient, however, for now we want to easily see the data
-    json_data = db.Column(JSON)
+    json_data = db.Column(JSONB)
     # TODO we could add further columns for xml, strings etc as needed dependent on type of data???
-    data_received = db.Column(db.DateTime, default=datetime.datetime.now)
+    data_received = db.Column(db.DateTime, primary_key=True, default=datetime.datetime.now)
+
+    __table_args__ = (
+        db.Index('ix_dmis_data_data_source_data_received', data_source, data_received.desc()),
+    )
 
     def save_json_data(self, data_source, json):
-        """ Saves JSON data """
+        """ Saves JSON data, and records it as the latest data for the source in the same transaction """
         self.data_source = data_source
         self.json_data = json
         db.session.add(self)
+        db.session.flush()  # Generates data_id and data_received
+        DMISDataLatest.upsert(self)
+        db.session.commit()
+
+    def save_feature_delta(self, data_source, feature_rows: TextIO, crs: dict, srid: int) -> bool:
+        """
+        Saves a FeatureCollection pushed for the source as a delta.  The features are applied to dmis_features, and only
+        the features inserted, updated and deleted since the previous version are saved as the JSON data
+        :param feature_rows: The features, see DMISFeature.get_copy_row
+        :param crs: CRS member of the FeatureCollection
+        :param srid: SRID of the feature geometries
+        :return: False if no features changed, in which case no new version is saved
+        """
+        # Taken before data_received is set, so the versions of a source are saved in the order they're received
+        DMISFeature.lock_source(data_source)
+
+        self.data_source = data_source
+        db.session.add(self)
+        db.session.flush()  # Generates data_id and data_received
+
+        delta_json = DMISFeature.apply_delta(self.data_id, data_source, srid, crs, feature_rows)
+        if delta_json is None:
+            db.session.rollback()
+            return False
+
+        self.json_data = cast(literal(delta_json, Text), JSONB)
+        DMISDataLatest.upsert(self)
         db.session.commit()
+        return True
 
     @staticmethod
     def get_available_data_sources() -> List[str]:
         """ Gets a list of available data sources """
-        # TODO Cache this
-        result = db.session.query(DMISData.data_source).distinct().all()
+        result = db.session.query(DMISDataLatest.data_source).all()
 
         data_sources = [r for r, in result]
         return data_sources
 
     @staticmethod
     def get_latest_json_data_for_source(data_source: str) -> str:
-        """ Gets the latest JSON data wa have for the supplied data_source"""
-
-        result = db.session.query(DMISData.json_data, DMISData.data_received)\
-            .filter(DMISData.data_source == data_source) \
-            .order_by(DMISData.data_received.desc()).first()
+        """
+        Gets the latest JSON data wa have for the supplied data_source.  The JSONB is cast to text by Postgres, so
+        the document is returned as is, rather than being decoded into Python objects and re-encoded.  Sources saved
+        as deltas are returned as the FeatureCollection built from their stored features
+        """
+        is_delta = DMISData.json_data['type'].astext == FEATURE_DELTA_TYPE
+        result = db.session.query(is_delta.label('is_delta'), DMISData.json_data['crs'].label('crs'),
+                                  case([(is_delta, None)], else_=cast(DMISData.json_data, Text)).label('json_text'),
+                                  DMISData.data_received)\
+            .join(DMISDataLatest, and_(DMISData.data_id == DMISDataLatest.data_id,
+                                       DMISData.data_received == DMISDataLatest.data_received)) \
+            .filter(DMISDataLatest.data_source == data_source).first()
 
         current_app.logger.debug(f'Returning datasource {data_source} received date {result.data_received}')
 
-        return json.dumps(result.json_data)
+        if result.is_delta:
+            return DMISFeature.get_feature_collection(data_source, crs=result.crs)
+
+        return result.json_text
+
+    @staticmethod
+    def get_latest_data_id_for_source(data_source: str) -> Optional[int]:
+        """ Gets the id of the latest data for the supplied data_source, a cheap way of checking for new data """
+        latest = DMISDataLatest.query.get(data_source)
+        return None if latest is None else latest.data_id
+
+    @staticmethod
+    def get_latest_data_ids_for_sources(data_sources: Iterable[str]) -> Dict[str, int]:
+        """ Gets the id of the latest data for each of the data_sources in one query, unknown sources are omitted """
+        result = db.session.query(DMISDataLatest.data_source, DMISDataLatest.data_id)\
+            .filter(DMISDataLatest.data_source.in_(list(data_sources))).all()
+
+        return dict(result)
+
+    @staticmethod
+    def get_json_data_by_id(data_id: int):
+        """
+        Gets the JSON data stored for the supplied data_id, deserialized into Python objects.  For sources saved as
+        deltas this is the FeatureCollectionDelta, see get_latest_json_data_for_source for the FeatureCollection
+        """
+        return db.session.query(DMISData.json_data).filter(DMISData.data_id == data_id).scalar()
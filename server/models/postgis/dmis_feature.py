@@ -0,0 +1,187 @@
+import hashlib
+import json
+from typing import Dict, Optional, TextIO, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.types import UserDefinedType
+
+from server import db
+
+FEATURE_DELTA_TYPE = 'FeatureCollectionDelta'  # Type of the JSON document apply_delta describes the changes in
+GEOJSON_MAX_DECIMAL_DIGITS = 15  # Enough to return the ingested coordinates unchanged
+
+
+def _feature_json_sql(geometry_sql: str = 'geometry') -> str:
+    """ SQL building a stored feature as a GeoJSON Feature, with the geometry given by geometry_sql """
+    return f'''json_build_object('type', 'Feature',
+                                 'geometry', ST_AsGeoJSON({geometry_sql}, {GEOJSON_MAX_DECIMAL_DIGITS}, 0)::json,
+                                 'properties', properties)'''
+
+
+FEATURE_JSON_SQL = _feature_json_sql()
+# Features in a delta carry their key as the id, so they can be matched to the features they replace
+DELTA_FEATURE_JSON_SQL = f"{FEATURE_JSON_SQL[:-1]}, 'id', feature_key)"
+
+
+class Geometry(UserDefinedType):
+    """ PostGIS geometry of any type and SRID.  Only read and written in SQL, as GeoJSON """
+
+    def get_col_spec(self, **kw):
+        return 'geometry'
+
+
+class DMISFeature(db.Model):
+    """
+    Describes the dmis_features table, the features of the latest FeatureCollection ingested for each data source, a
+    row per feature, so layers can be filtered by bbox and attribute in the DB rather than in each worker.  Each push
+    only writes the features that changed, see apply_delta
+    """
+    __tablename__ = "dmis_features"
+
+    feature_id = db.Column(db.BigInteger, primary_key=True)
+    data_id = db.Column(db.BigInteger, nullable=False)  # The dmis_data row the feature last changed in
+    data_source = db.Column(db.String, nullable=False)
+    feature_key = db.Column(db.String, nullable=False)  # OBJECTID or FID, identifies the feature between pushes
+    content_hash = db.Column(db.String)  # MD5 of the properties and geometry, to detect changed features
+    feature_index = db.Column(db.Integer, nullable=False)  # Position in the FeatureCollection, so order is kept
+    geometry = db.Column(Geometry)
+    properties = db.Column(JSONB)
+
+    __table_args__ = (
+        db.Index('ix_dmis_features_data_source_feature_key', data_source, feature_key, unique=True),
+        db.Index('ix_dmis_features_data_source_feature_index', data_source, feature_index),
+        db.Index('ix_dmis_features_geometry', geometry, postgresql_using='gist'),
+    )
+
+    @staticmethod
+    def lock_source(data_source: str):
+        """ Locks the source until the end of the transaction, so pushes for it are applied one at a time """
+        db.session.execute(text('SELECT pg_advisory_xact_lock(hashtext(:data_source))'), {'data_source': data_source})
+
+    @staticmethod
+    def apply_delta(data_id: int, data_source: str, srid: int, crs: dict, feature_rows: TextIO) -> Optional[str]:
+        """
+        Brings the stored features of the source in line with the features pushed, comparing content hashes so only
+        the features inserted, updated, deleted or moved are written.  Runs in the caller's transaction
+        :param data_id: The dmis_data row for the push, recorded against the features it changes
+        :param feature_rows: The pushed features, in COPY text format, see get_copy_row
+        :return: The changes as a FeatureCollectionDelta JSON document, None if no features changed
+        """
+        db.session.execute(text('CREATE TEMPORARY TABLE dmis_features_copy (feature_key text, content_hash text, '
+                                'feature_index integer, properties jsonb, geometry text)'))
+        # GeoJSON can't be copied straight into a geometry column, so it's staged and converted as it's written
+        cursor = db.session.connection().connection.cursor()
+        cursor.copy_expert('COPY dmis_features_copy (feature_key, content_hash, feature_index, properties, geometry) '
+                           'FROM STDIN', feature_rows)
+
+        # Statements in WITH all see the features as they were before the push, so each feature is only changed once
+        delta = db.session.execute(text(f'''
+            WITH deleted AS (
+                DELETE FROM dmis_features f
+                 WHERE f.data_source = :data_source
+                   AND NOT EXISTS (SELECT 1 FROM dmis_features_copy c WHERE c.feature_key = f.feature_key)
+                RETURNING f.feature_key
+            ), updated AS (
+                UPDATE dmis_features f
+                   SET data_id = :data_id, content_hash = c.content_hash, feature_index = c.feature_index,
+                       properties = c.properties, geometry = ST_SetSRID(ST_GeomFromGeoJSON(c.geometry), :srid)
+                  FROM dmis_features_copy c
+                 WHERE f.data_source = :data_source AND f.feature_key = c.feature_key
+                   AND f.content_hash IS DISTINCT FROM c.content_hash
+                RETURNING f.feature_key, f.feature_index, f.properties, f.geometry
+            ), moved AS (
+                UPDATE dmis_features f
+                   SET feature_index = c.feature_index
+                  FROM dmis_features_copy c
+                 WHERE f.data_source = :data_source AND f.feature_key = c.feature_key
+                   AND f.content_hash = c.content_hash AND f.feature_index <> c.feature_index
+                RETURNING f.feature_key, f.feature_index
+            ), inserted AS (
+                INSERT INTO dmis_features (data_id, data_source, feature_key, content_hash, feature_index, properties,
+                                           geometry)
+                SELECT :data_id, :data_source, c.feature_key, c.content_hash, c.feature_index, c.properties,
+                       ST_SetSRID(ST_GeomFromGeoJSON(c.geometry), :srid)
+                  FROM dmis_features_copy c
+                 WHERE NOT EXISTS (SELECT 1 FROM dmis_features f
+                                    WHERE f.data_source = :data_source AND f.feature_key = c.feature_key)
+                RETURNING feature_key, feature_index, properties, geometry
+            )
+            SELECT (SELECT count(*) FROM inserted) + (SELECT count(*) FROM updated) + (SELECT count(*) FROM deleted)
+                       + (SELECT count(*) FROM moved) AS changes,
+                   json_build_object(
+                       'type', :delta_type,
+                       'inserted', (SELECT COALESCE(json_agg({DELTA_FEATURE_JSON_SQL} ORDER BY feature_index), '[]')
+                                      FROM inserted),
+                       'updated', (SELECT COALESCE(json_agg({DELTA_FEATURE_JSON_SQL} ORDER BY feature_index), '[]')
+                                     FROM updated),
+                       'deleted', (SELECT COALESCE(json_agg(feature_key), '[]') FROM deleted),
+                       'moved', (SELECT COALESCE(json_agg(json_build_array(feature_key, feature_index)), '[]')
+                                   FROM moved),
+                       'crs', CAST(:crs AS json)
+                   )::text AS delta
+        '''), {'data_id': data_id, 'data_source': data_source, 'srid': srid, 'crs': json.dumps(crs),
+               'delta_type': FEATURE_DELTA_TYPE}).first()
+
+        db.session.execute(text('DROP TABLE dmis_features_copy'))
+        return delta.delta if delta.changes else None
+
+    @staticmethod
+    def get_copy_row(feature_key: str, feature_index: int, properties_json: Optional[str],
+                     geometry_json: Optional[str]) -> str:
+        """
+        Formats a feature as a line of COPY text for apply_delta, with a hash of its properties and geometry JSON, so
+        the JSON must be serialized the same way on each push
+        """
+        content = f'{properties_json}\t{geometry_json}'.encode('utf-8')
+        columns = [feature_key, hashlib.md5(content).hexdigest(), str(feature_index), properties_json, geometry_json]
+        return '\t'.join(r'\N' if column is None else _escape_copy_text(column) for column in columns) + '\n'
+
+    @staticmethod
+    def get_feature_collection(data_source: str, bbox: Tuple[float, float, float, float] = None,
+                               property_filters: Dict[str, str] = None, crs: dict = None,
+                               srid: int = None) -> Optional[str]:
+        """
+        Builds the FeatureCollection for the source in the DB, with only the features whose bounds intersect the bbox
+        and whose properties equal each of the property filters, compared as text
+        :param crs: CRS member of the FeatureCollection, named after the SRID of the geometries if not supplied
+        :param srid: Optional SRID the geometries are transformed to, the bbox is still in the source's own SRID
+        :return: The FeatureCollection as JSON, None if no crs is supplied and no features are stored for the source
+        """
+        conditions = ['data_source = :data_source']
+        params = {'data_source': data_source, 'crs': None if crs is None else json.dumps(crs), 'srid': srid}
+        feature_json_sql = FEATURE_JSON_SQL if srid is None else _feature_json_sql('ST_Transform(geometry, :srid)')
+
+        if bbox is not None:
+            conditions.append('geometry && ST_MakeEnvelope(:min_x, :min_y, :max_x, :max_y, source.srid)')
+            params.update(zip(('min_x', 'min_y', 'max_x', 'max_y'), bbox))
+
+        for i, (name, value) in enumerate((property_filters or {}).items()):
+            conditions.append(f'properties ->> :name_{i} = :value_{i}')
+            params.update({f'name_{i}': name, f'value_{i}': value})
+
+        query = text(f'''
+            WITH source AS (
+                SELECT COALESCE((SELECT ST_SRID(geometry) FROM dmis_features
+                                 WHERE data_source = :data_source AND geometry IS NOT NULL LIMIT 1), 0) AS srid
+                WHERE :crs IS NOT NULL OR EXISTS (SELECT 1 FROM dmis_features WHERE data_source = :data_source)
+            )
+            SELECT json_build_object(
+                'type', 'FeatureCollection',
+                'features', (
+                    SELECT COALESCE(json_agg({feature_json_sql} ORDER BY feature_index), '[]')
+                      FROM dmis_features WHERE {' AND '.join(conditions)}
+                ),
+                'crs', COALESCE(CAST(:crs AS json),
+                                json_build_object('type', 'name', 'properties',
+                                                  json_build_object('name', 'EPSG:' || COALESCE(:srid, srid))))
+            )::text
+            FROM source
+        ''')
+
+        return db.session.execute(query, params).scalar()
+
+
+def _escape_copy_text(value: str) -> str:
+    """ Escapes a value for COPY text format """
+    return value.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
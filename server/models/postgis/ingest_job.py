@@ -0,0 +1,179 @@
+import datetime
+import io
+import threading
+from contextlib import contextmanager
+from typing import BinaryIO, Iterator, Optional
+
+from flask import current_app
+from sqlalchemy import and_, or_, text
+from sqlalchemy.dialects.postgresql import OID
+
+from server import db
+from server.models.dtos.ingest_job_dto import IngestJobDTO
+from server.models.postgis.lookups import IngestJobStatus
+from server.models.postgis.utils import timestamp
+
+PAYLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class IngestJob(db.Model):
+    """ Describes the ingest_jobs table, the queue of data pushes waiting to be ingested """
+    __tablename__ = "ingest_jobs"
+
+    job_id = db.Column(db.BigInteger, primary_key=True)
+    data_source = db.Column(db.String, nullable=False)
+    # Request body as pushed, held in a large object so it can be streamed in and out, removed once the job is finished
+    payload_oid = db.Column(OID)
+    status = db.Column(db.String, nullable=False, default=IngestJobStatus.QUEUED.value)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.String)
+    created = db.Column(db.DateTime, nullable=False, default=timestamp)
+    started = db.Column(db.DateTime)
+    heartbeat = db.Column(db.DateTime)  # Bumped by the worker while the job is processing, see keep_alive
+    finished = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_ingest_jobs_status_job_id', status, job_id),
+    )
+
+    @classmethod
+    def enqueue(cls, data_source: str, payload: BinaryIO) -> 'IngestJob':
+        """ Adds the payload to the end of the queue, copying it into a large object a chunk at a time """
+        large_object = db.session.connection().connection.lobject(0, 'wb')
+        try:
+            for chunk in iter(lambda: payload.read(PAYLOAD_CHUNK_SIZE), b''):
+                large_object.write(chunk)
+        finally:
+            large_object.close()
+
+        new_job = cls()
+        new_job.data_source = data_source
+        new_job.payload_oid = large_object.oid
+        db.session.add(new_job)
+        db.session.commit()
+
+        return new_job
+
+    @contextmanager
+    def open_payload(self) -> Iterator[BinaryIO]:
+        """
+        Opens the payload to be read as a file.  It's read on its own connection, so the payload stays open while
+        the ingest commits
+        """
+        if self.payload_oid is None:
+            yield io.BytesIO()
+            return
+
+        connection = db.engine.raw_connection()
+        try:
+            large_object = connection.lobject(self.payload_oid, 'rb')
+            try:
+                yield large_object
+            finally:
+                large_object.close()
+        finally:
+            connection.rollback()
+            connection.close()
+
+    @staticmethod
+    def get_by_id(job_id: int) -> Optional['IngestJob']:
+        """ Return the job for the specified id, or None if not found """
+        return IngestJob.query.get(job_id)
+
+    @staticmethod
+    def claim_next(stale_before: datetime.datetime) -> Optional['IngestJob']:
+        """
+        Claims the oldest queued job, or a processing job whose worker hasn't sent a heartbeat since stale_before and
+        has presumably died.  Rows locked by other workers are skipped, so each job is only claimed once
+        """
+        job = IngestJob.query.filter(or_(
+                IngestJob.status == IngestJobStatus.QUEUED.value,
+                and_(IngestJob.status == IngestJobStatus.PROCESSING.value, IngestJob.heartbeat < stale_before))) \
+            .order_by(IngestJob.job_id).with_for_update(skip_locked=True).first()
+
+        if job is None:
+            db.session.rollback()  # Release the transaction rather than leaving it idle
+            return None
+
+        job.status = IngestJobStatus.PROCESSING.value
+        job.started = timestamp()
+        job.heartbeat = job.started
+        job.attempts += 1
+        db.session.commit()
+
+        return job
+
+    @contextmanager
+    def keep_alive(self, interval: float) -> Iterator[None]:
+        """
+        Bumps the heartbeat every interval seconds while the job is processed, so a slow ingest isn't mistaken for a
+        dead worker and claimed again.  The heartbeat is sent from its own thread and connection, so it's neither
+        held up by nor part of the ingest's transaction
+        """
+        app = current_app._get_current_object()
+        engine = db.engine
+        stopped = threading.Event()
+
+        def send_heartbeats():
+            while not stopped.wait(interval):
+                try:
+                    with engine.begin() as connection:
+                        # Matching the attempt means a worker that was presumed dead can't keep a re-claimed job alive
+                        connection.execute(text('UPDATE ingest_jobs SET heartbeat = :now '
+                                                'WHERE job_id = :job_id AND attempts = :attempts AND status = :status'),
+                                           now=timestamp(), job_id=self.job_id, attempts=self.attempts,
+                                           status=IngestJobStatus.PROCESSING.value)
+                except Exception as e:
+                    app.logger.error(f'Unable to send heartbeat for ingest job {self.job_id}: {str(e)}')
+
+        heartbeat_thread = threading.Thread(target=send_heartbeats, name=f'ingest-heartbeat-{self.job_id}',
+                                            daemon=True)
+        heartbeat_thread.start()
+        try:
+            yield
+        finally:
+            stopped.set()
+            heartbeat_thread.join()
+
+    def requeue(self):
+        """ Puts the job back on the queue to be retried """
+        self.status = IngestJobStatus.QUEUED.value
+        db.session.commit()
+
+    def complete(self):
+        self._finish(IngestJobStatus.COMPLETED)
+
+    def fail(self, error: str):
+        self.error = error
+        self._finish(IngestJobStatus.FAILED)
+
+    def _finish(self, status: IngestJobStatus):
+        self.status = status.value
+        self.finished = timestamp()
+        if self.payload_oid is not None:
+            # The payload is either ingested or can't be, so there's no need to keep it
+            db.session.execute(text('SELECT lo_unlink(:oid)'), {'oid': self.payload_oid})
+            self.payload_oid = None
+        db.session.commit()
+
+    def get_queue_position(self) -> int:
+        """ Number of queued jobs that will be processed before this one """
+        return IngestJob.query.filter(IngestJob.status == IngestJobStatus.QUEUED.value,
+                                      IngestJob.job_id < self.job_id).count()
+
+    def as_dto(self) -> IngestJobDTO:
+        """ Create DTO object from job """
+        job_dto = IngestJobDTO()
+        job_dto.job_id = self.job_id
+        job_dto.data_source = self.data_source
+        job_dto.status = self.status
+        job_dto.attempts = self.attempts
+        job_dto.error = self.error
+        job_dto.created = self.created
+        job_dto.started = self.started
+        job_dto.finished = self.finished
+
+        if self.status == IngestJobStatus.QUEUED.value:
+            job_dto.queue_position = self.get_queue_position()
+
+        return job_dto
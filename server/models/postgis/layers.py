@@ -1,6 +1,9 @@
-from typing import Optional
+from collections import OrderedDict
+from typing import List, Optional, Tuple
 
 from flask import current_app
+from sqlalchemy import and_
+from sqlalchemy.dialects.postgresql import insert
 from server import db
 from server.models.dtos.layer_dto import DMISLayersDTO, LayerDetailsDTO, LayerUpdateDTO
 from server.models.postgis.layer_info import LayerInfo
@@ -58,23 +61,47 @@ class Layer(db.Model):
         db.session.delete(self)
         db.session.commit()
 
+    @staticmethod
+    def get_all_with_layer_info(locale: str = None) -> List[Tuple['Layer', List[LayerInfo]]]:
+        """
+        Gets all layers along with their LayerInfo rows for the locale, or for every locale if no locale is supplied, in
+        a single joined query rather than a query per layer
+        """
+        join_condition = LayerInfo.layer_id == Layer.layer_id
+        if locale:
+            join_condition = and_(join_condition, LayerInfo.locale == locale)
+
+        rows = db.session.query(Layer, LayerInfo).outerjoin(LayerInfo, join_condition)\
+            .order_by(Layer.layer_id, LayerInfo.locale).all()
+
+        layers = OrderedDict()  # layer_id -> (Layer, [LayerInfo]), in layer_id order
+        for layer, info in rows:
+            layer_infos = layers.setdefault(layer.layer_id, (layer, []))[1]
+            if info is not None:
+                layer_infos.append(info)
+
+        return list(layers.values())
+
     @staticmethod
     def get_all_layers(locale: str) -> Optional[DMISLayersDTO]:
         """ Get all available layers in the DB """
-        db_layers = Layer.query.order_by(Layer.layer_id).all()
+        db_layers = Layer.get_all_with_layer_info(locale)
 
         if len(db_layers) == 0:
             return None
 
         layers_dto = DMISLayersDTO()
 
-        for layer in db_layers:
-            layers_dto.layers.append(layer.as_dto(locale))
+        for layer, layer_infos in db_layers:
+            layers_dto.layers.append(layer.as_dto(locale, layer_infos))
 
         return layers_dto
 
-    def as_dto(self, locale: str = None) -> LayerDetailsDTO:
-        """ Returns a LayerDetailsDTO object for the layer in scope """
+    def as_dto(self, locale: str = None, layer_infos: List[LayerInfo] = None) -> LayerDetailsDTO:
+        """
+        Returns a LayerDetailsDTO object for the layer in scope
+        :param layer_infos: The layer's LayerInfo rows for the locale if already loaded, see get_all_with_layer_info
+        """
         layer_details = LayerDetailsDTO()
         layer_details.layer_id = self.layer_id
         layer_details.layer_name = self.layer_name
@@ -84,15 +111,18 @@ class Layer(db.Model):
         layer_details.layer_style = self.layer_style
         layer_details.layer_geometry_type = self.layer_geometry_type
 
+        if layer_infos is None:
+            layer_infos = self.layer_info.filter_by(locale=locale) if locale else self.layer_info
+
         if locale:
             # If client is filtering by locale only return the layerinfo for the locale they have asked for
-            locale_info = self.layer_info.filter_by(locale=locale).one_or_none()
+            locale_info = next((info for info in layer_infos if info.locale == locale), None)
             # Return empty layerInfo if the specified locale doesn't exist, rather than error
             layer_details.layer_info = LayerInfo() if locale_info is None else locale_info.as_dto()
             return layer_details
 
         # No layer filter so return locale info for all layers.
-        for info in self.layer_info:
+        for info in layer_infos:
             layer_details.layer_info_locales.append(info.as_dto())
 
         return layer_details
@@ -101,15 +131,20 @@ class Layer(db.Model):
         """ Update the layer details """
         self.map_category = MapCategory[layer_update_dto.map_category].value
 
-        # Set layer_info for all supplied locales
-        for info in layer_update_dto.layer_info_locales:
-            locale_info = self.layer_info.filter_by(locale=info.locale).one_or_none()
-
-            if locale_info is None:
-                new_info = LayerInfo.create_from_dto(info)
-                self.layer_info.append(new_info)
-            else:
-                locale_info.update_from_dto(info)
+        # Set layer_info for all supplied locales in a single upsert, the last info supplied for a locale wins
+        locale_infos = OrderedDict((info.locale, info) for info in layer_update_dto.layer_info_locales)
+        if locale_infos:
+            info_table = LayerInfo.__table__
+            upsert_stmt = insert(info_table).values([
+                {'layer_id': self.layer_id, 'locale': info.locale, 'layer_title': info.layer_title,
+                 'layer_group': info.layer_group, 'layer_copyright': info.layer_copyright}
+                for info in locale_infos.values()])
+            upsert_stmt = upsert_stmt.on_conflict_do_update(
+                index_elements=[info_table.c.layer_id, info_table.c.locale],
+                set_={'layer_title': upsert_stmt.excluded.layer_title, 'layer_group': upsert_stmt.excluded.layer_group,
+                      'layer_copyright': upsert_stmt.excluded.layer_copyright}
+            )
+            db.session.execute(upsert_stmt)
 
         db.session.commit()
 
@@ -19,3 +19,11 @@ class LayerType(Enum):
     """ Describes which layer types are supported """
     WMS = 'wms'
     ARCGISREST = 'arcgisrest'
+
+
+class IngestJobStatus(Enum):
+    """ Describes where a queued data push is in the ingest queue """
+    QUEUED = 'queued'
+    PROCESSING = 'processing'
+    COMPLETED = 'completed'
+    FAILED = 'failed'
@@ -0,0 +1,115 @@
+import zlib
+from typing import Iterable, Iterator, Optional
+
+from server.services.cache.shared_cache import SharedCache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None  # Brotli variants are skipped, gzip is still served
+
+GZIP_LEVEL = 9  # Variants are compressed once and served many times, so favour size over speed
+BROTLI_QUALITY = 9  # Quality 10 and 11 are much slower for little gain on multi MB GeoJSON
+STREAMED_GZIP_LEVEL = 4  # Bodies compressed as they're sent are compressed on every request, so favour speed
+STREAMED_BROTLI_QUALITY = 4
+
+
+def get_encodings() -> tuple:
+    """ Content codings variants are stored in, most preferred first """
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """ Picks the variant to serve for the Accept-Encoding header, None if the body should be sent uncompressed """
+    if not accept_encoding:
+        return None
+
+    accepted = {}
+    for coding in accept_encoding.split(','):
+        name, _, params = coding.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+
+    for encoding in get_encodings():
+        if accepted.get(encoding, accepted.get('*', 0.0)) > 0:
+            return encoding
+
+    return None
+
+
+def compress_chunks(chunks: Iterable[bytes], encoding: str, streamed: bool = False) -> Iterator[bytes]:
+    """
+    Generator compresses the chunks as they're read, so the body never needs to be held in memory in full
+    :param streamed: True if the body is compressed as it's sent rather than cached, trading size for speed
+    """
+    if encoding == 'gzip':
+        level = STREAMED_GZIP_LEVEL if streamed else GZIP_LEVEL
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # 16 + gives a gzip wrapper
+        compress, flush = compressor.compress, compressor.flush
+    elif encoding == 'br':
+        quality = STREAMED_BROTLI_QUALITY if streamed else BROTLI_QUALITY
+        compressor = brotli.Compressor(mode=brotli.MODE_TEXT, quality=quality)
+        compress, flush = compressor.process, compressor.finish
+    else:
+        raise ValueError(f'Unsupported encoding {encoding}')
+
+    for chunk in chunks:
+        compressed = compress(chunk)
+        if compressed:
+            yield compressed
+
+    yield flush()
+
+
+def variant_key(key: str, encoding: Optional[str]) -> str:
+    return key if encoding is None else f'{key}.{encoding}'
+
+
+def cache_compressed_variants(cache: SharedCache, key: str):
+    """
+    Stores a compressed variant of the cached body for each supported encoding alongside it, unless it's already
+    been compressed.  Each variant records the version of the body it was compressed from, so a stale variant is never
+    served after the body is replaced
+    """
+    for encoding in get_encodings():
+        cached_body = cache.stream(key)
+        if cached_body is None:
+            return
+
+        metadata, chunks = cached_body
+        variant_metadata = cache.get_metadata(variant_key(key, encoding))
+        if variant_metadata is not None and variant_metadata.get('source_updated') == metadata['updated']:
+            chunks.close()
+            continue  # Already compressed this version
+
+        cache.set_stream(variant_key(key, encoding), compress_chunks(chunks, encoding),
+                         source_updated=metadata['updated'])
+
+
+def stream_variant(cache: SharedCache, key: str, encoding: Optional[str]):
+    """
+    Streams the compressed variant of the cached body, falling back to the uncompressed body if the variant hasn't
+    been written for the current version yet
+    :return: The metadata of the body, a generator of chunks and the encoding actually used, or None if not cached
+    """
+    cached_body = cache.stream(key)
+    if cached_body is None:
+        return None
+
+    metadata, chunks = cached_body
+    if encoding is not None:
+        cached_variant = cache.stream(variant_key(key, encoding))
+        if cached_variant is not None and cached_variant[0].get('source_updated') == metadata['updated']:
+            chunks.close()
+            return metadata, cached_variant[1], encoding
+
+        if cached_variant is not None:
+            cached_variant[1].close()
+
+    return metadata, chunks, None
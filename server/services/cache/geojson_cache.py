@@ -0,0 +1,102 @@
+import json
+import re
+from typing import Optional
+
+from flask import current_app
+
+from server.models.postgis.dmis_data import DMISData
+from server.services.cache.compression import cache_compressed_variants
+from server.services.cache.shared_cache import SharedCache
+from server.services.data_ingest.geometry_simplifier import get_tolerance, simplify_feature_collection
+from server.services.mapping.spatial_index import is_mercator
+
+DATA_SOURCE_NAME = re.compile(r'^[\w-]+$')
+data_version_cache = SharedCache('dmis_data_versions')
+geojson_cache = SharedCache('geojson')
+
+
+class GeoJSONCache:
+    """
+    Publishes the latest version of each data source, and its GeoJSON along with compressed and simplified variants,
+    to caches shared by all workers on the host.  Called by ingest as data arrives, and by the map service to serve it
+    """
+
+    @staticmethod
+    def get_data_version(layer_source: str) -> Optional[int]:
+        """
+        Returns the latest data_id for the source.  It's held in the shared cache so polling clients can be answered
+        without querying the DB, and re-checked against the DB after DMIS_DATA_VERSION_MAX_AGE seconds, as data may
+        have been ingested on another host
+        """
+        if not DATA_SOURCE_NAME.match(layer_source):
+            return None  # Can't be a known source, and mustn't be used in a cache file name
+
+        cached_version = data_version_cache.get_metadata(layer_source)
+        version_age = data_version_cache.age(layer_source)
+
+        if cached_version is None or cached_version.get('data_id') is None or version_age is None \
+                or version_age > current_app.config['DMIS_DATA_VERSION_MAX_AGE']:
+            data_id = DMISData.get_latest_data_id_for_source(layer_source)
+            if data_id is not None:
+                GeoJSONCache.set_data_version(layer_source, data_id)
+            return data_id
+
+        return cached_version['data_id']
+
+    @staticmethod
+    def set_data_version(layer_source: str, data_id: int):
+        """ Records the latest data_id for the source, called when new data is ingested """
+        if DATA_SOURCE_NAME.match(layer_source):
+            data_version_cache.set(layer_source, b'', data_id=data_id)
+
+    @staticmethod
+    def ensure_geojson_cached(layer_source: str, data_version: int):
+        """ Caches the source if the GeoJSON cache doesn't hold the current version yet """
+        cached_metadata = geojson_cache.get_metadata(layer_source)
+        if cached_metadata is None or cached_metadata.get('data_id') != data_version:
+            GeoJSONCache.cache_geojson(layer_source, data_version)
+
+    @staticmethod
+    def cache_geojson(layer_source: str, data_id: int):
+        """
+        Caches the latest GeoJSON for the source, along with gzip and brotli variants, so it's compressed once for
+        each version rather than on every request.  Simplified versions are cached for each of DMIS_SIMPLIFIED_ZOOMS
+        """
+        if not DATA_SOURCE_NAME.match(layer_source):
+            return
+
+        with geojson_cache.lock(layer_source):
+            cached_metadata = geojson_cache.get_metadata(layer_source)
+            if cached_metadata is not None and cached_metadata.get('data_id') == data_id:
+                return  # Another worker cached this version while we waited for the lock
+
+            layer_geojson = DMISData.get_latest_json_data_for_source(layer_source)
+
+            # Simplified versions are written first, so they're ready once the full version is seen to be current
+            GeoJSONCache.cache_simplified_geojson(layer_source, data_id, layer_geojson)
+            geojson_cache.set(layer_source, layer_geojson.encode('utf-8'), data_id=data_id)
+            cache_compressed_variants(geojson_cache, layer_source)
+
+    @staticmethod
+    def cache_simplified_geojson(layer_source: str, data_id: int, layer_geojson: str):
+        """
+        Caches a simplified version of the FeatureCollection for each zoom level, simplified to the size of a pixel at
+        that zoom with coordinates rounded to match.  Layers in CRS other than lon/lat are taken to be projected in
+        metres, as the UTM ArcGIS layers are, so are given the Web Mercator tolerances
+        """
+        layer_json = json.loads(layer_geojson)
+        if not isinstance(layer_json, dict) or layer_json.get('type') != 'FeatureCollection':
+            return
+
+        in_metres = is_mercator(layer_json) is not False
+        for zoom in current_app.config['DMIS_SIMPLIFIED_ZOOMS']:
+            tolerance = get_tolerance(zoom, in_metres)
+            simplified_key = GeoJSONCache.get_simplified_key(layer_source, zoom)
+            simplified_geojson = json.dumps(simplify_feature_collection(layer_json, tolerance))
+
+            geojson_cache.set(simplified_key, simplified_geojson.encode('utf-8'), data_id=data_id, tolerance=tolerance)
+            cache_compressed_variants(geojson_cache, simplified_key)
+
+    @staticmethod
+    def get_simplified_key(layer_source: str, zoom: int) -> str:
+        return f'{layer_source}.z{zoom}'
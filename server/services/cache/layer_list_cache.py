@@ -0,0 +1,84 @@
+import re
+import time
+from typing import Optional
+
+from flask import current_app
+
+from server.services.cache.shared_cache import SharedCache
+
+VERSION_KEY = 'version'
+CACHEABLE_LOCALE = re.compile(r'^[\w-]{1,35}$')  # Other Accept-Language values aren't cached, as they're unbounded
+
+
+class LayerListCache:
+    """
+    Caches the serialized layer list for each locale.  The entries are shared between workers along with a version
+    counter, which LayerService bumps whenever it creates or updates a layer, so every worker on the host stops serving
+    the old list straight away.  Layers may also be changed on another host, or deleted directly as the API has no
+    delete endpoint, so entries are rebuilt from the DB after LAYER_LIST_MAX_AGE seconds
+    """
+
+    def __init__(self, cache_dir: str = None, max_age: int = None):
+        self.cache = SharedCache('layer_list', cache_dir)
+        self._max_age = max_age
+
+    @property
+    def max_age(self) -> int:
+        if self._max_age is None:
+            self._max_age = current_app.config['LAYER_LIST_MAX_AGE']
+        return self._max_age
+
+    def get_version(self) -> int:
+        """ Current version of the layer list, started from the time if the counter has been lost """
+        metadata = self.cache.get_metadata(VERSION_KEY)
+        if metadata is not None:
+            return metadata['version']
+
+        with self.cache.lock(VERSION_KEY):
+            metadata = self.cache.get_metadata(VERSION_KEY)
+            if metadata is not None:
+                return metadata['version']
+
+            # Started from the time rather than 0, so entries left by a lost counter can never match
+            version = int(time.time() * 1000)
+            self.cache.set(VERSION_KEY, b'', version=version)
+            return version
+
+    def invalidate(self):
+        """ Bumps the version, called once a layer change has been committed """
+        with self.cache.lock(VERSION_KEY):
+            metadata = self.cache.get_metadata(VERSION_KEY)
+            version = max(int(time.time() * 1000), metadata['version'] + 1 if metadata is not None else 0)
+            self.cache.set(VERSION_KEY, b'', version=version)
+
+    def get(self, locale: Optional[str], version: int) -> Optional[bytes]:
+        """ Returns the layer list cached for the locale, or None if it isn't cached for the version or is too old """
+        key = LayerListCache.get_key(locale)
+        if key is None:
+            return None
+
+        entry = self.cache.get(key)
+        if entry is None or entry.metadata.get('version') != version or entry.age > self.max_age:
+            return None
+
+        return entry.body
+
+    def set(self, locale: Optional[str], version: int, body: bytes):
+        """
+        Caches the layer list for the locale.  The version must be read before the layers are queried, so a list read
+        before a change is committed is never cached as the version after it
+        """
+        key = LayerListCache.get_key(locale)
+        if key is not None:
+            self.cache.set(key, body, version=version)
+
+    @staticmethod
+    def get_key(locale: Optional[str]) -> Optional[str]:
+        """ Cache key for the locale, None if the locale can't be cached.  No locale lists every locale """
+        if locale is None:
+            return 'layers'
+
+        return f'layers.{locale}' if CACHEABLE_LOCALE.match(locale) else None
+
+
+layer_list_cache = LayerListCache()
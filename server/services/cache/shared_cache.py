@@ -0,0 +1,238 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from flask import current_app
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Windows dev environments only run a single process, so a thread lock is sufficient
+
+PRUNE_MARKER_KEY = 'last_pruned'  # Touched each time the namespace is pruned, see SharedCache.is_prune_due
+
+
+class CacheEntry:
+    """ A cached body along with the metadata that was stored alongside it """
+    def __init__(self, body: bytes, metadata: dict):
+        self.body = body
+        self.metadata = metadata
+
+    @property
+    def updated(self) -> float:
+        """ Epoch time the entry was written """
+        return self.metadata.get('updated', 0)
+
+    @property
+    def age(self) -> float:
+        """ Age of the entry in seconds """
+        return time.time() - self.updated
+
+
+class SharedCache:
+    """
+    Simple disk backed cache that is shared between all uWSGI worker processes on the host.  Each entry is written
+    to a single file (JSON metadata line followed by the body) and swapped in atomically, so readers never see a
+    partially written entry.
+    """
+
+    _thread_locks = {}
+
+    def __init__(self, namespace: str, cache_dir: str = None):
+        self.namespace = namespace
+        self._cache_dir = cache_dir
+
+    @property
+    def cache_dir(self) -> str:
+        """ Directory the namespace is stored in, defaults to CACHE_DIR in the app config """
+        base_dir = self._cache_dir or current_app.config['CACHE_DIR']
+        namespace_dir = os.path.join(base_dir, self.namespace)
+
+        if not os.path.exists(namespace_dir):
+            os.makedirs(namespace_dir, exist_ok=True)
+
+        return namespace_dir
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f'{key}.cache')
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """ Returns the cached entry for the key, or None if nothing has been cached yet """
+        try:
+            with open(self._entry_path(key), 'rb') as f:
+                metadata = json.loads(f.readline().decode('utf-8'))
+                body = f.read()
+        except FileNotFoundError:
+            return None
+
+        return CacheEntry(body, metadata)
+
+    def get_metadata(self, key: str) -> Optional[dict]:
+        """ Returns only the metadata for the key, without reading the body from disk """
+        try:
+            with open(self._entry_path(key), 'rb') as f:
+                return json.loads(f.readline().decode('utf-8'))
+        except FileNotFoundError:
+            return None
+
+    def stream(self, key: str, chunk_size: int = 64 * 1024) -> Optional[Tuple[dict, Iterator[bytes]]]:
+        """
+        Returns the metadata for the key and a generator that reads the body from disk in chunks, or None if
+        nothing has been cached yet.  The file is opened immediately, so the body stays consistent with the metadata
+        even if the entry is replaced while it's being streamed
+        """
+        try:
+            entry_file = open(self._entry_path(key), 'rb')
+        except FileNotFoundError:
+            return None
+
+        metadata = json.loads(entry_file.readline().decode('utf-8'))
+
+        def body_chunks():
+            with entry_file:
+                for chunk in iter(lambda: entry_file.read(chunk_size), b''):
+                    yield chunk
+
+        return metadata, body_chunks()
+
+    def set(self, key: str, body: bytes, **metadata) -> CacheEntry:
+        """ Atomically writes the body and metadata for the key """
+        metadata = self.set_stream(key, [body], **metadata)
+        return CacheEntry(body, metadata)
+
+    def set_stream(self, key: str, chunks: Iterable[bytes], **metadata) -> dict:
+        """
+        Atomically writes the body for the key from an iterable of chunks, so large bodies never need to be held in
+        memory.  If the iterable raises the existing entry is left untouched.
+        :return: The metadata stored with the entry
+        """
+        metadata['updated'] = time.time()
+
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(json.dumps(metadata).encode('utf-8') + b'\n')
+                for chunk in chunks:
+                    f.write(chunk)
+            os.replace(temp_path, self._entry_path(key))
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        return metadata
+
+    def age(self, key: str) -> Optional[float]:
+        """ Seconds since the entry was last written or touched, or None if nothing has been cached yet """
+        try:
+            return time.time() - os.stat(self._entry_path(key)).st_mtime
+        except FileNotFoundError:
+            return None
+
+    def touch(self, key: str):
+        """ Marks the entry as fresh without rewriting it, used when the source is known not to have changed """
+        try:
+            os.utime(self._entry_path(key))
+        except FileNotFoundError:
+            pass
+
+    def list_entries(self) -> List[Tuple[str, int, float]]:
+        """ Returns the key, size in bytes and last modified epoch time of every entry in the namespace """
+        entries = []
+        for dir_entry in os.scandir(self.cache_dir):
+            if not dir_entry.name.endswith('.cache'):
+                continue
+
+            try:
+                entry_stat = dir_entry.stat()
+            except FileNotFoundError:
+                continue  # Deleted by another worker since the directory was read
+            entries.append((dir_entry.name[:-len('.cache')], entry_stat.st_size, entry_stat.st_mtime))
+
+        return entries
+
+    def prune(self, max_age: float, max_bytes: int) -> int:
+        """
+        Removes entries older than max_age, then the oldest entries until the namespace is within max_bytes
+        :return: The number of entries removed
+        """
+        entries = sorted((entry for entry in self.list_entries() if entry[0] != PRUNE_MARKER_KEY),
+                         key=lambda entry: entry[2])
+        disk_used = sum(size for _, size, _ in entries)
+        expired_before = time.time() - max_age
+
+        removed = 0
+        for key, size, modified in entries:  # Oldest first
+            if modified >= expired_before and disk_used <= max_bytes:
+                break
+
+            self.delete(key)
+            disk_used -= size
+            removed += 1
+
+        return removed
+
+    def is_prune_due(self, interval: float) -> bool:
+        """
+        Returns True at most once every interval seconds, to whichever worker on the host asks first, so only that
+        worker prunes the namespace
+        """
+        last_pruned = self.age(PRUNE_MARKER_KEY)
+        if last_pruned is None:
+            self.set(PRUNE_MARKER_KEY, b'')  # A new cache has nothing to prune yet, so start the clock
+            return False
+        if last_pruned < interval:
+            return False
+
+        with self.lock(PRUNE_MARKER_KEY, blocking=False) as acquired:
+            if not acquired or self.age(PRUNE_MARKER_KEY) < interval:
+                return False  # Another worker is pruning, or just has
+
+            self.set(PRUNE_MARKER_KEY, b'')
+            return True
+
+    def delete(self, key: str):
+        """ Removes the key from the cache if it exists """
+        try:
+            os.remove(self._entry_path(key))
+        except FileNotFoundError:
+            pass
+
+    @contextmanager
+    def lock(self, key: str, blocking: bool = True):
+        """
+        Cross process lock for the key, used to ensure only one worker refreshes an entry at a time
+        :param key: Key to lock
+        :param blocking: If False yields False immediately when another process holds the lock
+        :return: Yields True if the lock was acquired
+        """
+        lock_path = os.path.join(self.cache_dir, f'{key}.lock')
+        thread_lock = SharedCache._thread_locks.setdefault(lock_path, threading.Lock())
+
+        # flock is held per open file, so also serialise threads within this process
+        if not thread_lock.acquire(blocking):
+            yield False
+            return
+
+        try:
+            if fcntl is None:
+                yield True
+                return
+
+            with open(lock_path, 'a') as lock_file:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    yield False
+                    return
+
+                try:
+                    yield True
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+        finally:
+            thread_lock.release()
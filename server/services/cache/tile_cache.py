@@ -0,0 +1,231 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+from urllib.parse import parse_qs, urlencode
+
+from flask import current_app
+
+from server.services.cache.shared_cache import CacheEntry, SharedCache
+
+
+class WMSTileCache:
+    """
+    Two tier cache for rendered WMS GetMap tiles.  Each worker keeps the most recently used tiles in memory, evicting
+    the least recently used once WMS_TILE_CACHE_MEMORY_MB is exceeded, backed by a disk tier shared between workers.
+    Tiles are expired by the TTL of their layers, see WMS_TILE_CACHE_TTL.  The disk tier is pruned as tiles are
+    written, see prune_disk
+    """
+
+    def __init__(self, cache_dir: str = None, memory_bytes: int = None, disk_bytes: int = None,
+                 prune_seconds: int = None):
+        self._cache_dir = cache_dir
+        self._memory_bytes = memory_bytes
+        self._disk_bytes = disk_bytes
+        self._prune_seconds = prune_seconds
+        self._disk_cache = None
+        self._memory_cache = OrderedDict()  # key -> CacheEntry, least recently used first
+        self._memory_used = 0
+        self._lock = threading.Lock()
+
+    @property
+    def disk_cache(self) -> SharedCache:
+        if self._disk_cache is None:
+            self._disk_cache = SharedCache('wms_tiles', self._cache_dir or current_app.config['WMS_TILE_CACHE_DIR'])
+        return self._disk_cache
+
+    @property
+    def memory_bytes(self) -> int:
+        """ Maximum size of the tiles held in memory by this worker """
+        if self._memory_bytes is None:
+            self._memory_bytes = current_app.config['WMS_TILE_CACHE_MEMORY_MB'] * 1024 * 1024
+        return self._memory_bytes
+
+    @property
+    def disk_bytes(self) -> int:
+        """ Maximum size of the tiles held on disk, shared by all workers on the host """
+        if self._disk_bytes is None:
+            self._disk_bytes = current_app.config['WMS_TILE_CACHE_DISK_MB'] * 1024 * 1024
+        return self._disk_bytes
+
+    @property
+    def prune_seconds(self) -> int:
+        """ Minimum seconds between prunes of the disk tier """
+        if self._prune_seconds is None:
+            self._prune_seconds = current_app.config['WMS_TILE_CACHE_PRUNE_SECONDS']
+        return self._prune_seconds
+
+    @staticmethod
+    def get_cache_key(query_string: str) -> Optional[Tuple[str, List[str]]]:
+        """
+        Normalizes the WMS parameters so equivalent GetMap requests share a cache key, eg parameter names are case
+        insensitive and 0,0,10,10 is the same BBOX as 0.0,0.0,10.0,10.0
+        :return: The cache key and the requested layers, or None if the request isn't a cacheable GetMap
+        """
+        params = {name.upper(): values[0] for name, values in parse_qs(query_string).items()}
+
+        if params.pop('REQUEST', '').lower() != 'getmap' or 'LAYERS' not in params:
+            return None
+
+        if 'CRS' in params:
+            params['SRS'] = params.pop('CRS')  # WMS 1.3.0 renamed SRS, VERSION is still in the key for axis order
+
+        try:
+            params['BBOX'] = ','.join(repr(float(value)) for value in params['BBOX'].split(','))
+            params['WIDTH'] = str(int(params['WIDTH']))
+            params['HEIGHT'] = str(int(params['HEIGHT']))
+        except (KeyError, ValueError):
+            return None  # Invalid request, leave GeoServer to report the error
+
+        layers = [layer.strip() for layer in params['LAYERS'].split(',')]
+        params['LAYERS'] = ','.join(layers)
+        params['STYLES'] = ','.join(style.strip() for style in params.get('STYLES', '').split(','))
+        params['FORMAT'] = params.get('FORMAT', '').lower()
+        params['SRS'] = params.get('SRS', '').upper()
+        params['SERVICE'] = params.get('SERVICE', '').upper()
+
+        normalized_query = urlencode(sorted(params.items()))
+        return hashlib.sha1(normalized_query.encode('utf-8')).hexdigest(), layers
+
+    @staticmethod
+    def get_ttl(layers: List[str]) -> int:
+        """ Seconds a tile can be cached for, the shortest TTL of its layers.  0 means the tile isn't cached """
+        layer_ttls = current_app.config['WMS_TILE_CACHE_TTL']
+        return min(layer_ttls.get(layer, layer_ttls['default']) for layer in layers)
+
+    def get(self, key: str, ttl: int) -> Optional[CacheEntry]:
+        """ Returns the cached tile if it's younger than the ttl, checking memory before disk """
+        with self._lock:
+            entry = self._memory_cache.get(key)
+            if entry is not None:
+                self._memory_cache.move_to_end(key)
+
+        if entry is None or entry.age >= ttl:
+            # Another worker may already have refreshed the tile on disk
+            entry = self.disk_cache.get(key)
+            if entry is None or entry.age >= ttl:
+                return None
+            self._remember(key, entry)
+
+        return entry
+
+    def set(self, key: str, body: bytes, content_type: str) -> CacheEntry:
+        """ Caches the tile in both tiers """
+        entry = self.disk_cache.set(key, body, content_type=content_type)
+        self._remember(key, entry)
+        self._prune_disk_if_due()
+        return entry
+
+    def prune_disk(self, max_age: float = None) -> int:
+        """
+        Removes tiles from the disk tier that are older than max_age, then the oldest tiles until the tier is within
+        WMS_TILE_CACHE_DISK_MB.  Expired tiles are otherwise only skipped on read, so are never removed
+        :param max_age: Seconds, defaults to the longest TTL in WMS_TILE_CACHE_TTL as no layer can use older tiles
+        :return: The number of tiles removed
+        """
+        if max_age is None:
+            max_age = max(current_app.config['WMS_TILE_CACHE_TTL'].values())
+
+        return self.disk_cache.prune(max_age, self.disk_bytes)
+
+    def _prune_disk_if_due(self):
+        """ Prunes the disk tier at most every WMS_TILE_CACHE_PRUNE_SECONDS, by whichever worker gets there first """
+        if self.disk_cache.is_prune_due(self.prune_seconds):
+            self.prune_disk()
+
+    def _remember(self, key: str, entry: CacheEntry):
+        """ Adds the entry to the memory tier, evicting the least recently used tiles to make room """
+        entry_size = len(entry.body)
+        if entry_size > self.memory_bytes:
+            return
+
+        with self._lock:
+            previous_entry = self._memory_cache.pop(key, None)
+            if previous_entry is not None:
+                self._memory_used -= len(previous_entry.body)
+
+            self._memory_cache[key] = entry
+            self._memory_used += entry_size
+
+            while self._memory_used > self.memory_bytes:
+                _, evicted_entry = self._memory_cache.popitem(last=False)
+                self._memory_used -= len(evicted_entry.body)
+
+
+class VectorTileCache:
+    """
+    Disk cache of the Mapbox Vector Tiles cut by the mvt endpoint, shared between workers.  Only tiles with features
+    up to VECTOR_TILE_CACHE_MAX_ZOOM are cached, as there are too many deeper tiles to ever be reused.  The cache is
+    pruned by age and size as tiles are written, the same as the WMS tile cache
+    """
+
+    def __init__(self, cache_dir: str = None, max_zoom: int = None, max_age: int = None, disk_bytes: int = None,
+                 prune_seconds: int = None):
+        self._cache_dir = cache_dir
+        self._max_zoom = max_zoom
+        self._max_age = max_age
+        self._disk_bytes = disk_bytes
+        self._prune_seconds = prune_seconds
+        self._disk_cache = None
+
+    @property
+    def disk_cache(self) -> SharedCache:
+        if self._disk_cache is None:
+            self._disk_cache = SharedCache('mvt', self._cache_dir or current_app.config['CACHE_DIR'])
+        return self._disk_cache
+
+    @property
+    def max_zoom(self) -> int:
+        """ Deepest zoom level tiles are cached for """
+        if self._max_zoom is None:
+            self._max_zoom = current_app.config['VECTOR_TILE_CACHE_MAX_ZOOM']
+        return self._max_zoom
+
+    @property
+    def max_age(self) -> int:
+        """ Seconds a tile is kept on disk since it was last written """
+        if self._max_age is None:
+            self._max_age = current_app.config['VECTOR_TILE_CACHE_MAX_AGE']
+        return self._max_age
+
+    @property
+    def disk_bytes(self) -> int:
+        """ Maximum size of the tiles held on disk, shared by all workers on the host """
+        if self._disk_bytes is None:
+            self._disk_bytes = current_app.config['VECTOR_TILE_CACHE_DISK_MB'] * 1024 * 1024
+        return self._disk_bytes
+
+    @property
+    def prune_seconds(self) -> int:
+        """ Minimum seconds between prunes of the cache """
+        if self._prune_seconds is None:
+            self._prune_seconds = current_app.config['VECTOR_TILE_CACHE_PRUNE_SECONDS']
+        return self._prune_seconds
+
+    def get(self, layer_source: str, data_id: int, z: int, x: int, y: int) -> Optional[bytes]:
+        """ Returns the cached tile if it was cut from the data_id version of the layer """
+        if z > self.max_zoom:
+            return None
+
+        entry = self.disk_cache.get(f'{layer_source}-{z}-{x}-{y}')
+        if entry is None or entry.metadata.get('data_id') != data_id:
+            return None
+
+        return entry.body
+
+    def set(self, layer_source: str, data_id: int, z: int, x: int, y: int, body: bytes):
+        """ Caches the tile, unless it's empty or deeper than VECTOR_TILE_CACHE_MAX_ZOOM """
+        if not body or z > self.max_zoom:
+            return
+
+        self.disk_cache.set(f'{layer_source}-{z}-{x}-{y}', body, data_id=data_id)
+        if self.disk_cache.is_prune_due(self.prune_seconds):
+            self.prune_disk()
+
+    def prune_disk(self) -> int:
+        """
+        Removes tiles older than VECTOR_TILE_CACHE_MAX_AGE, then the oldest tiles until the cache is within
+        VECTOR_TILE_CACHE_DISK_MB.  Tiles from old versions of the data are otherwise only overwritten when requested
+        :return: The number of tiles removed
+        """
+        return self.disk_cache.prune(self.max_age, self.disk_bytes)
@@ -10,6 +10,15 @@ arcgis2geojson is made available under the MIT License.
 """
 
 import numbers
+from functools import lru_cache
+from operator import itemgetter
+
+# Relative margin added to bounding boxes, so a bounds check never rules out a case the exact tests below would
+# accept because of floating point rounding
+BOUNDS_EPSILON = 1e-9
+
+# Polygons with holes and at least this many vertices in total are tested with NumPy, if it's installed
+NUMPY_MIN_VERTICES = 100
 
 
 def pointsEqual(a, b):
@@ -99,16 +108,124 @@ def coordinatesContainCoordinates(outer, inner):
     return False
 
 
-def convertRingsToGeoJSON(rings):
+def boundsMargin(*values):
+    return BOUNDS_EPSILON * max(1.0, *(abs(value) for value in values))
+
+
+def ringBounds(ring):
+    """
+    minx, miny, maxx, maxy of the ring, expanded by a small margin
+    """
+    xs = [c[0] for c in ring]
+    ys = [c[1] for c in ring]
+    bounds = (min(xs), min(ys), max(xs), max(ys))
+    margin = boundsMargin(*bounds)
+    return bounds[0] - margin, bounds[1] - margin, bounds[2] + margin, bounds[3] + margin
+
+
+def boundsIntersect(a, b):
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def boundsContainPoint(bounds, point):
+    return bounds[0] <= point[0] <= bounds[2] and bounds[1] <= point[1] <= bounds[3]
+
+
+def arrayIntersectsArrayIndexed(a, b):
+    """
+    same result as arrayIntersectsArray, but sweeps the segments of both arrays in x order so only segments with
+    overlapping bounding boxes are tested, rather than every pair
+    """
+    segments = []
+    for array_index, coordinates in enumerate((a, b)):
+        for i in range(0, len(coordinates) - 1):
+            p1 = coordinates[i]
+            p2 = coordinates[i + 1]
+            margin = boundsMargin(p1[0], p1[1], p2[0], p2[1])
+            segments.append((min(p1[0], p2[0]) - margin, max(p1[0], p2[0]) + margin,
+                             min(p1[1], p2[1]) - margin, max(p1[1], p2[1]) + margin, array_index, p1, p2))
+
+    segments.sort(key=itemgetter(0))
+    active = ([], [])  # segments from a and b whose x range may still overlap the sweep position
+
+    for segment in segments:
+        min_x, _, min_y, max_y, array_index, p1, p2 = segment
+        other_active = [s for s in active[1 - array_index] if s[1] >= min_x]
+        active[1 - array_index][:] = other_active
+
+        for other in other_active:
+            if other[2] <= max_y and min_y <= other[3]:
+                # keep the argument order of arrayIntersectsArray, so rounding is identical
+                if array_index == 0 and vertexIntersectsVertex(p1, p2, other[5], other[6]):
+                    return True
+                if array_index == 1 and vertexIntersectsVertex(other[5], other[6], p1, p2):
+                    return True
+
+        active[array_index].append(segment)
+
+    return False
+
+
+class PythonKernels:
+    """
+    the ring tests above, working on rings as lists.  NumpyKernels in geometry_kernels is the vectorized equivalent
+    """
+    prepare = staticmethod(lambda ring: ring)
+    bounds = staticmethod(ringBounds)
+    is_clockwise = staticmethod(ringIsClockwise)
+    contains_point = staticmethod(coordinatesContainPoint)
+    intersects = staticmethod(arrayIntersectsArrayIndexed)
+
+
+@lru_cache(maxsize=None)
+def loadNumpyKernels():
+    """
+    the NumPy backend, or None if NumPy isn't installed.  Imported on first use, as geometry_kernels imports this module
+    """
+    try:
+        from server.services.data_ingest.geometry_kernels import NumpyKernels
+    except ImportError:
+        return None
+    return NumpyKernels
+
+
+def getKernels(rings, backend=None):
+    """
+    backend is 'numpy' or 'python'.  By default NumPy is used if there's more than one ring, with NUMPY_MIN_VERTICES
+    or more in total, otherwise converting to arrays costs more than it saves.  Falls back to pure Python if NumPy
+    isn't installed
+    """
+    if backend is None:
+        manyVertices = len(rings) > 1 and sum(len(ring) for ring in rings) >= NUMPY_MIN_VERTICES
+        backend = 'numpy' if manyVertices else 'python'
+
+    if backend == 'numpy' and loadNumpyKernels() is not None:
+        return loadNumpyKernels()
+    return PythonKernels
+
+
+def coordinatesContainCoordinatesIndexed(kernels, outer, outerBounds, inner, preparedInner):
+    """
+    same result as coordinatesContainCoordinates, with the cheap checks first.  The point in polygon test is
+    only run if the first point of inner is within the bounds of outer, and the segment intersection test only if it
+    is contained
+    """
+    if not boundsContainPoint(outerBounds, inner[0]) or not kernels.contains_point(outer, inner[0]):
+        return False
+    return not kernels.intersects(outer, preparedInner)
+
+
+def convertRingsToGeoJSON(rings, backend=None):
     """
     do any polygons in this array contain any other polygons in this array?
     used for checking for holes in arcgis rings
     """
 
+    kernels = getKernels(rings, backend)
     outerRings = []
+    preparedOuterRings = []  # outer rings in the form the kernels work on
     holes = []
     x = None  # iterator
-    outerRing = None  # current outer ring being evaluated
     hole = None  # current hole being evaluated
 
     # for each ring
@@ -118,25 +235,28 @@ def convertRingsToGeoJSON(rings):
             continue
 
         # is this ring an outer ring? is it clockwise?
-        if ringIsClockwise(ring):
+        preparedRing = kernels.prepare(ring)
+        if kernels.is_clockwise(preparedRing):
             polygon = [ring]
             outerRings.append(polygon)  # push to outer rings
+            preparedOuterRings.append(preparedRing)
         else:
-            holes.append(ring)  # counterclockwise push to holes
+            holes.append((ring, preparedRing))  # counterclockwise push to holes
 
     uncontainedHoles = []
+    outerBounds = [kernels.bounds(preparedRing) for preparedRing in preparedOuterRings]
 
     # while there are holes left...
     while len(holes):
         # pop a hole off out stack
-        hole = holes.pop()
+        hole, preparedHole = holes.pop()
 
         # loop over all outer rings and see if they contain our hole.
         contained = False
         x = len(outerRings) - 1
         while (x >= 0):
-            outerRing = outerRings[x][0]
-            if coordinatesContainCoordinates(outerRing, hole):
+            if coordinatesContainCoordinatesIndexed(kernels, preparedOuterRings[x], outerBounds[x], hole,
+                                                    preparedHole):
                 # the hole is contained push it into our polygon
                 outerRings[x].append(hole)
                 contained = True
@@ -146,19 +266,19 @@ def convertRingsToGeoJSON(rings):
         # ring is not contained in any outer ring
         # sometimes this happens https://github.com/Esri/esri-leaflet/issues/320
         if not contained:
-            uncontainedHoles.append(hole)
+            uncontainedHoles.append((hole, preparedHole))
 
     # if we couldn't match any holes using contains we can try intersects...
     while len(uncontainedHoles):
         # pop a hole off out stack
-        hole = uncontainedHoles.pop()
+        hole, preparedHole = uncontainedHoles.pop()
 
         # loop over all outer rings and see if any intersect our hole.
         intersects = False
+        holeBounds = kernels.bounds(preparedHole)
         x = len(outerRings) - 1
         while (x >= 0):
-            outerRing = outerRings[x][0]
-            if arrayIntersectsArray(outerRing, hole):
+            if boundsIntersect(outerBounds[x], holeBounds) and kernels.intersects(preparedOuterRings[x], preparedHole):
                 # the hole is contained push it into our polygon
                 outerRings[x].append(hole)
                 intersects = True
@@ -167,6 +287,8 @@ def convertRingsToGeoJSON(rings):
 
         if not intersects:
             outerRings.append([hole[::-1]])
+            preparedOuterRings.append(kernels.prepare(hole[::-1]))
+            outerBounds.append(holeBounds)
 
     if len(outerRings) == 1:
         return {
@@ -180,6 +302,17 @@ def convertRingsToGeoJSON(rings):
         }
 
 
+def getFeatureId(attributes, idAttribute=None):
+    """
+    Returns the id of an ArcGIS feature from its attributes, the idAttribute if supplied, otherwise OBJECTID or FID
+    """
+    for attribute in (idAttribute, 'OBJECTID', 'FID'):
+        if attribute in attributes:
+            return attributes[attribute]
+
+    return None
+
+
 def arcgis2geojson(arcgis, idAttribute=None):
     """
     Convert an ArcGIS JSON object to a GeoJSON object
@@ -216,12 +349,9 @@ def arcgis2geojson(arcgis, idAttribute=None):
 
         if 'attributes' in arcgis:
             geojson['properties'] = arcgis['attributes']
-            if idAttribute in arcgis['attributes']:
-                geojson['id'] = arcgis['attributes'][idAttribute]
-            elif 'OBJECTID' in arcgis['attributes']:
-                geojson['id'] = arcgis['attributes']['OBJECTID']
-            elif 'FID' in arcgis['attributes']:
-                geojson['id'] = arcgis['attributes']['FID']
+            featureId = getFeatureId(arcgis['attributes'], idAttribute)
+            if featureId is not None:
+                geojson['id'] = featureId
         else:
             geojson['properties'] = None
 
@@ -0,0 +1,31 @@
+from typing import BinaryIO, Iterator
+
+import ijson
+
+DEFAULT_WKID = 3857
+
+
+class ArcGISFeatureReader:
+    """
+    Reads the features of an ArcGIS FeatureSet one at a time from a seekable file like object, so the FeatureSet is
+    never held in memory in full
+    """
+
+    def __init__(self, stream: BinaryIO):
+        self.stream = stream
+        self.feature_count = 0
+
+    def get_wkid(self) -> int:
+        """
+        Reads the spatialReference wkid.  It's normally before the features, so only the start of the FeatureSet is
+        parsed, but the whole FeatureSet is scanned if it's missing
+        """
+        self.stream.seek(0)
+        wkid = next(ijson.items(self.stream, 'spatialReference.wkid'), None)
+        return DEFAULT_WKID if wkid is None else wkid
+
+    def __iter__(self) -> Iterator[dict]:
+        self.stream.seek(0)
+        for feature in ijson.items(self.stream, 'features.item', use_float=True):
+            self.feature_count += 1
+            yield feature
@@ -1,7 +1,20 @@
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+from collections import deque
+from typing import BinaryIO, Iterable, Iterator, List, TextIO, Tuple
+
 from flask import current_app
+from ijson import JSONError
 from server.models.postgis.dmis_data import DMISData
-from geojson import Feature, FeatureCollection
-from server.services.data_ingest.arcgis2geojson import arcgis2geojson
+from server.models.postgis.dmis_feature import DMISFeature
+from server.services.cache.geojson_cache import GeoJSONCache
+from geojson import Feature
+from server.services.data_ingest.arcgis2geojson import arcgis2geojson, getFeatureId
+from server.services.data_ingest.arcgis_feature_reader import ArcGISFeatureReader
 
 
 class DataIngestError(Exception):
@@ -11,47 +24,187 @@ class DataIngestError(Exception):
             current_app.logger.error(message)
 
 
+DYNAMIC_ASSESSMENT_DATA_SOURCES = ['ktm_pcdm_affected_healthcenter', 'ktm_pcdm_affected_road',
+                                   'ktm_pcdm_affected_school', 'ktm_pcdm_affected_wells', 'ktm_pcdm_at_risk_commune',
+                                   'ktm_pcdm_at_risk_village', 'ktm_pcdm_data_daily_actual']
+DEFAULT_CHUNK_SIZE = 1000  # Features converted at a time when there's no app config
+MAX_REPORTED_ERRORS = 20  # Features listed in the error message when a FeatureSet can't be converted
+FEATURE_ROWS_MAX_MEMORY = 16 * 1024 * 1024  # Features staged for dmis_features spill to a temp file beyond this size
+
+
+def iter_chunks(items: Iterator, chunk_size: int) -> Iterator[Tuple[list, int]]:
+    """ Generator splits the items into lists of chunk_size, each with the index of its first item """
+    for start_index in itertools.count(0, chunk_size):
+        chunk = list(itertools.islice(items, chunk_size))
+        if not chunk:
+            return
+        yield chunk, start_index
+
+
+def convert_arcgis_features(source_features: Iterable[dict], start_index: int = 0) -> Tuple[List[Feature], List[str]]:
+    """
+    Converts ArcGIS features to GeoJSON features.  A module level function so chunks can be converted in a process pool
+    :param source_features: ArcGIS features
+    :param start_index: Index of the first feature in the FeatureSet, so errors can identify the feature
+    :return: The converted features and a description of each feature that couldn't be converted
+    """
+    features = []
+    errors = []
+    for index, source_feature in enumerate(source_features, start_index):
+        try:
+            # Get attributes
+            new_feature_attributes = source_feature.get("attributes", {})
+            # Format geometry and add to feature
+            new_feature_geometry = arcgis2geojson(source_feature.get("geometry", {}))
+            features.append(Feature(geometry=new_feature_geometry, properties=new_feature_attributes))
+        except Exception as e:
+            attributes = (source_feature.get('attributes') if isinstance(source_feature, dict) else None) or {}
+            feature_id = getFeatureId(attributes)
+            feature = f'feature {index}' if feature_id is None else f'feature {index} (id {feature_id})'
+            errors.append(f'{feature}: {type(e).__name__} {e}')
+
+    return features, errors
+
+
 class DataIngestService:
 
     @staticmethod
-    def process_data(data_source: str, raw_request):
+    def validate_data_source(data_source: str):
+        """ Raises a DataIngestError if we don't know how to ingest data for the source """
+        if data_source.lower() != 'river-gauge' and data_source.lower() not in DYNAMIC_ASSESSMENT_DATA_SOURCES:
+            raise DataIngestError(f'Unknown data source {data_source}')
+
+    @staticmethod
+    def process_data(data_source: str, payload: BinaryIO):
+        """
+        Converts and saves the JSON pushed for the data source
+        :param data_source: Name of the data source
+        :param payload: File like object the JSON pushed is read from
+        :raises DataIngestError: If the data source is unknown or the JSON is invalid
+        """
         data_source = data_source.lower()
+        DataIngestService.validate_data_source(data_source)
         dmis_data = DMISData()
 
-        dynamic_assessment_data_sources = ['ktm_pcdm_affected_healthcenter', 'ktm_pcdm_affected_road',
-                                           'ktm_pcdm_affected_school', 'ktm_pcdm_affected_wells',
-                                           'ktm_pcdm_at_risk_commune', 'ktm_pcdm_at_risk_village',
-                                           'ktm_pcdm_data_daily_actual']
-
         if data_source == 'river-gauge':
             # TODO may want to save to a separate river gauge table in future
-            dmis_data.save_json_data(data_source, raw_request.get_json())
-        elif data_source in dynamic_assessment_data_sources:
-            geojson = DataIngestService._process_arcgis_json(raw_request.get_json())
-            dmis_data.save_json_data(data_source, geojson)
+            try:
+                payload_bytes = payload.read()
+                json_data = json.loads(payload_bytes.decode('utf-8')) if payload_bytes else None
+            except ValueError as e:
+                raise DataIngestError(f'Invalid JSON: {str(e)}')
+            dmis_data.save_json_data(data_source, json_data)
         else:
-            raise DataIngestError(f'Unknown data source {data_source}')
+            with tempfile.SpooledTemporaryFile(max_size=FEATURE_ROWS_MAX_MEMORY, mode='w+') as feature_rows:
+                wkid = DataIngestService._write_arcgis_feature_rows(payload, feature_rows)
+                feature_rows.seek(0)
+                if not dmis_data.save_feature_delta(data_source, feature_rows,
+                                                    DataIngestService._get_geojson_crs(wkid), wkid):
+                    current_app.logger.debug(f'No features changed for {data_source}, keeping the current version')
+                    return
+
+        # Lets clients polling this host see the new data straight away, already compressed
+        GeoJSONCache.set_data_version(data_source, dmis_data.data_id)
+        GeoJSONCache.cache_geojson(data_source, dmis_data.data_id)
 
     @staticmethod
-    def _process_arcgis_json(arcgis_json):
+    def _write_arcgis_feature_rows(arcgis_stream: BinaryIO, feature_rows: TextIO) -> int:
         """
-        Converts ArcGIS json into GeoJSON
-        :param arcgis_json: ArcGIS json object
-        :return: FeatureCollection (GeoJSON)
+        Converts the features of the ArcGIS json, writing each as a row for DMISFeature.apply_delta, keyed on its
+        OBJECTID or FID.  Features without an id, or with the same id as an earlier feature, are keyed on position
+        :param arcgis_stream: Seekable file like object the ArcGIS json is read from
+        :raises DataIngestError: If the json is invalid or any features can't be converted, listing each of them
+        :return: EPSG code of the CRS
         """
-        features = []
-        source_features = arcgis_json.get('features', [])
-        for source_feature in source_features:
-            # Get attributes
-            new_feature_attributes = source_feature.get("attributes", {})
-            # Format geometry and add to feature
-            new_feature_geometry = arcgis2geojson(source_feature.get("geometry", {}))
-            new_feature = Feature(geometry=new_feature_geometry, properties=new_feature_attributes)
-            features.append(new_feature)
-        # Add CRS
-        epsg_code = arcgis_json.get('spatialReference', {}).get('wkid', 3857)
-        dataset = FeatureCollection(features, crs=DataIngestService._get_geojson_crs(epsg_code))
-        return dataset
+        reader = ArcGISFeatureReader(arcgis_stream)
+        wkid = DataIngestService._read_wkid(reader)
+
+        feature_keys = set()
+        for feature_index, feature in enumerate(DataIngestService._iter_geojson_features(reader)):
+            properties = feature.get('properties') or {}
+            feature_id = getFeatureId(properties)
+            feature_key = f'#{feature_index}' if feature_id is None else str(feature_id)
+            if feature_key in feature_keys:
+                feature_key = f'{feature_key}#{feature_index}'
+            feature_keys.add(feature_key)
+
+            geometry = feature.get('geometry')  # Empty if the ArcGIS feature has no geometry
+            feature_rows.write(DMISFeature.get_copy_row(feature_key, feature_index, json.dumps(feature['properties']),
+                                                        json.dumps(geometry) if geometry else None))
+
+        return wkid
+
+    @staticmethod
+    def _read_wkid(reader: ArcGISFeatureReader) -> int:
+        try:
+            return reader.get_wkid()
+        except JSONError as e:
+            raise DataIngestError(f'Invalid JSON: {str(e)}')
+
+    @staticmethod
+    def _iter_geojson_features(reader: ArcGISFeatureReader) -> Iterator[Feature]:
+        """
+        Generator converts the features read, in order.  Chunks are converted across a process pool once there are
+        more than ARCGIS_PARALLEL_THRESHOLD features.  Errors are raised once every feature has been read, so they can
+        all be reported
+        """
+        errors = []
+        try:
+            for features, chunk_errors in DataIngestService._convert_arcgis_features(iter(reader)):
+                yield from features
+                errors.extend(chunk_errors)
+        except JSONError as e:
+            raise DataIngestError(f'Invalid JSON: {str(e)}')
+
+        if errors:
+            raise DataIngestError(f'Unable to convert {len(errors)} of {reader.feature_count} features, '
+                                  + '; '.join(errors[:MAX_REPORTED_ERRORS]))
+
+    @staticmethod
+    def _convert_arcgis_features(source_features: Iterator[dict]) -> Iterator[Tuple[List[Feature], List[str]]]:
+        """
+        Generator converts the features a chunk at a time.  Up to ARCGIS_PARALLEL_THRESHOLD features are read ahead, if
+        there are more the chunks are converted across a process pool
+        """
+        chunk_size, processes, threshold = DEFAULT_CHUNK_SIZE, 1, 0
+        if current_app:
+            chunk_size = current_app.config['ARCGIS_PARALLEL_CHUNK_SIZE']
+            processes = current_app.config['ARCGIS_PARALLEL_PROCESSES']
+            threshold = current_app.config['ARCGIS_PARALLEL_THRESHOLD']
+
+        read_ahead = list(itertools.islice(source_features, threshold + 1)) if processes > 1 else []
+        chunks = iter_chunks(itertools.chain(read_ahead, source_features), chunk_size)
+
+        if processes <= 1 or len(read_ahead) <= threshold:
+            for chunk, start_index in chunks:
+                yield convert_arcgis_features(chunk, start_index)
+            return
+
+        with DataIngestService._get_spawn_context().Pool(processes) as pool:
+            # Only a few chunks are read ahead of the conversion, and results are returned in the order submitted
+            pending = deque()
+            for chunk, start_index in chunks:
+                pending.append(pool.apply_async(convert_arcgis_features, (chunk, start_index)))
+                if len(pending) >= 2 * processes:
+                    yield pending.popleft().get()
+
+            while pending:
+                yield pending.popleft().get()
+
+    @staticmethod
+    def _get_spawn_context():
+        """
+        Pool processes are spawned rather than forked.  Ingest runs on a thread of a multi threaded worker that holds
+        open DB connections, neither of which survive a fork safely
+        """
+        spawn_context = multiprocessing.get_context('spawn')
+
+        # Under uWSGI sys.executable is the uwsgi binary, so spawn the interpreter it embeds instead
+        python_executable = os.path.join(sys.exec_prefix, 'bin', 'python3')
+        if os.path.basename(sys.executable).startswith('uwsgi') and os.path.exists(python_executable):
+            spawn_context.set_executable(python_executable)
+
+        return spawn_context
 
     @staticmethod
     def _get_geojson_crs(epsg_code):
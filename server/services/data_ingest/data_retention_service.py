@@ -0,0 +1,163 @@
+import datetime
+import gzip
+import os
+import re
+from typing import Dict, List, NamedTuple, Optional
+
+from flask import current_app
+from sqlalchemy import text
+
+from server import db
+
+PARTITION_NAME = re.compile(r'^dmis_data_p(\d{4})(\d{2})$')
+
+
+class Partition(NamedTuple):
+    """ A monthly partition of the dmis_data table """
+    name: str
+    lower_bound: datetime.datetime
+    upper_bound: datetime.datetime
+
+
+class DataRetentionService:
+
+    @staticmethod
+    def get_partition_for_month(month_start: datetime.date) -> Partition:
+        """ Returns the partition details for the month the supplied date falls in """
+        lower_bound = datetime.datetime(month_start.year, month_start.month, 1)
+        upper_bound = datetime.datetime(lower_bound.year + lower_bound.month // 12, lower_bound.month % 12 + 1, 1)
+        return Partition(f'dmis_data_p{lower_bound:%Y%m}', lower_bound, upper_bound)
+
+    @staticmethod
+    def get_partitions() -> List[Partition]:
+        """ Returns all monthly partitions of dmis_data, oldest first.  The default partition is not included """
+        result = db.session.execute(text('''
+            SELECT child.relname
+              FROM pg_inherits
+              JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+              JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+             WHERE parent.relname = 'dmis_data'
+        '''))
+
+        partitions = []
+        for partition_name, in result:
+            match = PARTITION_NAME.match(partition_name)
+            if match:
+                partitions.append(DataRetentionService.get_partition_for_month(
+                    datetime.date(int(match.group(1)), int(match.group(2)), 1)))
+
+        return sorted(partitions, key=lambda partition: partition.lower_bound)
+
+    @staticmethod
+    def ensure_partitions(months_ahead: int = 3):
+        """
+        Creates monthly partitions from the current month to months_ahead months in the future.  Any rows that
+        landed in the default partition, because their partition didn't exist yet, are moved into the new partition
+        """
+        existing_partitions = {partition.name for partition in DataRetentionService.get_partitions()}
+        month_start = datetime.date.today().replace(day=1)
+
+        for _ in range(months_ahead + 1):
+            partition = DataRetentionService.get_partition_for_month(month_start)
+            month_start = partition.upper_bound.date()
+
+            if partition.name in existing_partitions:
+                continue
+
+            current_app.logger.info(f'Creating dmis_data partition {partition.name}')
+            bounds = {'lower_bound': partition.lower_bound, 'upper_bound': partition.upper_bound}
+            db.session.execute(text(f'CREATE TABLE {partition.name} (LIKE dmis_data INCLUDING DEFAULTS)'))
+            db.session.execute(text(f'''
+                WITH moved AS (
+                    DELETE FROM dmis_data_default
+                     WHERE data_received >= :lower_bound AND data_received < :upper_bound
+                 RETURNING *
+                )
+                INSERT INTO {partition.name} SELECT * FROM moved
+            '''), bounds)
+            db.session.execute(text(f'ALTER TABLE dmis_data ATTACH PARTITION {partition.name} '
+                                    f'FOR VALUES FROM (:lower_bound) TO (:upper_bound)'), bounds)
+
+        db.session.commit()
+
+    @staticmethod
+    def get_retention_cutoffs(now: datetime.datetime) -> Dict[Optional[str], datetime.datetime]:
+        """ Returns the time before which data can be removed for each known data source """
+        retention_days = current_app.config['DMIS_DATA_RETENTION_DAYS']
+        data_sources = [r for r, in db.session.execute(text('SELECT DISTINCT data_source FROM dmis_data_latest'))]
+
+        return {data_source: now - datetime.timedelta(days=retention_days.get(data_source, retention_days['default']))
+                for data_source in data_sources}
+
+    @staticmethod
+    def apply_retention(archive_dir: str = None, dry_run: bool = False):
+        """
+        Removes history older than each data source's retention period from completed monthly partitions.  Whole
+        partitions are dropped where every source in them has expired, otherwise just the expired rows are deleted.
+        The latest row for each source is always kept, as it's what we serve
+        :param archive_dir: If supplied, removed data is written to gzipped CSV in this directory first
+        :param dry_run: Log what would be removed without changing anything
+        """
+        if not dry_run:
+            DataRetentionService.ensure_partitions()
+
+        now = datetime.datetime.now()
+        cutoffs = DataRetentionService.get_retention_cutoffs(now)
+        default_cutoff = now - datetime.timedelta(days=current_app.config['DMIS_DATA_RETENTION_DAYS']['default'])
+
+        for partition in DataRetentionService.get_partitions():
+            partition_sources = [r for r, in db.session.execute(
+                text(f'SELECT DISTINCT data_source FROM {partition.name}'))]
+            expired_sources = [source for source in partition_sources
+                               if partition.upper_bound <= cutoffs.get(source, default_cutoff)]
+
+            if not expired_sources:
+                continue
+
+            holds_latest_rows = db.session.execute(text(
+                f'SELECT EXISTS (SELECT 1 FROM {partition.name} JOIN dmis_data_latest USING (data_id))')).scalar()
+
+            if len(expired_sources) == len(partition_sources) and not holds_latest_rows:
+                current_app.logger.info(f'Dropping dmis_data partition {partition.name}')
+                if dry_run:
+                    continue
+
+                if archive_dir:
+                    DataRetentionService._archive(f'SELECT * FROM {partition.name}', {}, archive_dir, partition.name)
+                db.session.execute(text(f'ALTER TABLE dmis_data DETACH PARTITION {partition.name}'))
+                db.session.execute(text(f'DROP TABLE {partition.name}'))
+            else:
+                current_app.logger.info(f'Deleting expired {expired_sources} rows from {partition.name}')
+                if dry_run:
+                    continue
+
+                # Same condition is used for the archive (psycopg2 placeholders) and delete (SQLAlchemy placeholders)
+                expired_rows_sql = f'FROM {partition.name} WHERE data_source = ANY({{expired_sources}}) ' \
+                                   f'AND data_id NOT IN (SELECT data_id FROM dmis_data_latest)'
+                params = {'expired_sources': expired_sources}
+                if archive_dir:
+                    archive_sql = 'SELECT * ' + expired_rows_sql.format(expired_sources='%(expired_sources)s')
+                    DataRetentionService._archive(archive_sql, params, archive_dir,
+                                                  f'{partition.name}_{now:%Y%m%d%H%M%S}')
+                db.session.execute(text('DELETE ' + expired_rows_sql.format(expired_sources=':expired_sources')),
+                                   params)
+
+            db.session.commit()
+
+    @staticmethod
+    def _archive(select_sql: str, params: dict, archive_dir: str, archive_name: str):
+        """
+        Writes the results of the query to a gzipped CSV in the archive dir, within the current transaction
+        :param select_sql: Query using psycopg2 style placeholders
+        """
+        if not os.path.exists(archive_dir):
+            os.makedirs(archive_dir)
+
+        archive_file = os.path.join(archive_dir, f'{archive_name}.csv.gz')
+        current_app.logger.info(f'Archiving dmis_data to {archive_file}')
+
+        cursor = db.session.connection().connection.cursor()
+        copy_sql = cursor.mogrify(select_sql, params).decode('utf-8')
+
+        with gzip.open(archive_file, 'wt', encoding='utf-8') as f:
+            cursor.copy_expert(f'COPY ({copy_sql}) TO STDOUT WITH CSV HEADER', f)
@@ -0,0 +1,122 @@
+"""
+NumPy backend for the ring tests in arcgis2geojson.  Each ring is converted to a contiguous float64 array once, then
+the shoelace, ray casting and segment intersection tests run vectorized over it.  The arithmetic is the same as the
+pure Python tests, element by element, so both backends give the same answers
+"""
+import numpy as np
+
+from server.services.data_ingest.arcgis2geojson import BOUNDS_EPSILON
+
+CHUNK_SIZE = 256  # Segments per chunk in the intersection test, chunks are only compared if their bounds overlap
+
+
+class PreparedRing:
+    """ A ring as an (n, 2) float64 array, with the bounds used by the intersection test computed on demand """
+
+    def __init__(self, ring: list):
+        coordinates = np.asarray(ring, dtype=np.float64)
+        self.coordinates = np.ascontiguousarray(coordinates[:, :2])  # Drop any z or m values
+        self._segment_bounds = None
+        self._chunk_bounds = None
+
+    @property
+    def segment_bounds(self) -> np.ndarray:
+        """ minx, miny, maxx, maxy of each segment, expanded by the same margin as ringBounds """
+        if self._segment_bounds is None:
+            starts, ends = self.coordinates[:-1], self.coordinates[1:]
+            bounds = np.concatenate((np.minimum(starts, ends), np.maximum(starts, ends)), axis=1)
+            margin = BOUNDS_EPSILON * np.maximum(1.0, np.abs(bounds).max(axis=1))[:, np.newaxis]
+            bounds[:, :2] -= margin
+            bounds[:, 2:] += margin
+            self._segment_bounds = bounds
+        return self._segment_bounds
+
+    @property
+    def chunk_bounds(self) -> np.ndarray:
+        """ Bounds of each CHUNK_SIZE segments """
+        if self._chunk_bounds is None:
+            starts = np.arange(0, len(self.segment_bounds), CHUNK_SIZE)
+            self._chunk_bounds = np.concatenate((np.minimum.reduceat(self.segment_bounds[:, :2], starts),
+                                                 np.maximum.reduceat(self.segment_bounds[:, 2:], starts)), axis=1)
+        return self._chunk_bounds
+
+
+class NumpyKernels:
+    """ Vectorized equivalents of ringIsClockwise, coordinatesContainPoint and arrayIntersectsArray """
+
+    @staticmethod
+    def prepare(ring: list) -> PreparedRing:
+        return PreparedRing(ring)
+
+    @staticmethod
+    def bounds(ring: PreparedRing) -> tuple:
+        """ minx, miny, maxx, maxy of the ring, expanded by a small margin as ringBounds does """
+        min_x, min_y = ring.coordinates.min(axis=0).tolist()
+        max_x, max_y = ring.coordinates.max(axis=0).tolist()
+        margin = BOUNDS_EPSILON * max(1.0, abs(min_x), abs(min_y), abs(max_x), abs(max_y))
+        return min_x - margin, min_y - margin, max_x + margin, max_y + margin
+
+    @staticmethod
+    def is_clockwise(ring: PreparedRing) -> bool:
+        x, y = ring.coordinates[:, 0], ring.coordinates[:, 1]
+        terms = (x[1:] - x[:-1]) * (y[1:] + y[:-1])
+        # cumsum adds the terms in order, unlike sum, so rounding matches the pure Python loop
+        return bool(np.cumsum(terms)[-1] >= 0) if len(terms) else True
+
+    @staticmethod
+    def contains_point(ring: PreparedRing, point: list) -> bool:
+        point_x, point_y = float(point[0]), float(point[1])
+        ci = ring.coordinates
+        cj = np.roll(ci, 1, axis=0)  # The previous vertex, wrapping around to the last
+
+        crosses = ((ci[:, 1] <= point_y) & (point_y < cj[:, 1])) | ((cj[:, 1] <= point_y) & (point_y < ci[:, 1]))
+        if not crosses.any():
+            return False
+
+        ci, cj = ci[crosses], cj[crosses]
+        crossing_x = (cj[:, 0] - ci[:, 0]) * (point_y - ci[:, 1]) / (cj[:, 1] - ci[:, 1]) + ci[:, 0]
+        return bool(np.count_nonzero(point_x < crossing_x) % 2)
+
+    @staticmethod
+    def intersects(a: PreparedRing, b: PreparedRing) -> bool:
+        """ True if any segment of a intersects any segment of b, only comparing chunks whose bounds overlap """
+        a_bounds, b_bounds = a.chunk_bounds, b.chunk_bounds
+        overlaps = ((a_bounds[:, np.newaxis, 0] <= b_bounds[np.newaxis, :, 2]) &
+                    (b_bounds[np.newaxis, :, 0] <= a_bounds[:, np.newaxis, 2]) &
+                    (a_bounds[:, np.newaxis, 1] <= b_bounds[np.newaxis, :, 3]) &
+                    (b_bounds[np.newaxis, :, 1] <= a_bounds[:, np.newaxis, 3]))
+
+        for a_chunk, b_chunk in zip(*np.nonzero(overlaps)):
+            # Only the segments of each chunk that overlap the other chunk can intersect it
+            a_segments = _overlapping_segments(a, a_chunk, b_bounds[b_chunk])
+            b_segments = _overlapping_segments(b, b_chunk, a_bounds[a_chunk])
+            if not len(a_segments) or not len(b_segments):
+                continue
+
+            if _segments_intersect(a.coordinates[a_segments, np.newaxis], a.coordinates[a_segments + 1, np.newaxis],
+                                   b.coordinates[b_segments], b.coordinates[b_segments + 1]):
+                return True
+
+        return False
+
+
+def _overlapping_segments(ring: PreparedRing, chunk: int, bounds: np.ndarray) -> np.ndarray:
+    """ Indexes of the segments in the chunk of the ring whose bounds overlap bounds """
+    start = chunk * CHUNK_SIZE
+    segment_bounds = ring.segment_bounds[start:start + CHUNK_SIZE]
+    overlaps = ((segment_bounds[:, 0] <= bounds[2]) & (bounds[0] <= segment_bounds[:, 2]) &
+                (segment_bounds[:, 1] <= bounds[3]) & (bounds[1] <= segment_bounds[:, 3]))
+    return start + np.flatnonzero(overlaps)
+
+
+def _segments_intersect(a1: np.ndarray, a2: np.ndarray, b1: np.ndarray, b2: np.ndarray) -> bool:
+    """ vertexIntersectsVertex broadcast over every pair of segments a1-a2 and b1-b2 """
+    ua_t = (b2[..., 0] - b1[..., 0]) * (a1[..., 1] - b1[..., 1]) - (b2[..., 1] - b1[..., 1]) * (a1[..., 0] - b1[..., 0])
+    ub_t = (a2[..., 0] - a1[..., 0]) * (a1[..., 1] - b1[..., 1]) - (a2[..., 1] - a1[..., 1]) * (a1[..., 0] - b1[..., 0])
+    u_b = (b2[..., 1] - b1[..., 1]) * (a2[..., 0] - a1[..., 0]) - (b2[..., 0] - b1[..., 0]) * (a2[..., 1] - a1[..., 1])
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ua = ua_t / u_b
+        ub = ub_t / u_b
+
+    return bool(((u_b != 0) & (ua >= 0) & (ua <= 1) & (ub >= 0) & (ub <= 1)).any())
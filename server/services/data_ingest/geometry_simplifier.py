@@ -0,0 +1,213 @@
+import math
+from typing import Dict, List, Tuple
+
+Coordinate = Tuple[float, float]
+Path = List[Coordinate]
+
+TILE_SIZE = 256  # Pixels, tolerances are one screen pixel at the zoom level
+WORLD_WIDTH = {True: 2 * 20037508.342789244, False: 360.0}  # Web Mercator metres, or degrees
+
+
+def get_tolerance(zoom: int, is_mercator: bool) -> float:
+    """ Returns the size of a screen pixel at the zoom level, in the layer's units """
+    return WORLD_WIDTH[is_mercator] / (TILE_SIZE * 2 ** zoom)
+
+
+def get_precision(tolerance: float) -> int:
+    """ Decimal places to keep so rounding moves coordinates by no more than a tenth of the tolerance """
+    return max(0, math.ceil(-math.log10(tolerance / 10)))
+
+
+def _point_segment_distance(point: Coordinate, start: Coordinate, end: Coordinate) -> float:
+    dx, dy = end[0] - start[0], end[1] - start[1]
+    if dx == 0 and dy == 0:
+        return math.hypot(point[0] - start[0], point[1] - start[1])
+
+    t = max(0.0, min(1.0, ((point[0] - start[0]) * dx + (point[1] - start[1]) * dy) / (dx * dx + dy * dy)))
+    return math.hypot(point[0] - start[0] - t * dx, point[1] - start[1] - t * dy)
+
+
+def douglas_peucker(path: Path, tolerance: float) -> Path:
+    """ Simplifies the path with Douglas-Peucker, always keeping the first and last points """
+    if len(path) < 3:
+        return list(path)
+
+    keep = [False] * len(path)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(path) - 1)]
+
+    while stack:
+        first, last = stack.pop()
+        max_distance, max_index = 0.0, None
+
+        for index in range(first + 1, last):
+            distance = _point_segment_distance(path[index], path[first], path[last])
+            if distance > max_distance:
+                max_distance, max_index = distance, index
+
+        if max_index is not None and max_distance > tolerance:
+            keep[max_index] = True
+            stack.append((first, max_index))
+            stack.append((max_index, last))
+
+    return [point for point, kept in zip(path, keep) if kept]
+
+
+class TopologySimplifier:
+    """
+    Simplifies the lines and polygon rings of a FeatureCollection without opening gaps or overlaps between features
+    that share a boundary.  As with TopoJSON, paths are split into arcs at junctions, the vertices where features
+    that share a boundary diverge, and each arc is simplified once so every feature that uses it gets the same result
+    """
+
+    def __init__(self, tolerance: float):
+        self.tolerance = tolerance
+        self.precision = get_precision(tolerance)
+        self._junctions = set()
+        self._arcs = {}  # Canonical arc -> simplified arc
+
+    def simplify_feature_collection(self, feature_collection: dict) -> dict:
+        """ Returns a copy of the FeatureCollection with simplified and rounded geometry """
+        features = feature_collection.get('features', [])
+        self._find_junctions(features)
+
+        simplified_collection = dict(feature_collection)
+        simplified_collection['features'] = []
+
+        for feature in features:
+            simplified_feature = dict(feature)
+            geometry = feature.get('geometry')
+            if geometry and geometry.get('type') in SIMPLIFIERS:
+                simplified_feature['geometry'] = {
+                    'type': geometry['type'],
+                    'coordinates': SIMPLIFIERS[geometry['type']](self, geometry['coordinates'])
+                }
+            simplified_collection['features'].append(simplified_feature)
+
+        return simplified_collection
+
+    def _find_junctions(self, features: list):
+        """
+        A vertex is a junction if it's used by more than one path with different neighbours, ie it's where a shared
+        boundary starts or ends.  Line ends are always junctions
+        """
+        neighbours: Dict[Coordinate, set] = {}
+
+        for path, is_ring in self._iter_paths(features):
+            points = path[:-1] if is_ring else path
+            for index, point in enumerate(points):
+                if is_ring:
+                    previous_point, next_point = points[index - 1], points[(index + 1) % len(points)]
+                elif 0 < index < len(points) - 1:
+                    previous_point, next_point = points[index - 1], points[index + 1]
+                else:
+                    self._junctions.add(point)
+                    continue
+
+                neighbours.setdefault(point, set()).add(frozenset((previous_point, next_point)))
+
+        self._junctions.update(point for point, point_neighbours in neighbours.items() if len(point_neighbours) > 1)
+
+    @staticmethod
+    def _iter_paths(features: list):
+        for feature in features:
+            geometry = feature.get('geometry') or {}
+            geometry_type, coordinates = geometry.get('type'), geometry.get('coordinates')
+            if geometry_type == 'LineString':
+                yield [tuple(point) for point in coordinates], False
+            elif geometry_type == 'MultiLineString':
+                for line in coordinates:
+                    yield [tuple(point) for point in line], False
+            elif geometry_type == 'Polygon':
+                for ring in coordinates:
+                    yield [tuple(point) for point in ring], True
+            elif geometry_type == 'MultiPolygon':
+                for polygon in coordinates:
+                    for ring in polygon:
+                        yield [tuple(point) for point in ring], True
+
+    def _simplify_arc(self, arc: Path) -> Path:
+        """ Simplifies the arc in a canonical direction, so both features sharing it get identical vertices """
+        reversed_arc = arc[::-1]
+        if reversed_arc < arc:
+            return self._simplify_arc(reversed_arc)[::-1]
+
+        key = tuple(arc)
+        if key not in self._arcs:
+            self._arcs[key] = douglas_peucker(arc, self.tolerance)
+        return self._arcs[key]
+
+    def _round(self, path: Path) -> List[list]:
+        """ Rounds the coordinates, dropping any points that become repeated """
+        rounded = []
+        for x, y in path:
+            point = [round(x, self.precision), round(y, self.precision)]
+            if self.precision == 0:
+                point = [int(point[0]), int(point[1])]
+            if not rounded or point != rounded[-1]:
+                rounded.append(point)
+        return rounded
+
+    def simplify_line(self, line: list) -> List[list]:
+        points = [tuple(point) for point in line]
+        junction_indexes = [index for index, point in enumerate(points) if point in self._junctions]
+
+        simplified = [points[0]] if points else []
+        for start, end in zip(junction_indexes, junction_indexes[1:]):
+            simplified.extend(self._simplify_arc(points[start:end + 1])[1:])
+
+        rounded = self._round(simplified)
+        return rounded if len(rounded) >= 2 else [list(point) for point in line]
+
+    def simplify_ring(self, ring: list) -> List[list]:
+        points = [tuple(point) for point in ring]
+        if len(points) > 1 and points[0] == points[-1]:
+            points = points[:-1]
+        if len(points) < 3:
+            return [list(point) for point in ring]
+
+        junction_indexes = [index for index, point in enumerate(points) if point in self._junctions]
+        if junction_indexes:
+            # Start from a junction, so the ring is made up of whole arcs
+            first_junction = junction_indexes[0]
+            points = points[first_junction:] + points[:first_junction]
+            junction_indexes = [index - first_junction for index in junction_indexes]
+        else:
+            # Rings that share no boundary are started from their lowest vertex, so identical rings, eg an island
+            # and the hole it fills, are simplified identically
+            lowest = points.index(min(points))
+            points = points[lowest:] + points[:lowest]
+            junction_indexes = [0]
+
+        points.append(points[0])
+        junction_indexes.append(len(points) - 1)
+
+        # A ring with a single junction is one closed arc, DP splits it at the point furthest from its start
+        simplified = [points[0]]
+        for start, end in zip(junction_indexes, junction_indexes[1:]):
+            simplified.extend(self._simplify_arc(points[start:end + 1])[1:])
+
+        rounded = self._round(simplified)
+        # Keep the original ring rather than letting it collapse, so no feature or hole disappears
+        return rounded if len(rounded) >= 4 else [list(point) for point in ring]
+
+    def simplify_polygon(self, polygon: list) -> List[List[list]]:
+        return [self.simplify_ring(ring) for ring in polygon]
+
+    def simplify_point(self, point: list) -> list:
+        return self._round([tuple(point)])[0]
+
+
+SIMPLIFIERS = {
+    'Point': TopologySimplifier.simplify_point,
+    'MultiPoint': lambda simplifier, points: [simplifier.simplify_point(point) for point in points],
+    'LineString': TopologySimplifier.simplify_line,
+    'MultiLineString': lambda simplifier, lines: [simplifier.simplify_line(line) for line in lines],
+    'Polygon': TopologySimplifier.simplify_polygon,
+    'MultiPolygon': lambda simplifier, polygons: [simplifier.simplify_polygon(polygon) for polygon in polygons],
+}
+
+
+def simplify_feature_collection(feature_collection: dict, tolerance: float) -> dict:
+    """ Returns a copy of the FeatureCollection simplified to the tolerance, in the layer's own units """
+    return TopologySimplifier(tolerance).simplify_feature_collection(feature_collection)
@@ -0,0 +1,125 @@
+import datetime
+import threading
+
+from flask import current_app
+
+from server import db
+from server.models.dtos.ingest_job_dto import IngestJobDTO
+from server.models.postgis.ingest_job import IngestJob
+from server.models.postgis.utils import NotFound, timestamp
+from server.services.data_ingest.data_ingest_service import DataIngestService, DataIngestError
+
+
+class IngestWorkerThread(threading.Thread):
+    """
+    Daemon thread that drains the ingest queue, one is started per worker process.  Jobs are claimed with SKIP LOCKED,
+    so the workers share the queue without processing any job twice
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+    _job_queued = threading.Event()
+
+    def __init__(self, app):
+        super().__init__(name='ingest-worker', daemon=True)
+        self.app = app
+
+    @classmethod
+    def ensure_running(cls):
+        """ Lazily start the thread on first request, so it's started after uWSGI has forked the workers """
+        if cls._instance is not None and cls._instance.is_alive():
+            return
+
+        with cls._instance_lock:
+            if cls._instance is None or not cls._instance.is_alive():
+                cls._instance = cls(current_app._get_current_object())
+                cls._instance.start()
+
+    @classmethod
+    def notify(cls):
+        """ Wakes this process's worker, so a job queued by this process is started without waiting for the poll """
+        cls._job_queued.set()
+
+    def run(self):
+        poll_seconds = self.app.config['INGEST_POLL_SECONDS']
+        while True:
+            self._job_queued.clear()
+            try:
+                # A new app context per job, so each job gets a fresh DB session
+                while True:
+                    with self.app.app_context():
+                        if not IngestQueueService.process_next_job():
+                            break
+            except Exception as e:
+                with self.app.app_context():
+                    current_app.logger.error(f'Ingest worker error: {str(e)}')
+
+            self._job_queued.wait(poll_seconds)
+
+
+class IngestQueueService:
+
+    @staticmethod
+    def enqueue(data_source: str, raw_request) -> IngestJobDTO:
+        """
+        Queues the pushed data to be ingested by an IngestWorkerThread.  The request body is streamed into the queue as
+        it's uploaded, unparsed, so it's never held in memory in full
+        :raises DataIngestError: If the data source is unknown
+        """
+        DataIngestService.validate_data_source(data_source)
+        job = IngestJob.enqueue(data_source.lower(), raw_request.stream)
+
+        IngestWorkerThread.ensure_running()
+        IngestWorkerThread.notify()
+
+        return job.as_dto()
+
+    @staticmethod
+    def get_job_dto_by_id(job_id: int) -> IngestJobDTO:
+        """ Returns the progress of the job """
+        IngestWorkerThread.ensure_running()  # Jobs left by a restarted worker still get processed
+        job = IngestJob.get_by_id(job_id)
+
+        if job is None:
+            raise NotFound()
+
+        return job.as_dto()
+
+    @staticmethod
+    def process_next_job() -> bool:
+        """
+        Ingests the next job on the queue.  Jobs with bad data fail straight away, jobs that hit other errors, eg the
+        DB being unavailable, are retried up to INGEST_JOB_MAX_ATTEMPTS times
+        :return: True if a job was processed, False if the queue is empty
+        """
+        stale_before = timestamp() - datetime.timedelta(seconds=current_app.config['INGEST_JOB_TIMEOUT_SECONDS'])
+        job = IngestJob.claim_next(stale_before)
+
+        if job is None:
+            return False
+
+        max_attempts = current_app.config['INGEST_JOB_MAX_ATTEMPTS']
+        if job.attempts > max_attempts:
+            # Timed out on every attempt, most likely the job is killing its worker, eg by running out of memory
+            job.fail(f'Abandoned after {max_attempts} attempts')
+            return True
+
+        current_app.logger.debug(f'Ingesting job {job.job_id} for {job.data_source}, attempt {job.attempts}')
+        try:
+            with job.keep_alive(current_app.config['INGEST_JOB_HEARTBEAT_SECONDS']), job.open_payload() as payload:
+                DataIngestService.process_data(job.data_source, payload)
+        except DataIngestError as e:
+            db.session.rollback()  # Discard anything the failed ingest left in the session
+            job.fail(str(e))
+            return True
+        except Exception as e:
+            current_app.logger.error(f'Ingest job {job.job_id} failed on attempt {job.attempts}: {str(e)}')
+            db.session.rollback()
+            if job.attempts >= max_attempts:
+                job.fail(f'Unhandled error: {str(e)}')
+            else:
+                job.requeue()
+            return True
+
+        job.complete()
+        return True
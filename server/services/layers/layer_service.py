@@ -1,8 +1,11 @@
+import json
+
 from flask import current_app
 from server.models.dtos.layer_dto import DMISLayersDTO, LayerDetailsDTO, LayerUpdateDTO
 from server.models.postgis.layers import Layer
 from server.models.postgis.lookups import MapCategory
 from server.models.postgis.utils import NotFound
+from server.services.cache.layer_list_cache import layer_list_cache
 
 
 class LayerServiceError(Exception):
@@ -22,6 +25,7 @@ class LayerService:
         :return: Layer if created successfully
         """
         new_layer = Layer.create_from_dto(layer_dto)
+        layer_list_cache.invalidate()
         return new_layer
 
     @staticmethod
@@ -34,6 +38,18 @@ class LayerService:
 
         return layers
 
+    @staticmethod
+    def get_all_layers_json(locale: str = 'en') -> bytes:
+        """ Returns the list of layers serialized as JSON, from the layer list cache where it's current """
+        version = layer_list_cache.get_version()  # Read before the layers, see LayerListCache.set
+        layers_json = layer_list_cache.get(locale, version)
+
+        if layers_json is None:
+            layers_json = json.dumps(LayerService.get_all_layers(locale).to_primitive()).encode('utf-8')
+            layer_list_cache.set(locale, version, layers_json)
+
+        return layers_json
+
     @staticmethod
     def get_layer_dto_by_id(layer_id: int) -> LayerDetailsDTO:
         """ Returns a layer by ID """
@@ -59,4 +75,5 @@ class LayerService:
         """ Updates the user details in DB """
         layer_details = LayerService.get_layer_by_id(layer_update_dto.layer_id)
         updated_layer_dto = layer_details.update(layer_update_dto)
+        layer_list_cache.invalidate()
         return updated_layer_dto
@@ -1,16 +1,27 @@
 import csv
 import os
+import threading
 import time
 from pathlib import Path
 from datetime import datetime, timedelta, date
 from operator import itemgetter
-from typing import Tuple
+from typing import Iterator, Optional, Tuple
 
 import boto3
+import numpy as np
+from botocore.exceptions import BotoCoreError, ClientError
 from flask import current_app
 from geojson import Feature, FeatureCollection, Point, dumps
 
 from server.models.postgis.dmis_data import DMISData
+from server.services.cache.compression import cache_compressed_variants, stream_variant
+from server.services.cache.shared_cache import SharedCache
+from server.services.mapping.lightning_data import LightningData, LightningDataError
+from server.services.mapping.spatial_index import BBox, PackedRTree
+
+LIGHTNING_CACHE_KEY = 'earthnetworks_lightning'
+LIGHTNING_SYNC_KEY = 'earthnetworks_lightning_sync'
+lightning_cache = SharedCache('earthnetworks')
 
 
 class EarthNetworksError(Exception):
@@ -20,29 +31,211 @@ class EarthNetworksError(Exception):
             current_app.logger.error(message)
 
 
+class LightningRefreshThread(threading.Thread):
+    """ Daemon thread that keeps the shared lightning cache warm, one is started per worker process """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, app):
+        super().__init__(name='lightning-refresh', daemon=True)
+        self.app = app
+
+    @classmethod
+    def ensure_running(cls):
+        """ Lazily start the thread on first request, so it's started after uWSGI has forked the workers """
+        if cls._instance is not None and cls._instance.is_alive():
+            return
+
+        with cls._instance_lock:
+            if cls._instance is None or not cls._instance.is_alive():
+                cls._instance = cls(current_app._get_current_object())
+                cls._instance.start()
+
+    def run(self):
+        refresh_seconds = self.app.config['EARTHNETWORKS_REFRESH_SECONDS']
+        while True:
+            time.sleep(refresh_seconds)
+            with self.app.app_context():
+                try:
+                    # Non-blocking, if another worker is already refreshing there's nothing for us to do
+                    EarthNetworksService.refresh_lightning_cache(refresh_seconds, blocking=False)
+                except Exception as e:
+                    current_app.logger.error(f'Background lightning refresh failed: {str(e)}')
+
+
 class EarthNetworksService:
 
+    _s3_client = None
+    _s3_client_lock = threading.Lock()
+    _lightning_index = (None, None, None)
+    _lightning_index_lock = threading.Lock()
+
     @staticmethod
     def get_s3_client():
-        """ Helper method creates authenticated S3 client to connect with Earthnetworks S3 bucket"""
-        s3_client = boto3.client('s3',
-                                 aws_access_key_id=current_app.config["EARTHNETWORKS_S3_SETTINGS"]["aws_access_key_id"],
-                                 aws_secret_access_key=current_app.config["EARTHNETWORKS_S3_SETTINGS"]["aws_secret_access_key"])
+        """
+        Helper method returns authenticated S3 client to connect with Earthnetworks S3 bucket.  The client is created
+        once per process, boto3 clients are thread safe and keep their connections alive in a pool between calls
+        """
+        if EarthNetworksService._s3_client is None:
+            with EarthNetworksService._s3_client_lock:
+                if EarthNetworksService._s3_client is None:
+                    s3_settings = current_app.config["EARTHNETWORKS_S3_SETTINGS"]
+                    EarthNetworksService._s3_client = boto3.session.Session().client(
+                        's3',
+                        aws_access_key_id=s3_settings["aws_access_key_id"],
+                        aws_secret_access_key=s3_settings["aws_secret_access_key"])
 
-        return s3_client
+        return EarthNetworksService._s3_client
 
     @staticmethod
     def get_latest_lightning_data() -> Tuple[str, str]:
-        """ Gets latest lightning data from S3 and converts it into a GeoJson feature collection"""
-        current_date = datetime.now().date()
-        file_location = EarthNetworksService.get_latest_daily_lighting_file(current_date)
-        feature_collection, metadata = EarthNetworksService.convert_lightning_data_to_geojson(file_location)
-        return dumps(feature_collection), metadata
+        """ Gets latest lightning data from the shared cache, only going to S3 if the cache is cold """
+        EarthNetworksService.warm_lightning_cache()
+        cached_lightning = lightning_cache.get(LIGHTNING_CACHE_KEY)
+        return cached_lightning.body.decode('utf-8'), cached_lightning.metadata.get('last_updated')
+
+    @staticmethod
+    def get_latest_lightning_stream(encoding: str = None) -> Tuple[Iterator[bytes], str, Optional[str]]:
+        """
+        Streams latest lightning data from the shared cache in chunks, so it's never held in memory in full
+        :param encoding: Optional content coding, eg gzip, the precompressed variant is streamed where available
+        :return: The chunks, the last updated metadata and the encoding of the chunks
+        """
+        EarthNetworksService.warm_lightning_cache()
+        metadata, lightning_chunks, encoding = stream_variant(lightning_cache, LIGHTNING_CACHE_KEY, encoding)
+        return lightning_chunks, metadata.get('last_updated'), encoding
+
+    @staticmethod
+    def get_lightning_version() -> Optional[Tuple[str, str]]:
+        """
+        Returns an identifier for the version of the cached lightning data, and when it was last updated, without
+        touching S3.  None if nothing has been cached yet, or the entry was cached by a release that didn't record it
+        """
+        LightningRefreshThread.ensure_running()
+        metadata = lightning_cache.get_metadata(LIGHTNING_CACHE_KEY)
+
+        if metadata is None or metadata.get('etag') is None or metadata.get('file') is None:
+            return None
+
+        return f"{metadata['etag']}-{os.path.basename(metadata['file'])}", metadata.get('last_updated')
+
+    @staticmethod
+    def get_filtered_lightning(since: datetime = None, bbox: BBox = None) -> Tuple[Iterator[str], str]:
+        """
+        Gets the lightning strikes at or after the supplied UTC time and/or within the bbox, as a GeoJSON generator,
+        along with the last updated metadata
+        """
+        lightning_index, lightning_rtree, last_updated = EarthNetworksService.get_lightning_index()
+        selected_rows = lightning_index.time_slice(start=None if since is None else np.datetime64(since, 'ns'))
+
+        if bbox is not None:
+            bbox_rows = lightning_rtree.search(bbox)
+            selected_rows = bbox_rows[(bbox_rows >= selected_rows.start) & (bbox_rows < selected_rows.stop)]
+
+        return lightning_index.take(selected_rows).iter_geojson(), last_updated
+
+    @staticmethod
+    def get_lightning_index() -> Tuple[LightningData, PackedRTree, str]:
+        """
+        Returns this process's in-memory copy of the cached lightning file, sorted by time so it can be binary
+        searched, along with a spatial index over the strikes.  It's rebuilt whenever the shared cache is updated
+        with a new file
+        """
+        EarthNetworksService.warm_lightning_cache()
+        metadata = lightning_cache.get_metadata(LIGHTNING_CACHE_KEY)
+        if metadata.get('file') is None:
+            # Cached by a release that didn't record the file, so refresh it now rather than wait for the next refresh
+            EarthNetworksService.refresh_lightning_cache(0)
+            metadata = lightning_cache.get_metadata(LIGHTNING_CACHE_KEY)
+            if metadata.get('file') is None:
+                raise EarthNetworksError('Unable to index lightning data: the cached file is unknown')
+
+        with EarthNetworksService._lightning_index_lock:
+            index_version, lightning_index, lightning_rtree = EarthNetworksService._lightning_index
+
+            if index_version != metadata['updated']:
+                try:
+                    lightning_index = EarthNetworksService.load_lightning_data(metadata['file']).sort_by_time()
+                except (LightningDataError, OSError) as e:
+                    raise EarthNetworksError(f'Unable to index lightning data: {str(e)}')
+
+                lightning_rtree = PackedRTree.from_points(lightning_index.longitudes, lightning_index.latitudes)
+                EarthNetworksService._lightning_index = (metadata['updated'], lightning_index, lightning_rtree)
+
+        return lightning_index, lightning_rtree, metadata.get('last_updated')
+
+    @staticmethod
+    def load_lightning_data(file_location: str) -> LightningData:
+        """ Loads the lightning file into columnar LightningData, allowing for files that report no updates """
+        with open(file_location, 'r') as f:
+            first_line = f.readline()
+
+        if first_line.lower().startswith('no updates since'):
+            return LightningData.empty()
+
+        return LightningData.from_csv(file_location)
+
+    @staticmethod
+    def warm_lightning_cache():
+        """ Ensures the background refresh is running and that the cache has been populated at least once """
+        LightningRefreshThread.ensure_running()
+
+        if lightning_cache.get_metadata(LIGHTNING_CACHE_KEY) is None:
+            EarthNetworksService.refresh_lightning_cache(current_app.config['EARTHNETWORKS_REFRESH_SECONDS'])
+
+    @staticmethod
+    def refresh_lightning_cache(max_age: int, blocking: bool = True):
+        """
+        Refreshes the shared lightning cache from S3.  Only one worker refreshes at a time, any others waiting on the
+        lock will use the entry the first worker cached.  If S3 is unavailable the stale entry is left in place.
+        :param max_age: Entries younger than this, in seconds, are considered fresh and won't be refreshed
+        :param blocking: If False return immediately when another worker is refreshing
+        """
+        with lightning_cache.lock(LIGHTNING_CACHE_KEY, blocking) as acquired:
+            cache_age = lightning_cache.age(LIGHTNING_CACHE_KEY)
+
+            if not acquired or (cache_age is not None and cache_age < max_age):
+                return
+
+            cached_metadata = lightning_cache.get_metadata(LIGHTNING_CACHE_KEY)
+
+            try:
+                file_location = EarthNetworksService.get_latest_daily_lighting_file(datetime.now().date())
+                etag = EarthNetworksService.get_lightning_sync_state().get('etag')
+
+                if etag is not None and cached_metadata is not None and cached_metadata.get('etag') == etag:
+                    # Nothing new on S3 since the last refresh, so the cached GeoJSON is still current
+                    lightning_cache.touch(LIGHTNING_CACHE_KEY)
+                    cache_compressed_variants(lightning_cache, LIGHTNING_CACHE_KEY)
+                    return
+
+                geojson_chunks, last_updated = EarthNetworksService.stream_lightning_data_as_geojson(file_location)
+                lightning_cache.set_stream(LIGHTNING_CACHE_KEY, (chunk.encode('utf-8') for chunk in geojson_chunks),
+                                           last_updated=last_updated, etag=etag, file=file_location)
+                cache_compressed_variants(lightning_cache, LIGHTNING_CACHE_KEY)
+            except (EarthNetworksError, LightningDataError, BotoCoreError, ClientError, OSError) as e:
+                if cached_metadata is None:
+                    raise EarthNetworksError(f'Unable to refresh lightning data: {str(e)}')
+
+                current_app.logger.warning(f'Unable to refresh lightning data, serving stale data: {str(e)}')
+                return
+
+            # Persist a record of the file we served in the database, which will help debugging
+            DMISData().save_json_data('earthnetworks_lightning', {'file': os.path.basename(file_location),
+                                                                  'lastUpdated': last_updated})
+
+    @staticmethod
+    def get_lightning_sync_state() -> dict:
+        """ Returns details of the S3 object last downloaded into the weather dir, shared by all workers """
+        return lightning_cache.get_metadata(LIGHTNING_SYNC_KEY) or {}
 
     @staticmethod
     def get_latest_daily_lighting_file(file_date: date) -> str:
-        """ Gets the name of the supplied dates lightning data """
-        # TODO cache for 5 minutes
+        """
+        Gets the name of the supplied dates lightning data.  The file is only downloaded if the latest object on S3
+        differs from the one we last downloaded, otherwise the existing local copy is returned
+        """
         current_app.logger.debug(f'Retrieving lightning data for {file_date}')
 
         file_date_str = file_date.strftime('%Y%m%d')
@@ -66,13 +259,24 @@ class EarthNetworksService:
         # Get the latest record
         daily_data = bucket_response['Contents']
         daily_data.sort(key=itemgetter('LastModified'), reverse=True)
-        s3_latest_record = daily_data[0]['Key']
+        s3_latest_object = daily_data[0]
+        s3_latest_record = s3_latest_object['Key']
         local_file_name = s3_latest_record.lstrip('earthnetworks/')
 
         current_app.logger.debug(f'Latest lightning file is: {s3_latest_record}')
 
         local_lightning_file = EarthNetworksService.get_local_file_location(local_file_name)
+        sync_state = EarthNetworksService.get_lightning_sync_state()
+        last_modified = s3_latest_object['LastModified'].isoformat()
+
+        if sync_state.get('s3_key') == s3_latest_record and sync_state.get('etag') == s3_latest_object['ETag'] \
+                and sync_state.get('last_modified') == last_modified and os.path.exists(local_lightning_file):
+            current_app.logger.debug(f'Lightning file {s3_latest_record} unchanged, skipping download')
+            return local_lightning_file
+
         s3_client.download_file(bucket_name, s3_latest_record, local_lightning_file)
+        lightning_cache.set(LIGHTNING_SYNC_KEY, b'', s3_key=s3_latest_record, etag=s3_latest_object['ETag'],
+                            last_modified=last_modified)
 
         return local_lightning_file
 
@@ -134,6 +338,25 @@ class EarthNetworksService:
 
         return lightning_feature_collection, metadata
 
+    @staticmethod
+    def stream_lightning_data_as_geojson(file_location: str) -> Tuple[Iterator[str], str]:
+        """
+        Faster, streaming alternative to convert_lightning_data_to_geojson.  The CSV is parsed into typed columns in
+        one pass, then a generator writes the FeatureCollection JSON from those columns a batch at a time.  Returns
+        the generator along with the last updated metadata
+        """
+        with open(file_location, 'r') as f:
+            first_line = f.readline()
+
+        if first_line.lower().startswith('no updates since'):
+            # There is no lightning data available so return the same empty feature collection as the non-streamed path
+            empty_collection = dumps(FeatureCollection([Feature(geometry=Point())]))
+            return iter([empty_collection]), first_line
+
+        lightning_data = LightningData.from_csv(file_location)
+        metadata = EarthNetworksService.get_lightning_file_meta_data(os.path.basename(file_location))
+        return lightning_data.iter_geojson(), metadata
+
     @staticmethod
     def get_lightning_file_meta_data(file_name: str) -> str:
         """ Helper function that extracts the datetime the lightning data was captured from the filename"""
@@ -0,0 +1,170 @@
+import json
+import re
+from itertools import chain, repeat
+from typing import Iterator, List
+
+import numpy as np
+from flask import current_app
+
+LIGHTNING_COLUMNS = ('LightningTime', 'Latitude', 'Longitude', 'FlashType', 'Amplitude')
+BLANK_LINES = re.compile(r'\n\s*(?=\n)')
+JSON_ESCAPED_CHARS = re.compile(r'[\x00-\x09\x0b-\x1f"\\]')  # Newline is the separator the columns are joined with
+LEADING_ZERO = re.compile(r'\n-?0\d')
+NON_NUMERIC_CHARS = str.maketrans('', '', '0123456789.-\n')
+
+
+class LightningDataError(Exception):
+    """ Custom Exception to notify callers the lightning file couldn't be parsed """
+    def __init__(self, message):
+        if current_app:
+            current_app.logger.error(message)
+
+
+class LightningData:
+    """
+    Columnar representation of an EarthNetworks lightning CSV file.  Numeric columns are held as typed NumPy arrays,
+    the source text of the time and coordinate columns is also kept so GeoJSON can be written without reformatting
+    every float
+    """
+
+    def __init__(self, time_text: List[str], latitude_text: List[str], longitude_text: List[str],
+                 latitudes: np.ndarray, longitudes: np.ndarray, flash_types: np.ndarray, amplitudes: np.ndarray,
+                 times: np.ndarray = None):
+        self.time_text = time_text
+        self.latitude_text = latitude_text
+        self.longitude_text = longitude_text
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+        self.flash_types = flash_types
+        self.amplitudes = amplitudes
+        self._times = times
+
+    def __len__(self):
+        return len(self.latitudes)
+
+    @property
+    def times(self) -> np.ndarray:
+        """ LightningTime as datetime64, parsed on first use as it's only needed when filtering by time """
+        if self._times is None:
+            self._times = np.array(self.time_text, dtype='datetime64[ns]')
+        return self._times
+
+    @classmethod
+    def empty(cls) -> 'LightningData':
+        """ LightningData with no bolts, used when EarthNetworks report there have been no updates """
+        return cls([], [], [], np.empty(0), np.empty(0), np.empty(0, dtype=np.int8), np.empty(0, dtype=np.int32),
+                   np.empty(0, dtype='datetime64[ns]'))
+
+    @classmethod
+    def from_csv(cls, file_location: str) -> 'LightningData':
+        """ Parses the lightning CSV into typed columns in a single pass and validates the coordinates """
+        with open(file_location, 'r') as f:
+            header = f.readline()
+            # Values never contain commas, so any quoting can simply be dropped.  Blank lines, which the CSV reader
+            # skipped, are dropped too, as they'd shift every column
+            body = BLANK_LINES.sub('', f.read().replace('\r', '').replace('"', '').strip())
+
+        columns = tuple(column.strip().strip('"') for column in header.split(','))
+        if columns != LIGHTNING_COLUMNS:
+            raise LightningDataError(f'Unexpected lightning file columns {columns} in file: {file_location}')
+
+        # Split the whole file in one go, rather than row by row, so the heavy lifting happens in C
+        tokens = body.replace('\n', ',').split(',') if body else []
+        column_count = len(LIGHTNING_COLUMNS)
+        if len(tokens) % column_count != 0:
+            raise LightningDataError(f'Lightning file has rows with missing values: {file_location}')
+
+        try:
+            latitude_text, longitude_text = tokens[1::column_count], tokens[2::column_count]
+            lightning_data = cls(tokens[0::column_count], latitude_text, longitude_text,
+                                 np.array(latitude_text, dtype=np.float64),
+                                 np.array(longitude_text, dtype=np.float64),
+                                 np.array(tokens[3::column_count], dtype=np.float64).astype(np.int8),
+                                 np.array(tokens[4::column_count], dtype=np.float64).astype(np.int32))
+        except ValueError as e:
+            raise LightningDataError(f'Unable to parse lightning file {file_location}: {str(e)}')
+
+        lightning_data.validate_coordinates(file_location)
+        return lightning_data
+
+    def validate_coordinates(self, file_location: str):
+        """ Ensure every bolt has valid WGS84 coordinates, so we don't generate invalid GeoJSON """
+        valid = np.isfinite(self.latitudes) & np.isfinite(self.longitudes) & \
+            (np.abs(self.latitudes) <= 90) & (np.abs(self.longitudes) <= 180)
+
+        if not valid.all():
+            first_invalid_line = int(np.argmin(valid)) + 2  # Allow for header and 1 based line numbers
+            raise LightningDataError(f'Invalid lightning coords in file: {file_location} line {first_invalid_line}')
+
+    def take(self, index) -> 'LightningData':
+        """ Returns the subset of bolts selected by the slice or array of row indices """
+        if isinstance(index, slice):
+            text_columns = (self.time_text[index], self.latitude_text[index], self.longitude_text[index])
+        else:
+            rows = index.tolist()
+            text_columns = tuple([column[row] for row in rows]
+                                 for column in (self.time_text, self.latitude_text, self.longitude_text))
+
+        return LightningData(*text_columns, self.latitudes[index], self.longitudes[index], self.flash_types[index],
+                             self.amplitudes[index], self.times[index])
+
+    def sort_by_time(self) -> 'LightningData':
+        """ Returns the bolts ordered by LightningTime, so they can be searched with slice_by_time """
+        if len(self) == 0 or (self.times[1:] >= self.times[:-1]).all():
+            return self
+
+        return self.take(np.argsort(self.times, kind='mergesort'))
+
+    def time_slice(self, start: np.datetime64 = None, end: np.datetime64 = None) -> slice:
+        """
+        Binary searches the LightningTime column for the rows where start <= time < end, must only be called on
+        data that has been through sort_by_time
+        """
+        start_row = 0 if start is None else int(np.searchsorted(self.times, start, side='left'))
+        end_row = len(self) if end is None else int(np.searchsorted(self.times, end, side='left'))
+        return slice(start_row, end_row)
+
+    def slice_by_time(self, start: np.datetime64 = None, end: np.datetime64 = None) -> 'LightningData':
+        """ Returns the bolts where start <= time < end, must only be called on data sorted by sort_by_time """
+        return self.take(self.time_slice(start, end))
+
+    @staticmethod
+    def _json_coordinates(column_text: List[str], column_values: np.ndarray) -> List[str]:
+        """ Use the source text if it's already valid JSON, otherwise fall back to formatting the parsed floats """
+        # Every value has already been parsed as a finite float, so we only need to rule out forms that Python accepts
+        # but JSON doesn't, eg +1, .5, 5. or 05.  Checked over the whole column at once, as regexing each value is slow
+        joined_text = '\n' + '\n'.join(column_text) + '\n'
+        is_json = not joined_text.translate(NON_NUMERIC_CHARS) and '\n.' not in joined_text and \
+            '-.' not in joined_text and '.\n' not in joined_text and not LEADING_ZERO.search(joined_text)
+
+        if is_json:
+            return column_text
+
+        return [repr(value) for value in column_values.tolist()]
+
+    @staticmethod
+    def _json_strings(column_text: List[str]) -> List[str]:
+        """ Use the source text as the content of JSON strings if nothing in the column needs escaping """
+        if not JSON_ESCAPED_CHARS.search('\n'.join(column_text)):
+            return column_text
+
+        return [json.dumps(text)[1:-1] for text in column_text]
+
+    def iter_geojson(self, batch_size: int = 10000) -> Iterator[str]:
+        """ Generator yields the data as a GeoJSON FeatureCollection, encoding a batch of bolts at a time """
+        longitudes = LightningData._json_coordinates(self.longitude_text, self.longitudes)
+        latitudes = LightningData._json_coordinates(self.latitude_text, self.latitudes)
+        times = LightningData._json_strings(self.time_text)
+
+        yield '{"type": "FeatureCollection", "features": ['
+
+        for start in range(0, len(self), batch_size):
+            end = start + batch_size
+            features = ''.join(chain.from_iterable(zip(
+                repeat(', {"type": "Feature", "geometry": {"type": "Point", "coordinates": ['), longitudes[start:end],
+                repeat(', '), latitudes[start:end],
+                repeat(']}, "properties": {"lightningTime": "'), times[start:end], repeat('"}}')
+            )))
+            yield features[2:] if start == 0 else features
+
+        yield ']}'
@@ -1,11 +1,30 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
 from urllib.parse import parse_qs
 
+import dateutil.parser
 import requests
-from flask import current_app, Response
+from flask import current_app, Response, stream_with_context
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from werkzeug.datastructures import Headers
+from werkzeug.http import parse_etags
 
 from server.models.postgis.dmis_data import DMISData
+from server.models.postgis.dmis_feature import DMISFeature
+from server.services.cache.compression import choose_encoding, compress_chunks, stream_variant
+from server.services.cache.geojson_cache import GeoJSONCache, geojson_cache
+from server.services.cache.tile_cache import VectorTileCache, WMSTileCache
 from server.services.mapping.earthnetworks_service import EarthNetworksService, EarthNetworksError
+from server.services.mapping.spatial_index import BBox, FeatureIndex, is_mercator
+from server.services.mapping.vector_tile import MAX_ZOOM, WEB_MERCATOR_SRID, VectorTileError, VectorTileLayer
+
+vector_tile_cache = VectorTileCache()
+tile_cache = WMSTileCache()
 
 
 class MapServiceClientError(Exception):
@@ -23,45 +42,429 @@ class MapServiceServerError(Exception):
 
 
 class MapService:
+    _feature_indexes = {}  # (layer_source, simplified zoom) -> (data_id, FeatureIndex)
+    _feature_indexes_lock = threading.Lock()
+    _vector_tile_layers = {}  # layer_source -> (data_id, VectorTileLayer)
+    _vector_tile_layers_lock = threading.Lock()
+    _geoserver_session = None
+    _geoserver_session_lock = threading.Lock()
+
     @staticmethod
-    def handle_map_request(map_protocol: str, query_string: str) -> Response:
+    def handle_map_request(map_protocol: str, query_string: str, request_headers: Headers = None,
+                           tile: Tuple[int, int, int] = None) -> Response:
         """ Handler looks at request protocol and then determines how to process the request"""
         if map_protocol.lower() == 'wms':
-            return MapService.proxy_request_to_geoserver(map_protocol, query_string)
+            return MapService.handle_wms_request(query_string)
         elif map_protocol.lower() == 'geojson':
-            return MapService.handle_geojson_request(query_string)
+            return MapService.handle_geojson_request(query_string, request_headers)
+        elif map_protocol.lower() == 'mvt':
+            return MapService.handle_mvt_request(query_string, tile, request_headers)
         else:
             raise MapServiceClientError(f'Unknown map protocol: {map_protocol}')
 
     @staticmethod
-    def handle_geojson_request(query_string: str) -> Response:
-        """ Validate that request if for a known geojson datasource, then generate a valid Flask Response """
+    def handle_wms_request(query_string: str) -> Response:
+        """ GetMap tiles are served from the tile cache where possible, all other requests are proxied to GeoServer """
+        cache_key_layers = WMSTileCache.get_cache_key(query_string)
+        if cache_key_layers is None:
+            return MapService.proxy_request_to_geoserver('wms', query_string)
+
+        cache_key, layers = cache_key_layers
+        ttl = WMSTileCache.get_ttl(layers)
+        if ttl <= 0:
+            return MapService.proxy_request_to_geoserver('wms', query_string)
+
+        cached_tile = tile_cache.get(cache_key, ttl)
+        if cached_tile is None:
+            raw_response = MapService.request_from_geoserver('wms', query_string)
+            content_type = raw_response.headers.get('Content-Type', '')
+
+            # GeoServer reports errors as XML with a 200 status, so only cache images
+            if raw_response.status_code != 200 or not content_type.startswith('image/'):
+                return Response(raw_response.content, status=raw_response.status_code, content_type=content_type)
+
+            cached_tile = tile_cache.set(cache_key, raw_response.content, content_type)
+
+        return Response(cached_tile.body, status=200, content_type=cached_tile.metadata['content_type'])
+
+    @staticmethod
+    def handle_geojson_request(query_string: str, request_headers: Headers = None) -> Response:
+        """
+        Validate that request if for a known geojson datasource, then generate a valid Flask Response.  If the client
+        already holds the current version, 304 Not Modified is returned without touching the DB or S3
+        """
         layer_source = MapService.parse_geojson_request(query_string)
+        encoding = choose_encoding(request_headers.get('Accept-Encoding') if request_headers is not None else None)
+
+        validators = MapService.get_geojson_validators(layer_source, query_string)
+        if validators is not None and MapService.is_not_modified(request_headers, *validators):
+            flask_response = MapService.add_validators(Response(status=304), *validators, encoding=encoding)
+            flask_response.vary.add('Accept-Encoding')
+            return flask_response
+
         available_layers = DMISData.get_available_data_sources()
 
         if layer_source not in available_layers:
             raise MapServiceClientError(f'Unknown geojson layer source: {layer_source}')
 
+        bbox = MapService.parse_bbox(query_string)
+        property_filters = MapService.parse_property_filters(query_string)
+
         if layer_source == 'earthnetworks_lightning':
             # EarthNetworks data retrieved from S3, so needs separate path
-            return MapService.get_earthnetworks_lightning_response()
+            lightning_since = MapService.parse_lightning_since(query_string)
+            flask_response = MapService.get_earthnetworks_lightning_response(lightning_since, bbox, encoding)
+        elif bbox is not None or property_filters:
+            flask_response = MapService.get_filtered_geojson_response(layer_source, query_string, bbox,
+                                                                      property_filters)
         else:
+            simplified_zoom = MapService.get_simplified_zoom(layer_source, query_string)
+            flask_response = MapService.get_geojson_response(layer_source, encoding, simplified_zoom)
+
+        if validators is not None:
+            MapService.add_validators(flask_response, *validators, encoding=flask_response.content_encoding)
+        flask_response.vary.add('Accept-Encoding')
+
+        return flask_response
+
+    @staticmethod
+    def handle_geojson_batch_request(query_string: str, request_headers: Headers = None) -> Response:
+        """
+        Returns the latest GeoJSON for each of the requested layer sources in one response, a JSON object keyed on the
+        layer source.  The sources are checked with a single DB query, then each source's cached body is streamed in
+        turn as it's ready, compressed as it's sent as the precompressed variants can't be joined
+        """
+        layer_sources = MapService.parse_geojson_batch_request(query_string)
+        encoding = choose_encoding(request_headers.get('Accept-Encoding') if request_headers is not None else None)
+
+        data_versions = DMISData.get_latest_data_ids_for_sources(layer_sources)
+        unknown_sources = [layer_source for layer_source in layer_sources if layer_source not in data_versions]
+        if unknown_sources:
+            raise MapServiceClientError(f'Unknown geojson layer sources: {", ".join(unknown_sources)}')
+
+        for layer_source, data_version in data_versions.items():
+            GeoJSONCache.set_data_version(layer_source, data_version)
+
+        batch_chunks = MapService.stream_geojson_batch(layer_sources, data_versions)
+        if encoding is not None:
+            batch_chunks = compress_chunks(batch_chunks, encoding, streamed=True)
+
+        # The sources are cached as the body is streamed, so the app context is kept for the whole response
+        flask_response = Response(stream_with_context(batch_chunks), status=200, mimetype='application/json')
+        if encoding is not None:
+            flask_response.content_encoding = encoding
+        flask_response.vary.add('Accept-Encoding')
+        return flask_response
+
+    @staticmethod
+    def stream_geojson_batch(layer_sources: List[str], data_versions: Dict[str, int]) -> Iterator[bytes]:
+        """ Generator streams the GeoJSON for each layer source as a member of a JSON object, in the order requested """
+        yield b'{'
+        for i, layer_source in enumerate(layer_sources):
+            yield f'{", " if i else ""}{json.dumps(layer_source)}: '.encode('utf-8')
+
+            if layer_source == 'earthnetworks_lightning':
+                try:
+                    lightning_chunks, _, _ = EarthNetworksService.get_latest_lightning_stream()
+                except EarthNetworksError:
+                    # Too late to report an error status, so the other sources are still returned
+                    current_app.logger.error('Error occurred attempting to get EarthNetworks Lightning Data for batch')
+                    lightning_chunks = [b'null']
+                yield from lightning_chunks
+                continue
+
+            data_version = data_versions[layer_source]
+            GeoJSONCache.ensure_geojson_cached(layer_source, data_version)
+            cached_geojson = stream_variant(geojson_cache, layer_source, None)
+
+            if cached_geojson is None or cached_geojson[0].get('data_id') != data_version:
+                if cached_geojson is not None:
+                    cached_geojson[1].close()
+                # Names that can't be cached, or replaced by a newer version since, are read from the DB
+                yield DMISData.get_latest_json_data_for_source(layer_source).encode('utf-8')
+            else:
+                yield from cached_geojson[1]
+
+        yield b'}'
+
+    @staticmethod
+    def get_geojson_response(layer_source: str, encoding: str = None, simplified_zoom: int = None) -> Response:
+        """
+        Streams the latest GeoJSON for the source from the GeoJSON cache, using the precompressed variant for the
+        encoding where available
+        :param simplified_zoom: Optional zoom level to serve the simplified version of the layer for
+        """
+        data_version = GeoJSONCache.get_data_version(layer_source)
+        if data_version is None:
             layer_geojson = DMISData.get_latest_json_data_for_source(layer_source)
             return Response(layer_geojson, status=200, mimetype='application/json')
 
+        GeoJSONCache.ensure_geojson_cached(layer_source, data_version)
+
+        cached_geojson = None
+        if simplified_zoom is not None:
+            simplified_key = GeoJSONCache.get_simplified_key(layer_source, simplified_zoom)
+            cached_geojson = stream_variant(geojson_cache, simplified_key, encoding)
+        if cached_geojson is None or cached_geojson[0].get('data_id') != data_version:
+            cached_geojson = stream_variant(geojson_cache, layer_source, encoding)
+
+        _, geojson_chunks, encoding = cached_geojson
+        flask_response = Response(geojson_chunks, status=200, mimetype='application/json')
+        if encoding is not None:
+            flask_response.content_encoding = encoding
+        return flask_response
+
+    @staticmethod
+    def get_simplified_zoom(layer_source: str, query_string: str) -> Optional[int]:
+        """
+        Picks the most simplified version of the layer that still has the detail requested by the zoom or tolerance
+        query parameters, None if the full resolution layer should be served
+        :raises MapServiceClientError: If zoom or tolerance is supplied for a layer that can't be simplified
+        """
+        parsed_query = parse_qs(query_string)
+        if 'zoom' not in parsed_query and 'tolerance' not in parsed_query:
+            return None
+
+        try:
+            zoom = int(parsed_query['zoom'][0]) if 'zoom' in parsed_query else None
+            tolerance = float(parsed_query['tolerance'][0]) if 'tolerance' in parsed_query else None
+        except ValueError:
+            raise MapServiceClientError('zoom must be an integer and tolerance a number')
+
+        if zoom is not None and tolerance is not None:
+            raise MapServiceClientError('Only one of zoom or tolerance can be supplied')
+
+        data_version = GeoJSONCache.get_data_version(layer_source)
+        if data_version is None:
+            return None
+
+        GeoJSONCache.ensure_geojson_cached(layer_source, data_version)
+
+        # Zooms ascending means tolerances descending, so the first match is the most simplified
+        is_simplified = False
+        for simplified_zoom in sorted(current_app.config['DMIS_SIMPLIFIED_ZOOMS']):
+            metadata = geojson_cache.get_metadata(GeoJSONCache.get_simplified_key(layer_source, simplified_zoom))
+            if metadata is None or metadata.get('data_id') != data_version:
+                continue
+
+            is_simplified = True
+            if (zoom is not None and simplified_zoom >= zoom) or \
+                    (tolerance is not None and metadata['tolerance'] <= tolerance):
+                return simplified_zoom
+
+        if not is_simplified:
+            # Rather than quietly serving the full resolution layer, eg it isn't a FeatureCollection
+            raise MapServiceClientError(f'zoom and tolerance are only supported for FeatureCollection layers: '
+                                        f'{layer_source}')
+
+        return None
+
+    @staticmethod
+    def get_geojson_validators(layer_source: str, query_string: str) -> Optional[Tuple[str, Optional[str]]]:
+        """
+        Returns the ETag, and Last-Modified date where known, for the current version of the layer.  The ETag covers
+        the query string, as filtered responses differ.  None if the response can't be validated, eg the lightning
+        window filter changes the response over time
+        """
+        last_modified = None
+
+        if layer_source == 'earthnetworks_lightning':
+            if 'window' in parse_qs(query_string):
+                return None
+
+            lightning_version = EarthNetworksService.get_lightning_version()
+            if lightning_version is None:
+                return None
+            data_version, last_modified = lightning_version
+        else:
+            data_version = GeoJSONCache.get_data_version(layer_source)
+            if data_version is None:
+                return None
+
+        etag = hashlib.sha1(f'{layer_source}-{data_version}?{query_string}'.encode('utf-8')).hexdigest()
+        return etag, last_modified
+
+    @staticmethod
+    def is_not_modified(request_headers: Optional[Headers], etag: str, last_modified: Optional[str]) -> bool:
+        """
+        Checks the conditional request headers, If-None-Match takes precedence over If-Modified-Since.  The ETag of
+        any compressed variant matches, as they all represent the same version
+        """
+        if request_headers is None:
+            return False
+
+        if_none_match = request_headers.get('If-None-Match')
+        if if_none_match:
+            client_etags = parse_etags(if_none_match)
+            return any(client_etags.contains(MapService.get_variant_etag(etag, encoding))
+                       for encoding in (None, 'gzip', 'br'))
+
+        if_modified_since = request_headers.get('If-Modified-Since')
+        if if_modified_since and last_modified:
+            if if_modified_since == last_modified:
+                return True
+
+            try:
+                return dateutil.parser.parse(if_modified_since).replace(tzinfo=None) >= \
+                    dateutil.parser.parse(last_modified).replace(tzinfo=None)
+            except (ValueError, OverflowError):
+                return False
+
+        return False
+
+    @staticmethod
+    def get_variant_etag(etag: str, encoding: Optional[str]) -> str:
+        """ Each content coding is a different representation, so needs its own strong ETag """
+        return etag if encoding is None else f'{etag}-{encoding}'
+
+    @staticmethod
+    def add_validators(flask_response: Response, etag: str, last_modified: Optional[str],
+                       encoding: str = None) -> Response:
+        """ Adds the validators to the response, and asks clients to revalidate before reusing their copy """
+        flask_response.set_etag(MapService.get_variant_etag(etag, encoding))
+        if last_modified:
+            flask_response.headers['Last-Modified'] = last_modified
+        flask_response.headers['Cache-Control'] = 'no-cache'
+        return flask_response
+
     @staticmethod
-    def get_earthnetworks_lightning_response():
-        """ Get the EarthNetworks lightning response """
+    def get_filtered_geojson_response(layer_source: str, query_string: str, bbox: Optional[BBox],
+                                      property_filters: Dict[str, str]) -> Response:
+        """
+        Returns the features of the layer within the bbox and matching the property filters.  Full resolution layers
+        are filtered in the DB, simplified versions, which are only held in the GeoJSON cache, are filtered in memory
+        """
+        simplified_zoom = None if property_filters else MapService.get_simplified_zoom(layer_source, query_string)
+
+        if simplified_zoom is None:
+            layer_geojson = DMISFeature.get_feature_collection(layer_source, bbox, property_filters)
+            if layer_geojson is not None:
+                return Response(layer_geojson, status=200, mimetype='application/json')
+
+        # The features of the layer aren't stored separately, eg it isn't a FeatureCollection
+        if property_filters:
+            raise MapServiceClientError(f'filter is only supported for FeatureCollection layers: {layer_source}')
+
+        layer_geojson = MapService.get_feature_index(layer_source, simplified_zoom).filter_bbox(bbox)
+        return Response(layer_geojson, status=200, mimetype='application/json')
+
+    @staticmethod
+    def get_feature_index(layer_source: str, simplified_zoom: int = None) -> FeatureIndex:
+        """
+        Returns the spatially indexed FeatureCollection for the layer source, or its simplified version for the zoom.
+        Each worker builds the index once for each new version of the data, rather than on every request
+        """
+        latest_data_id = DMISData.get_latest_data_id_for_source(layer_source)
+
+        with MapService._feature_indexes_lock:
+            index_key = (layer_source, simplified_zoom)
+            indexed_data_id, feature_index = MapService._feature_indexes.get(index_key, (None, None))
+
+            if indexed_data_id != latest_data_id:
+                layer_json = None
+                if simplified_zoom is not None:
+                    simplified_entry = geojson_cache.get(GeoJSONCache.get_simplified_key(layer_source, simplified_zoom))
+                    if simplified_entry is not None and simplified_entry.metadata.get('data_id') == latest_data_id:
+                        layer_json = json.loads(simplified_entry.body.decode('utf-8'))
+
+                if layer_json is None:
+                    layer_json = json.loads(DMISData.get_latest_json_data_for_source(layer_source))
+
+                if not isinstance(layer_json, dict) or layer_json.get('type') != 'FeatureCollection':
+                    raise MapServiceClientError(f'bbox is only supported for FeatureCollection layers: {layer_source}')
+
+                feature_index = FeatureIndex(layer_json)
+                MapService._feature_indexes[index_key] = (latest_data_id, feature_index)
+
+        return feature_index
+
+    @staticmethod
+    def handle_mvt_request(query_string: str, tile: Optional[Tuple[int, int, int]],
+                           request_headers: Headers = None) -> Response:
+        """
+        Serves the z/x/y Mapbox Vector Tile for the layer source.  Tiles are cut from the stored FeatureCollection the
+        first time they're requested, and cached until new data is ingested, see VectorTileCache
+        """
+        if tile is None:
+            raise MapServiceClientError('Vector tiles must be requested as mvt/{z}/{x}/{y}')
+
+        z, x, y = tile
+        if not 0 <= z <= MAX_ZOOM or not 0 <= x < 1 << z or not 0 <= y < 1 << z:
+            raise MapServiceClientError(f'Invalid vector tile {z}/{x}/{y}')
+
+        layer_source = MapService.parse_geojson_request(query_string)
+        data_version = GeoJSONCache.get_data_version(layer_source)
+        if data_version is None:
+            raise MapServiceClientError(f'Unknown vector tile layer source: {layer_source}')
+
+        etag = hashlib.sha1(f'{layer_source}-{data_version}/{z}/{x}/{y}'.encode('utf-8')).hexdigest()
+        if MapService.is_not_modified(request_headers, etag, None):
+            return MapService.add_validators(Response(status=304), etag, None)
+
+        tile_body = vector_tile_cache.get(layer_source, data_version, z, x, y)
+
+        if tile_body is None:
+            tile_body = MapService.get_vector_tile_layer(layer_source, data_version).encode_tile(z, x, y)
+            vector_tile_cache.set(layer_source, data_version, z, x, y, tile_body)
+
+        flask_response = Response(tile_body, status=200, mimetype='application/vnd.mapbox-vector-tile')
+        return MapService.add_validators(flask_response, etag, None)
+
+    @staticmethod
+    def get_vector_tile_layer(layer_source: str, data_id: int) -> VectorTileLayer:
+        """
+        Returns the FeatureCollection for the layer source, projected to Web Mercator and indexed ready for cutting
+        vector tiles.  Each worker builds it once for each new version of the data
+        """
+        with MapService._vector_tile_layers_lock:
+            layer_data_id, vector_tile_layer = MapService._vector_tile_layers.get(layer_source, (None, None))
+
+            if layer_data_id != data_id:
+                layer_json = json.loads(DMISData.get_latest_json_data_for_source(layer_source))
+                if not isinstance(layer_json, dict) or layer_json.get('type') != 'FeatureCollection':
+                    raise MapServiceClientError(f'Vector tiles are only supported for FeatureCollection layers: '
+                                                f'{layer_source}')
+
+                if is_mercator(layer_json) is None:
+                    # Projected layers, eg the ArcGIS layers in UTM, are transformed to Web Mercator by PostGIS
+                    mercator_geojson = DMISFeature.get_feature_collection(layer_source, srid=WEB_MERCATOR_SRID)
+                    if mercator_geojson is not None:
+                        layer_json = json.loads(mercator_geojson)
+
+                try:
+                    vector_tile_layer = VectorTileLayer(layer_source, layer_json)
+                except VectorTileError as e:
+                    raise MapServiceClientError(str(e))
+
+                MapService._vector_tile_layers[layer_source] = (data_id, vector_tile_layer)
+
+        return vector_tile_layer
+
+    @staticmethod
+    def get_earthnetworks_lightning_response(lightning_since: datetime = None, bbox: BBox = None,
+                                             encoding: str = None):
+        """
+        Get the EarthNetworks lightning response, streamed to the client in chunks from the lightning cache
+        :param lightning_since: Optional UTC time, if supplied only strikes at or after this time are returned
+        :param bbox: Optional minx, miny, maxx, maxy, if supplied only strikes within the bbox are returned
+        :param encoding: Optional content coding accepted by the client, used for the precompressed unfiltered data
+        """
         try:
-            feature_collection_json, last_updated = EarthNetworksService.get_latest_lightning_data()
+            if lightning_since is None and bbox is None:
+                lightning_chunks, last_updated, encoding = EarthNetworksService.get_latest_lightning_stream(encoding)
+            else:
+                lightning_chunks, last_updated = EarthNetworksService.get_filtered_lightning(lightning_since, bbox)
+                encoding = None
         except EarthNetworksError:
             raise MapServiceServerError('Error occurred attempting to get EarthNetworks Lightning Data')
 
         response_headers = Headers()
         response_headers.add('Last-Modified', last_updated)
 
-        flask_response = Response(feature_collection_json, status=200, mimetype='application/json',
+        flask_response = Response(lightning_chunks, status=200, mimetype='application/json',
                                   headers=response_headers)
+        if encoding is not None:
+            flask_response.content_encoding = encoding
         return flask_response
 
     @staticmethod
@@ -75,18 +478,131 @@ class MapService:
             raise MapServiceClientError('GeoJson request must supply layerSource in query string')
 
     @staticmethod
-    def proxy_request_to_geoserver(map_protocol: str, query_string: str) -> Response:
-        """ Helper method to proxy map requests to Geoserver"""
+    def parse_geojson_batch_request(query_string: str) -> List[str]:
+        """ Helper method parses the comma separated layerSources of a batch request, dropping any repeats """
+        parsed_query = parse_qs(query_string)
+
+        if 'layerSources' not in parsed_query:
+            raise MapServiceClientError('GeoJson batch request must supply layerSources in query string')
+
+        layer_sources = [layer_source.strip().lower() for layer_source in parsed_query['layerSources'][0].split(',')]
+        layer_sources = list(OrderedDict.fromkeys(layer_source for layer_source in layer_sources if layer_source))
+        if not layer_sources:
+            raise MapServiceClientError('GeoJson batch request must supply at least one layer source')
+
+        return layer_sources
+
+    @staticmethod
+    def parse_bbox(query_string: str) -> Optional[BBox]:
+        """ Helper method parses the optional bbox=minx,miny,maxx,maxy filter, in the layer's own coordinates """
+        parsed_query = parse_qs(query_string)
+
+        if 'bbox' not in parsed_query:
+            return None
+
+        try:
+            min_x, min_y, max_x, max_y = (float(value) for value in parsed_query['bbox'][0].split(','))
+        except ValueError:
+            raise MapServiceClientError(f'bbox must be supplied as minx,miny,maxx,maxy: {parsed_query["bbox"][0]}')
+
+        if min_x > max_x or min_y > max_y:
+            raise MapServiceClientError(f'bbox min values must not exceed max values: {parsed_query["bbox"][0]}')
+
+        return min_x, min_y, max_x, max_y
+
+    @staticmethod
+    def parse_property_filters(query_string: str) -> Dict[str, str]:
+        """ Helper method parses the optional filter=name:value parameters, features must match all of them """
+        property_filters = {}
+        for property_filter in parse_qs(query_string).get('filter', []):
+            name, separator, value = property_filter.partition(':')
+            if not name or not separator:
+                raise MapServiceClientError(f'filter must be supplied as name:value: {property_filter}')
+            property_filters[name] = value
+
+        return property_filters
+
+    @staticmethod
+    def parse_lightning_since(query_string: str) -> Optional[datetime]:
+        """
+        Helper method parses the optional since (ISO 8601 timestamp) and window (last N minutes) lightning filters
+        into a naive UTC datetime.  If both are supplied the most recent of the two is used
+        """
+        parsed_query = parse_qs(query_string)
+        since_times = []
+
+        if 'since' in parsed_query:
+            try:
+                since = dateutil.parser.parse(parsed_query['since'][0])
+            except (ValueError, OverflowError):
+                raise MapServiceClientError(f'since must be an ISO 8601 timestamp: {parsed_query["since"][0]}')
+
+            if since.tzinfo is not None:
+                since = since.astimezone(timezone.utc).replace(tzinfo=None)
+            since_times.append(since)
+
+        if 'window' in parsed_query:
+            try:
+                window_minutes = int(parsed_query['window'][0])
+            except ValueError:
+                window_minutes = -1
+
+            if window_minutes < 0:
+                raise MapServiceClientError(f'window must be a positive number of minutes: {parsed_query["window"][0]}')
+            since_times.append(datetime.utcnow() - timedelta(minutes=window_minutes))
+
+        return max(since_times) if since_times else None
+
+    @staticmethod
+    def get_geoserver_session() -> requests.Session:
+        """
+        Helper method returns the Session used to proxy requests to GeoServer.  The session is created once per process
+        so connections are kept alive in a pool and reused, rather than opening a new connection for every tile
+        """
+        if MapService._geoserver_session is None:
+            with MapService._geoserver_session_lock:
+                if MapService._geoserver_session is None:
+                    pool_size = current_app.config['GEOSERVER_POOL_SIZE']
+                    # Only retry failures before GeoServer has started responding, and gateway errors from its LB
+                    retries = Retry(total=current_app.config['GEOSERVER_RETRIES'], read=0, backoff_factor=0.2,
+                                    status_forcelist=(502, 503, 504), raise_on_status=False)
+
+                    session = requests.Session()
+                    session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=pool_size,
+                                                         max_retries=retries))
+                    session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=pool_size,
+                                                          max_retries=retries))
+                    MapService._geoserver_session = session
+
+        return MapService._geoserver_session
+
+    @staticmethod
+    def request_from_geoserver(map_protocol: str, query_string: str, stream: bool = False) -> requests.Response:
+        """ Helper method makes the map request to Geoserver using the pooled session """
         geoserver_url = current_app.config['GEOSERVER_URL']
         geoserver_request_url = f'{geoserver_url}/dmis/{map_protocol}?{query_string}'
+        timeout = (current_app.config['GEOSERVER_CONNECT_TIMEOUT'], current_app.config['GEOSERVER_READ_TIMEOUT'])
 
-        raw_response = requests.get(geoserver_request_url)
+        try:
+            raw_response = MapService.get_geoserver_session().get(geoserver_request_url, stream=stream,
+                                                                  timeout=timeout)
+        except requests.RequestException as e:
+            raise MapServiceServerError(f'Error occurred proxying request to Geoserver: {str(e)}')
 
         if raw_response.status_code != 200:
             current_app.logger.error(f'Geoserver returned error response {raw_response.status_code}')
 
-        # Flask can't serialize response from requests, so have to generate a Flask response
-        flask_response = Response(raw_response, status=raw_response.status_code,
-                                  content_type=raw_response.headers['Content-Type'])
+        return raw_response
+
+    @staticmethod
+    def proxy_request_to_geoserver(map_protocol: str, query_string: str) -> Response:
+        """ Helper method to proxy map requests to Geoserver, the response body is streamed through to the client """
+        raw_response = MapService.request_from_geoserver(map_protocol, query_string, stream=True)
+
+        # Flask can't serialize response from requests, so have to generate a Flask response.  Closing the response
+        # once it's been sent returns the connection to the pool
+        flask_response = Response(raw_response.iter_content(chunk_size=64 * 1024), status=raw_response.status_code,
+                                  content_type=raw_response.headers.get('Content-Type'))
+        flask_response.call_on_close(raw_response.close)
 
         return flask_response
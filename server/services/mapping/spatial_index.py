@@ -0,0 +1,127 @@
+import json
+import math
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+BBox = Tuple[float, float, float, float]
+MERCATOR_CRS_CODES = ('3857', '900913', '102100', '102113')
+
+
+def is_mercator(feature_collection: dict) -> Optional[bool]:
+    """ True if the collection is in Web Mercator, False if it's lon/lat, or None if it's in any other CRS """
+    crs_name = str(feature_collection.get('crs', {}).get('properties', {}).get('name', ''))
+
+    if not crs_name or crs_name.endswith(('4326', 'CRS84')):
+        return False
+    if crs_name.endswith(MERCATOR_CRS_CODES):
+        return True
+
+    return None
+
+
+def geometry_bounds(geometry: dict) -> BBox:
+    """ Returns the minx, miny, maxx, maxy of a GeoJSON geometry, or NaNs if the geometry is empty or null """
+    xs, ys = [], []
+
+    def collect(coordinates):
+        if coordinates and isinstance(coordinates[0], (int, float)):
+            xs.append(coordinates[0])
+            ys.append(coordinates[1])
+        else:
+            for child in coordinates:
+                collect(child)
+
+    if geometry:
+        if geometry.get('type') == 'GeometryCollection':
+            for child_geometry in geometry.get('geometries', []):
+                child_bounds = geometry_bounds(child_geometry)
+                if not math.isnan(child_bounds[0]):
+                    xs.extend(child_bounds[0::2])
+                    ys.extend(child_bounds[1::2])
+        else:
+            collect(geometry.get('coordinates') or [])
+
+    if not xs:
+        return math.nan, math.nan, math.nan, math.nan
+
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+class PackedRTree:
+    """
+    Static R-tree packed with the Sort-Tile-Recursive algorithm.  Each level of the tree is held as NumPy arrays, so
+    building and searching are vectorized rather than walking nodes in Python.  Items with NaN bounds never match.
+    """
+
+    def __init__(self, min_x: np.ndarray, min_y: np.ndarray, max_x: np.ndarray, max_y: np.ndarray,
+                 node_size: int = 16):
+        self.node_size = node_size
+        self.item_count = len(min_x)
+
+        # STR packing: sort items into vertical slices by x, then by y within each slice
+        centre_x, centre_y = (min_x + max_x) / 2, (min_y + max_y) / 2
+        leaf_count = max(1, math.ceil(self.item_count / node_size))
+        slice_size = node_size * math.ceil(math.sqrt(leaf_count))
+        x_order = np.argsort(centre_x, kind='mergesort')
+        slice_ids = np.arange(self.item_count) // slice_size
+        self.order = x_order[np.lexsort((centre_y[x_order], slice_ids))]
+
+        # Level 0 holds the items, each level above holds the bounds of node_size children from the level below
+        self.levels = [np.stack([min_x[self.order], min_y[self.order], max_x[self.order], max_y[self.order]])]
+        while self.levels[-1].shape[1] > 1:
+            child_boxes = self.levels[-1]
+            padding = -child_boxes.shape[1] % node_size
+            padded = np.pad(child_boxes, ((0, 0), (0, padding)), 'constant', constant_values=np.nan)
+            groups = padded.reshape(4, -1, node_size)
+            self.levels.append(np.stack([np.fmin.reduce(groups[0], axis=1), np.fmin.reduce(groups[1], axis=1),
+                                         np.fmax.reduce(groups[2], axis=1), np.fmax.reduce(groups[3], axis=1)]))
+
+    @classmethod
+    def from_points(cls, x: np.ndarray, y: np.ndarray) -> 'PackedRTree':
+        return cls(x, y, x, y)
+
+    @classmethod
+    def from_features(cls, features: List[dict]) -> 'PackedRTree':
+        bounds = np.array([geometry_bounds(feature.get('geometry')) for feature in features],
+                          dtype=np.float64).reshape(-1, 4)
+        return cls(bounds[:, 0], bounds[:, 1], bounds[:, 2], bounds[:, 3])
+
+    def search(self, bbox: BBox) -> np.ndarray:
+        """ Returns the indices, in their original order, of the items whose bounds intersect the bbox """
+        if self.item_count == 0:
+            return np.empty(0, dtype=np.int64)
+
+        query_min_x, query_min_y, query_max_x, query_max_y = bbox
+        candidates = np.zeros(1, dtype=np.int64)
+
+        for level in range(len(self.levels) - 1, -1, -1):
+            level_boxes = self.levels[level]
+
+            # Comparisons against NaN are False, so empty geometries and padding are never matched
+            intersects = (level_boxes[0, candidates] <= query_max_x) & (level_boxes[2, candidates] >= query_min_x) & \
+                (level_boxes[1, candidates] <= query_max_y) & (level_boxes[3, candidates] >= query_min_y)
+            candidates = candidates[intersects]
+
+            if level == 0:
+                break
+
+            children = (candidates[:, np.newaxis] * self.node_size + np.arange(self.node_size)).ravel()
+            candidates = children[children < self.levels[level - 1].shape[1]]
+
+        return np.sort(self.order[candidates])
+
+
+class FeatureIndex:
+    """ A FeatureCollection held in memory with a spatial index over its features """
+
+    def __init__(self, feature_collection: dict):
+        self.features = feature_collection.get('features', [])
+        self.collection_members = {key: value for key, value in feature_collection.items() if key != 'features'}
+        self.rtree = PackedRTree.from_features(self.features)
+
+    def filter_bbox(self, bbox: BBox) -> str:
+        """ Returns the FeatureCollection as a JSON string, containing only the features that intersect the bbox """
+        filtered_collection = dict(self.collection_members)
+        filtered_collection['features'] = [self.features[i] for i in self.rtree.search(bbox).tolist()]
+        return json.dumps(filtered_collection)
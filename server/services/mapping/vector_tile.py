@@ -0,0 +1,350 @@
+import json
+import math
+import struct
+from typing import List, Optional, Tuple
+
+import numpy as np
+from flask import current_app
+
+from server.services.mapping.spatial_index import PackedRTree, geometry_bounds, is_mercator
+
+TILE_EXTENT = 4096  # Tile coordinate resolution, the Mapbox Vector Tile default
+TILE_BUFFER = 64  # Geometry is kept this far outside the tile, so lines and fills join up without seams
+MAX_ZOOM = 24
+HALF_WORLD = 20037508.342789244  # Half the width of the Web Mercator world, in metres
+MAX_LATITUDE = 85.0511287798066
+WEB_MERCATOR_SRID = 3857
+
+# Mapbox Vector Tile geometry types and commands
+POINT, LINESTRING, POLYGON = 1, 2, 3
+MOVE_TO, LINE_TO, CLOSE_PATH = 1, 2, 7
+
+Ring = List[Tuple[float, float]]
+
+
+class VectorTileError(Exception):
+    """ Custom Exception to notify callers the layer can't be served as vector tiles """
+    def __init__(self, message):
+        if current_app:
+            current_app.logger.error(message)
+
+
+def get_tile_bounds(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """ Returns the minx, miny, maxx, maxy of the XYZ tile in Web Mercator """
+    tile_size = 2 * HALF_WORLD / (1 << z)
+    min_x = -HALF_WORLD + x * tile_size
+    max_y = HALF_WORLD - y * tile_size
+    return min_x, max_y - tile_size, min_x + tile_size, max_y
+
+
+def project_coordinates(coordinates):
+    """ Projects nested lon/lat GeoJSON coordinates to Web Mercator """
+    if coordinates and isinstance(coordinates[0], (int, float)):
+        longitude, latitude = coordinates[0], max(-MAX_LATITUDE, min(MAX_LATITUDE, coordinates[1]))
+        return [longitude * HALF_WORLD / 180,
+                math.log(math.tan((90 + latitude) * math.pi / 360)) * HALF_WORLD / math.pi]
+
+    return [project_coordinates(child) for child in coordinates]
+
+
+class VectorTileLayer:
+    """
+    A FeatureCollection projected to Web Mercator and spatially indexed, so Mapbox Vector Tiles can be cut from it
+    on demand.  Geometry is clipped to each tile and snapped to the tile grid, which drops vertices that are too close
+    together to be seen at that zoom
+    """
+
+    def __init__(self, name: str, feature_collection: dict):
+        self.name = name
+        self.features = []
+
+        mercator = is_mercator(feature_collection)
+        if mercator is None:
+            raise VectorTileError(f'Vector tiles are not supported for CRS {feature_collection.get("crs")}')
+
+        project = not mercator
+        for feature in feature_collection.get('features', []):
+            geometry = feature.get('geometry')
+            if not geometry or geometry.get('type') not in GEOMETRY_TYPES:
+                continue  # Null and GeometryCollection geometries aren't tiled
+
+            if project:
+                geometry = {'type': geometry['type'], 'coordinates': project_coordinates(geometry['coordinates'])}
+            self.features.append((feature.get('id'), geometry, feature.get('properties') or {}))
+
+        bounds = np.array([geometry_bounds(geometry) for _, geometry, _ in self.features],
+                          dtype=np.float64).reshape(-1, 4)
+        self.rtree = PackedRTree(bounds[:, 0], bounds[:, 1], bounds[:, 2], bounds[:, 3])
+
+    def encode_tile(self, z: int, x: int, y: int) -> bytes:
+        """ Returns the encoded Mapbox Vector Tile, an empty tile if no features fall within it """
+        min_x, min_y, max_x, max_y = get_tile_bounds(z, x, y)
+        scale = TILE_EXTENT / (max_x - min_x)
+        buffer = TILE_BUFFER / scale
+        clip_box = (-TILE_BUFFER, -TILE_BUFFER, TILE_EXTENT + TILE_BUFFER, TILE_EXTENT + TILE_BUFFER)
+
+        def to_tile(coordinates):
+            if coordinates and isinstance(coordinates[0], (int, float)):
+                return (round((coordinates[0] - min_x) * scale), round((max_y - coordinates[1]) * scale))
+            return [to_tile(child) for child in coordinates]
+
+        layer = _LayerEncoder(self.name)
+        for index in self.rtree.search((min_x - buffer, min_y - buffer, max_x + buffer, max_y + buffer)).tolist():
+            feature_id, geometry, properties = self.features[index]
+            geometry_type, parts = GEOMETRY_TYPES[geometry['type']]
+            tile_geometry = parts(to_tile(geometry['coordinates']), clip_box)
+
+            if tile_geometry:
+                layer.add_feature(feature_id, properties, geometry_type, tile_geometry)
+
+        return layer.encode_tile() if layer.features else b''
+
+
+def _point_parts(coordinates, clip_box) -> list:
+    return _clip_points([coordinates], clip_box)
+
+
+def _multi_point_parts(coordinates, clip_box) -> list:
+    return _clip_points(coordinates, clip_box)
+
+
+def _line_parts(coordinates, clip_box) -> list:
+    return _clip_line(coordinates, clip_box)
+
+
+def _multi_line_parts(coordinates, clip_box) -> list:
+    return [part for line in coordinates for part in _clip_line(line, clip_box)]
+
+
+def _polygon_parts(coordinates, clip_box) -> list:
+    return _clip_polygon(coordinates, clip_box)
+
+
+def _multi_polygon_parts(coordinates, clip_box) -> list:
+    return [ring for polygon in coordinates for ring in _clip_polygon(polygon, clip_box)]
+
+
+GEOMETRY_TYPES = {
+    'Point': (POINT, _point_parts),
+    'MultiPoint': (POINT, _multi_point_parts),
+    'LineString': (LINESTRING, _line_parts),
+    'MultiLineString': (LINESTRING, _multi_line_parts),
+    'Polygon': (POLYGON, _polygon_parts),
+    'MultiPolygon': (POLYGON, _multi_polygon_parts),
+}
+
+
+def _clip_points(points: Ring, clip_box) -> list:
+    """ Each point that falls within the clip box becomes a one point part """
+    min_x, min_y, max_x, max_y = clip_box
+    return [[point] for point in points if min_x <= point[0] <= max_x and min_y <= point[1] <= max_y]
+
+
+def _remove_repeated_points(points: Ring) -> Ring:
+    """ Points that snapped to the same tile coordinate add nothing to the geometry """
+    deduplicated = points[:1]
+    for point in points[1:]:
+        if point != deduplicated[-1]:
+            deduplicated.append(point)
+    return deduplicated
+
+
+def _clip_line(line: Ring, clip_box) -> list:
+    """ Clips the line to the clip box with Liang-Barsky, returning the parts of the line that remain inside """
+    min_x, min_y, max_x, max_y = clip_box
+    parts, current_part = [], []
+
+    for (x0, y0), (x1, y1) in zip(line, line[1:]):
+        dx, dy = x1 - x0, y1 - y0
+        t0, t1 = 0.0, 1.0
+        visible = True
+
+        for p, q in ((-dx, x0 - min_x), (dx, max_x - x0), (-dy, y0 - min_y), (dy, max_y - y0)):
+            if p == 0:
+                if q < 0:
+                    visible = False
+                    break
+            else:
+                t = q / p
+                if p < 0:
+                    t0 = max(t0, t)
+                else:
+                    t1 = min(t1, t)
+                if t0 > t1:
+                    visible = False
+                    break
+
+        if not visible:
+            if current_part:
+                parts.append(current_part)
+                current_part = []
+            continue
+
+        start = (round(x0 + t0 * dx), round(y0 + t0 * dy))
+        end = (round(x0 + t1 * dx), round(y0 + t1 * dy))
+        if not current_part:
+            current_part = [start]
+        current_part.append(end)
+
+        if t1 < 1:  # Left the clip box, the next visible segment starts a new part
+            parts.append(current_part)
+            current_part = []
+
+    if current_part:
+        parts.append(current_part)
+
+    return [part for part in map(_remove_repeated_points, parts) if len(part) >= 2]
+
+
+def _clip_ring(ring: Ring, clip_box) -> Ring:
+    """ Clips the polygon ring to the clip box with Sutherland-Hodgman, one box edge at a time """
+    min_x, min_y, max_x, max_y = clip_box
+    edges = ((0, min_x, True), (0, max_x, False), (1, min_y, True), (1, max_y, False))
+
+    for axis, edge, keep_greater in edges:
+        if not ring:
+            break
+
+        def inside(point):
+            return point[axis] >= edge if keep_greater else point[axis] <= edge
+
+        def intersect(start, end):
+            t = (edge - start[axis]) / (end[axis] - start[axis])
+            crossing = [start[0] + t * (end[0] - start[0]), start[1] + t * (end[1] - start[1])]
+            crossing[axis] = edge
+            return round(crossing[0]), round(crossing[1])
+
+        clipped = []
+        previous = ring[-1]
+        for point in ring:
+            if inside(point):
+                if not inside(previous):
+                    clipped.append(intersect(previous, point))
+                clipped.append(point)
+            elif inside(previous):
+                clipped.append(intersect(previous, point))
+            previous = point
+        ring = clipped
+
+    return ring
+
+
+def _ring_area(ring: Ring) -> float:
+    """ Surveyor's formula, positive for rings that are clockwise in tile coordinates where y points down """
+    return sum(x0 * y1 - x1 * y0 for (x0, y0), (x1, y1) in zip(ring, ring[1:] + ring[:1])) / 2
+
+
+def _clip_polygon(rings: List[Ring], clip_box) -> list:
+    """
+    Clips each ring of the polygon, and orients them as the spec requires: the exterior ring with a positive area
+    and holes negative.  Rings that collapse to nothing at this zoom are dropped, as is the whole polygon if its
+    exterior does
+    """
+    clipped_rings = []
+
+    for ring_index, ring in enumerate(rings):
+        ring = [tuple(point) for point in ring]
+        if len(ring) > 1 and ring[0] == ring[-1]:
+            ring = ring[:-1]  # GeoJSON rings repeat the first point, MVT closes them with ClosePath instead
+
+        ring = _remove_repeated_points(_clip_ring(ring, clip_box))
+        if len(ring) > 1 and ring[0] == ring[-1]:
+            ring = ring[:-1]
+
+        area = _ring_area(ring) if len(ring) >= 3 else 0
+        if area == 0:
+            if ring_index == 0:
+                return []
+            continue
+
+        is_exterior = ring_index == 0
+        if (area > 0) != is_exterior:
+            ring.reverse()
+        clipped_rings.append(ring)
+
+    return clipped_rings
+
+
+def _varint(value: int) -> bytes:
+    encoded = bytearray()
+    while value > 0x7f:
+        encoded.append((value & 0x7f) | 0x80)
+        value >>= 7
+    encoded.append(value)
+    return bytes(encoded)
+
+
+def _zigzag(value: int) -> int:
+    return (value << 1) ^ (value >> 63)
+
+
+def _field(field_number: int, payload: bytes) -> bytes:
+    """ Length delimited protobuf field """
+    return _varint(field_number << 3 | 2) + _varint(len(payload)) + payload
+
+
+def _varint_field(field_number: int, value: int) -> bytes:
+    return _varint(field_number << 3) + _varint(value)
+
+
+class _LayerEncoder:
+    """ Builds a single layer Mapbox Vector Tile, deduplicating property keys and values as the spec requires """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.keys, self.values = {}, {}
+        self.features = []
+
+    def _value_index(self, value) -> Optional[int]:
+        if value is None:
+            return None
+
+        if isinstance(value, bool):
+            encoded = _varint_field(7, int(value))
+        elif isinstance(value, int) and -2 ** 63 <= value < 2 ** 64:
+            encoded = _varint_field(5, value) if value >= 0 else _varint_field(6, _zigzag(value))
+        elif isinstance(value, float):
+            encoded = _varint(3 << 3 | 1) + struct.pack('<d', value)
+        else:
+            string_value = value if isinstance(value, str) else json.dumps(value)
+            encoded = _field(1, string_value.encode('utf-8'))
+
+        return self.values.setdefault(encoded, len(self.values))
+
+    def add_feature(self, feature_id, properties: dict, geometry_type: int, parts: list):
+        tags = []
+        for key, value in properties.items():
+            value_index = self._value_index(value)
+            if value_index is not None:
+                tags.extend((self.keys.setdefault(key, len(self.keys)), value_index))
+
+        if geometry_type == POINT:
+            parts = [[point for part in parts for point in part]]  # All points go in a single MoveTo command
+
+        commands = []
+        cursor_x, cursor_y = 0, 0
+        for part in parts:
+            commands.append(MOVE_TO | (1 if geometry_type != POINT else len(part)) << 3)
+            for point_index, (x, y) in enumerate(part):
+                if point_index == 1 and geometry_type != POINT:
+                    commands.append(LINE_TO | (len(part) - 1) << 3)
+                commands.extend((_zigzag(x - cursor_x), _zigzag(y - cursor_y)))
+                cursor_x, cursor_y = x, y
+            if geometry_type == POLYGON:
+                commands.append(CLOSE_PATH | 1 << 3)
+
+        feature = b''
+        if isinstance(feature_id, int) and not isinstance(feature_id, bool) and 0 <= feature_id < 2 ** 64:
+            feature += _varint_field(1, feature_id)
+        if tags:
+            feature += _field(2, b''.join(map(_varint, tags)))
+        feature += _varint_field(3, geometry_type) + _field(4, b''.join(map(_varint, commands)))
+        self.features.append(feature)
+
+    def encode_tile(self) -> bytes:
+        layer = _varint_field(15, 2) + _field(1, self.name.encode('utf-8'))
+        layer += b''.join(_field(2, feature) for feature in self.features)
+        layer += b''.join(_field(3, key.encode('utf-8')) for key in self.keys)
+        layer += b''.join(_field(4, value) for value in self.values)
+        layer += _varint_field(5, TILE_EXTENT)
+        return _field(3, layer)
@@ -0,0 +1,55 @@
+"""
+Benchmarks the NumPy and pure Python backends of convertRingsToGeoJSON on synthetic polygons, each a star shaped
+outer ring with holes.  Not collected by the test runner, run with:
+
+    python -m tests.server.benchmarks.benchmark_arcgis2geojson
+"""
+import math
+import timeit
+
+from server.services.data_ingest.arcgis2geojson import convertRingsToGeoJSON, loadNumpyKernels
+
+VERTEX_COUNTS = (10, 100, 1000, 10000, 100000)
+HOLES = 8
+REPEATS = 3
+
+
+def generate_polygon(vertex_count: int) -> list:
+    """
+    Closed ArcGIS rings for a clockwise star shaped outer ring with vertex_count vertices, and HOLES
+    counter-clockwise holes around its centre sharing vertex_count between them.  The rings are closed so
+    convertRingsToGeoJSON doesn't modify them, and they can be converted repeatedly
+    """
+    def circle(centre_x, radius, count, clockwise, spiky=False):
+        ring = []
+        for i in range(count):
+            angle = 2 * math.pi * i / count * (-1 if clockwise else 1)
+            r = radius * (0.8 if spiky and i % 2 else 1)
+            ring.append([centre_x + r * math.cos(angle), r * math.sin(angle)])
+        return ring + [ring[0]]
+
+    hole_vertices = max(4, vertex_count // HOLES)
+    holes = [circle(x - HOLES / 2, 0.3, hole_vertices, False) for x in range(HOLES)]
+    return [circle(0, HOLES, vertex_count, True, spiky=True)] + holes
+
+
+def run_benchmarks():
+    if loadNumpyKernels() is None:
+        print('NumPy is not installed')
+        return
+
+    print(f'{"vertices":>10} {"python (s)":>12} {"numpy (s)":>12} {"speed-up":>10}')
+
+    for vertex_count in VERTEX_COUNTS:
+        rings = generate_polygon(vertex_count)
+        results = {}
+        for backend in ('python', 'numpy'):
+            results[backend] = min(timeit.repeat(lambda: convertRingsToGeoJSON(rings, backend), number=1,
+                                                 repeat=REPEATS))
+
+        print(f'{vertex_count:>10} {results["python"]:>12.5f} {results["numpy"]:>12.5f} '
+              f'{results["python"] / results["numpy"]:>9.1f}x')
+
+
+if __name__ == '__main__':
+    run_benchmarks()
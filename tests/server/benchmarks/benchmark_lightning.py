@@ -0,0 +1,72 @@
+"""
+Benchmarks the vectorized lightning parser against the original convert_lightning_data_to_geojson, using
+weather/test_lightning.csv scaled up synthetically.  Not collected by the test runner, run with:
+
+    python -m tests.server.benchmarks.benchmark_lightning
+"""
+import os
+import tempfile
+import timeit
+
+from pathlib import Path
+from unittest import mock
+
+from flask import Flask
+from geojson import dumps
+
+from server.services.mapping.earthnetworks_service import EarthNetworksService
+
+SCALE_FACTORS = (1, 10, 100, 1000)
+REPEATS = 3
+
+
+def generate_scaled_lightning_file(scale_factor: int) -> str:
+    """ Writes a temp copy of test_lightning.csv with the bolts repeated scale_factor times """
+    source_file = os.path.join(Path(__file__).parents[3], 'weather', 'test_lightning.csv')
+    with open(source_file, 'r') as f:
+        header = f.readline()
+        bolts = f.read()
+
+    if not bolts.endswith('\n'):
+        bolts += '\n'
+
+    fd, scaled_file = tempfile.mkstemp(suffix='_test.csv')
+    with os.fdopen(fd, 'w') as f:
+        f.write(header)
+        for _ in range(scale_factor):
+            f.write(bolts)
+
+    return scaled_file
+
+
+def convert_original(lightning_file: str) -> str:
+    feature_collection, _ = EarthNetworksService.convert_lightning_data_to_geojson(lightning_file)
+    return dumps(feature_collection)
+
+
+def convert_vectorized(lightning_file: str) -> str:
+    geojson_chunks, _ = EarthNetworksService.stream_lightning_data_as_geojson(lightning_file)
+    return ''.join(geojson_chunks)
+
+
+def run_benchmarks():
+    app = Flask(__name__)
+
+    # Only the conversion is being measured, so don't persist to the DB
+    with app.app_context(), mock.patch('server.models.postgis.dmis_data.DMISData.save_json_data'):
+        print(f'{"bolts":>10} {"original (s)":>14} {"vectorized (s)":>16} {"speed-up":>10}')
+
+        for scale_factor in SCALE_FACTORS:
+            lightning_file = generate_scaled_lightning_file(scale_factor)
+            try:
+                original = min(timeit.repeat(lambda: convert_original(lightning_file), number=1, repeat=REPEATS))
+                vectorized = min(timeit.repeat(lambda: convert_vectorized(lightning_file), number=1,
+                                               repeat=REPEATS))
+            finally:
+                os.remove(lightning_file)
+
+            print(f'{332 * scale_factor:>10} {original:>14.4f} {vectorized:>16.4f} {original / vectorized:>9.1f}x')
+
+
+if __name__ == '__main__':
+    run_benchmarks()
@@ -1,7 +1,9 @@
 import os
 import unittest
 
-from server import bootstrap_app
+from sqlalchemy import event
+
+from server import bootstrap_app, db
 from server.models.dtos.layer_dto import LayerInfoDTO
 from server.models.postgis.lookups import MapCategory, LayerType
 from server.services.layers.layer_service import LayerService, LayerDetailsDTO, LayerUpdateDTO
@@ -40,6 +42,10 @@ class TestLayerService(unittest.TestCase):
         self.ctx.pop()
 
     def setup_dmis_layer(self):
+        self.test_layer = self.create_test_layer('test_layer')
+
+    @staticmethod
+    def create_test_layer(layer_name: str):
         # Setup test layer info
         layer_info_en = LayerInfoDTO()
         layer_info_en.locale = 'en'
@@ -54,7 +60,7 @@ class TestLayerService(unittest.TestCase):
         layer_info_km.layer_title = 'KM Test Layer'
 
         layer_dto = LayerDetailsDTO()
-        layer_dto.layer_name = 'test_layer'
+        layer_dto.layer_name = layer_name
         layer_dto.map_category = MapCategory.PREPAREDNESS.name
         layer_dto.layer_source = 'https://blah.com/wms'
         layer_dto.layer_type = LayerType.WMS.name
@@ -62,7 +68,23 @@ class TestLayerService(unittest.TestCase):
         layer_dto.layer_info_locales.append(layer_info_km)
 
         # This tests that the layer service correctly corrects layers
-        self.test_layer = LayerService.create_layer(layer_dto)
+        return LayerService.create_layer(layer_dto)
+
+    @staticmethod
+    def count_queries(func) -> int:
+        """ Counts the statements func executes against the DB """
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            func()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+        return len(statements)
 
     def test_get_all_layers_returns_layers(self):
         if self.skip_tests:
@@ -77,6 +99,27 @@ class TestLayerService(unittest.TestCase):
         self.assertFalse(layers_dto.layers[0].layer_info_locales,
                          'All objects should not have a layer_info_locales property')
 
+    def test_get_all_layers_query_count_does_not_grow_with_layers(self):
+        if self.skip_tests:
+            return
+
+        # Arrange
+        queries_for_locale = self.count_queries(lambda: LayerService.get_all_layers('en'))
+        queries_for_all_locales = self.count_queries(lambda: LayerService.get_all_layers(None))
+        extra_layers = [self.create_test_layer(f'test_layer_{i}') for i in range(3)]
+
+        try:
+            # Act
+            queries_for_locale_with_extra_layers = self.count_queries(lambda: LayerService.get_all_layers('en'))
+            queries_for_all_locales_with_extra_layers = self.count_queries(lambda: LayerService.get_all_layers(None))
+        finally:
+            for layer in extra_layers:
+                layer.delete()
+
+        # Assert
+        self.assertEqual(queries_for_locale, queries_for_locale_with_extra_layers)
+        self.assertEqual(queries_for_all_locales, queries_for_all_locales_with_extra_layers)
+
     def test_get_layer_dto_by_id_returns_expected_layer(self):
         if self.skip_tests:
             return
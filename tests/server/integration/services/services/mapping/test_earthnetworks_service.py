@@ -1,3 +1,4 @@
+import json
 import os
 import unittest
 
@@ -111,6 +112,18 @@ class TestEarthNetworksService(unittest.TestCase):
 
         self.assertEqual(332, len(valid_feature_collection['features']), 'Valid file should have 332 features')
 
+    def test_streamed_lightning_file_returns_feature_collection(self):
+        # Arrange
+        lightning_file = os.path.join(self.weather_dir, 'test_lightning.csv')
+
+        # Act
+        geojson_chunks, metadata = EarthNetworksService.stream_lightning_data_as_geojson(lightning_file)
+        streamed_feature_collection = json.loads(''.join(geojson_chunks))
+
+        # Assert
+        self.assertEqual(metadata, 'TEST FILE')
+        self.assertEqual(332, len(streamed_feature_collection['features']), 'Valid file should have 332 features')
+
     def test_can_retrieve_metadata_from_filename(self):
         # Arrange
         filename = 'pplnneed2_lx_20180125_200059.csv'
@@ -0,0 +1,51 @@
+import gzip
+import tempfile
+import unittest
+
+from server.services.cache.compression import cache_compressed_variants, choose_encoding, get_encodings, \
+    stream_variant
+from server.services.cache.shared_cache import SharedCache
+
+
+class TestCompression(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache = SharedCache('test', cache_dir=self.temp_dir.name)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_encoding_chosen_from_accept_encoding(self):
+        # Act / Assert
+        self.assertEqual(choose_encoding('gzip, deflate'), 'gzip')
+        self.assertEqual(choose_encoding('*'), get_encodings()[0])
+        self.assertIsNone(choose_encoding('gzip;q=0, identity'))
+        self.assertIsNone(choose_encoding(None))
+
+    def test_compressed_variant_streamed_for_encoding(self):
+        # Arrange
+        body = b'{"type": "FeatureCollection", "features": []}' * 100
+        self.cache.set('layer', body, data_id=1)
+
+        # Act
+        cache_compressed_variants(self.cache, 'layer')
+        metadata, chunks, encoding = stream_variant(self.cache, 'layer', 'gzip')
+
+        # Assert
+        self.assertEqual(encoding, 'gzip')
+        self.assertEqual(metadata['data_id'], 1)
+        self.assertEqual(gzip.decompress(b''.join(chunks)), body)
+
+    def test_stale_variant_not_streamed(self):
+        # Arrange
+        self.cache.set('layer', b'old', data_id=1)
+        cache_compressed_variants(self.cache, 'layer')
+        self.cache.set('layer', b'new', data_id=2)
+
+        # Act
+        metadata, chunks, encoding = stream_variant(self.cache, 'layer', 'gzip')
+
+        # Assert
+        self.assertIsNone(encoding, 'Variant of the old body should not be served')
+        self.assertEqual(b''.join(chunks), b'new')
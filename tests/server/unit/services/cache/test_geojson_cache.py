@@ -0,0 +1,48 @@
+import os
+import unittest
+from unittest.mock import patch
+
+from flask import Flask
+
+from server.services.cache.geojson_cache import GeoJSONCache
+
+
+class TestGeoJSONCache(unittest.TestCase):
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config.update(DMIS_SIMPLIFIED_ZOOMS=(6,), DMIS_DATA_VERSION_MAX_AGE=30)
+
+    @patch('server.services.cache.geojson_cache.cache_compressed_variants')
+    @patch('server.services.cache.geojson_cache.geojson_cache')
+    def test_projected_layer_simplified_with_metre_tolerances(self, mock_geojson_cache, mock_cache_compressed_variants):
+        # Arrange, the sample ArcGIS layer is in EPSG:3148, a UTM CRS
+        sample_path = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'test_files',
+                                   'sample_converted.geojson')
+        with open(sample_path) as sample_file:
+            sample_geojson = sample_file.read()
+
+        # Act
+        with self.app.app_context():
+            GeoJSONCache.cache_simplified_geojson('ktm_pcdm_affected_school', 1, sample_geojson)
+
+        # Assert
+        simplified_key, _ = mock_geojson_cache.set.call_args[0]
+        self.assertEqual(simplified_key, 'ktm_pcdm_affected_school.z6')
+        self.assertAlmostEqual(mock_geojson_cache.set.call_args[1]['tolerance'], 2445.98, places=2)
+
+    @patch('server.services.cache.geojson_cache.DMISData.get_latest_data_id_for_source')
+    @patch('server.services.cache.geojson_cache.data_version_cache')
+    def test_version_without_data_id_rechecked_against_db(self, mock_data_version_cache, mock_get_latest_data_id):
+        # Arrange, as written by an older release
+        mock_data_version_cache.get_metadata.return_value = {'updated': 1}
+        mock_data_version_cache.age.return_value = 1
+        mock_get_latest_data_id.return_value = 5
+
+        # Act
+        with self.app.app_context():
+            data_version = GeoJSONCache.get_data_version('river-gauge')
+
+        # Assert
+        self.assertEqual(data_version, 5)
+        mock_data_version_cache.set.assert_called_once_with('river-gauge', b'', data_id=5)
@@ -0,0 +1,59 @@
+import tempfile
+import unittest
+
+from server.services.cache.layer_list_cache import LayerListCache
+
+
+class TestLayerListCache(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.layer_list_cache = LayerListCache(cache_dir=self.temp_dir.name, max_age=60)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_cached_list_served_until_invalidated(self):
+        # Arrange
+        version = self.layer_list_cache.get_version()
+        self.layer_list_cache.set('en', version, b'{"layers": []}')
+
+        # Act
+        cached_before = self.layer_list_cache.get('en', self.layer_list_cache.get_version())
+        LayerListCache(cache_dir=self.temp_dir.name).invalidate()  # As another worker would
+        cached_after = self.layer_list_cache.get('en', self.layer_list_cache.get_version())
+
+        # Assert
+        self.assertEqual(cached_before, b'{"layers": []}')
+        self.assertIsNone(cached_after)
+        self.assertGreater(self.layer_list_cache.get_version(), version)
+
+    def test_cached_list_not_served_once_older_than_max_age(self):
+        # Arrange, changes made on another host don't bump this host's version
+        version = self.layer_list_cache.get_version()
+        self.layer_list_cache.set('en', version, b'{"layers": []}')
+
+        # Act
+        expired_list = LayerListCache(cache_dir=self.temp_dir.name, max_age=0).get('en', version)
+
+        # Assert
+        self.assertIsNone(expired_list)
+        self.assertEqual(self.layer_list_cache.get('en', version), b'{"layers": []}')
+
+    def test_locales_cached_separately(self):
+        # Arrange
+        version = self.layer_list_cache.get_version()
+
+        # Act
+        self.layer_list_cache.set('en', version, b'en')
+        self.layer_list_cache.set(None, version, b'all')
+
+        # Assert
+        self.assertEqual(self.layer_list_cache.get('en', version), b'en')
+        self.assertEqual(self.layer_list_cache.get(None, version), b'all')
+        self.assertIsNone(self.layer_list_cache.get('km', version))
+
+    def test_unbounded_accept_language_not_cached(self):
+        # Act / Assert
+        self.assertIsNone(LayerListCache.get_key('en-GB,en;q=0.9'))
+        self.assertEqual(LayerListCache.get_key('en-GB'), 'layers.en-GB')
@@ -0,0 +1,40 @@
+import tempfile
+import unittest
+
+from server.services.cache.shared_cache import SharedCache
+
+
+class TestSharedCache(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache = SharedCache('test', cache_dir=self.temp_dir.name)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_missing_key_returns_none(self):
+        # Act
+        entry = self.cache.get('missing')
+
+        # Assert
+        self.assertIsNone(entry)
+
+    def test_cached_body_and_metadata_are_returned(self):
+        # Arrange
+        self.cache.set('lightning', b'{"type": "FeatureCollection"}', last_updated='25-Jan-2018 20:00:59')
+
+        # Act
+        entry = self.cache.get('lightning')
+
+        # Assert
+        self.assertEqual(entry.body, b'{"type": "FeatureCollection"}')
+        self.assertEqual(entry.metadata['last_updated'], '25-Jan-2018 20:00:59')
+        self.assertLess(entry.age, 5)
+
+    def test_lock_is_single_flight(self):
+        # Act / Assert
+        with self.cache.lock('lightning') as first_acquired:
+            with self.cache.lock('lightning', blocking=False) as second_acquired:
+                self.assertTrue(first_acquired)
+                self.assertFalse(second_acquired, 'Lock should not be acquired while already held')
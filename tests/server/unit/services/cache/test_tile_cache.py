@@ -0,0 +1,116 @@
+import os
+import tempfile
+import time
+import unittest
+
+from server.services.cache.tile_cache import VectorTileCache, WMSTileCache
+
+
+class TestWMSTileCache(unittest.TestCase):
+
+    get_map_query = 'SERVICE=WMS&REQUEST=GetMap&VERSION=1.1.1&LAYERS=dmis:rivers&STYLES=&FORMAT=image/png' \
+                    '&SRS=EPSG:3857&BBOX=0,0,10,10&WIDTH=256&HEIGHT=256'
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.tile_cache = WMSTileCache(cache_dir=self.temp_dir.name, memory_bytes=10, disk_bytes=1024, prune_seconds=60)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_equivalent_get_map_requests_share_cache_key(self):
+        # Arrange
+        equivalent_query = 'height=256&width=256&bbox=0.0,0.0,10.0,10.0&srs=epsg:3857&format=IMAGE/PNG' \
+                           '&layers=dmis:rivers&request=getmap&service=WMS&version=1.1.1'
+
+        # Act
+        cache_key, layers = WMSTileCache.get_cache_key(self.get_map_query)
+        equivalent_key, _ = WMSTileCache.get_cache_key(equivalent_query)
+
+        # Assert
+        self.assertEqual(cache_key, equivalent_key)
+        self.assertEqual(layers, ['dmis:rivers'])
+        self.assertNotEqual(cache_key, WMSTileCache.get_cache_key(self.get_map_query.replace('BBOX=0', 'BBOX=1'))[0])
+
+    def test_non_get_map_requests_are_not_cached(self):
+        # Act / Assert
+        self.assertIsNone(WMSTileCache.get_cache_key(self.get_map_query.replace('GetMap', 'GetFeatureInfo')))
+
+    def test_least_recently_used_tile_evicted_from_memory(self):
+        # Arrange
+        self.tile_cache.set('first', b'12345', 'image/png')
+        self.tile_cache.set('second', b'12345', 'image/png')
+        self.tile_cache.get('first', ttl=60)
+
+        # Act
+        self.tile_cache.set('third', b'12345', 'image/png')
+
+        # Assert
+        self.assertEqual(list(self.tile_cache._memory_cache), ['first', 'third'])
+        self.assertEqual(self.tile_cache.get('second', ttl=60).body, b'12345', 'Evicted tile should be read from disk')
+
+    def test_expired_tile_not_returned(self):
+        # Arrange
+        self.tile_cache.set('tile', b'12345', 'image/png')
+
+        # Act / Assert
+        self.assertIsNotNone(self.tile_cache.get('tile', ttl=60))
+        self.assertIsNone(self.tile_cache.get('tile', ttl=0))
+
+    def test_expired_and_oldest_tiles_pruned_from_disk(self):
+        # Arrange, tiles written an hour, a minute and a second ago
+        for key, age in (('expired', 3600), ('oldest', 60), ('newest', 1)):
+            self.tile_cache.set(key, b'12345', 'image/png')
+            entry_path = self.tile_cache.disk_cache._entry_path(key)
+            os.utime(entry_path, (time.time() - age, time.time() - age))
+        self.tile_cache._disk_bytes = os.path.getsize(entry_path)  # Room for one tile
+
+        # Act
+        removed = self.tile_cache.prune_disk(max_age=600)
+
+        # Assert
+        self.assertEqual(removed, 2)
+        self.assertEqual([key for key, _, _ in self.tile_cache.disk_cache.list_entries() if key != 'last_pruned'],
+                         ['newest'])
+
+
+class TestVectorTileCache(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.tile_cache = VectorTileCache(cache_dir=self.temp_dir.name, max_zoom=16, max_age=600, disk_bytes=1024,
+                                          prune_seconds=60)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_tile_only_returned_for_same_data_version(self):
+        # Arrange
+        self.tile_cache.set('rivers', 1, 10, 5, 5, b'tile')
+
+        # Act / Assert
+        self.assertEqual(self.tile_cache.get('rivers', 1, 10, 5, 5), b'tile')
+        self.assertIsNone(self.tile_cache.get('rivers', 2, 10, 5, 5))
+
+    def test_empty_and_deep_tiles_not_cached(self):
+        # Act
+        self.tile_cache.set('rivers', 1, 10, 5, 5, b'')
+        self.tile_cache.set('rivers', 1, 17, 5, 5, b'tile')
+
+        # Assert
+        self.assertIsNone(self.tile_cache.get('rivers', 1, 10, 5, 5))
+        self.assertIsNone(self.tile_cache.get('rivers', 1, 17, 5, 5))
+        self.assertEqual([key for key, _, _ in self.tile_cache.disk_cache.list_entries() if key != 'last_pruned'], [])
+
+    def test_expired_tiles_pruned_when_due(self):
+        # Arrange, a tile written an hour ago and a prune last run two minutes ago
+        self.tile_cache.set('rivers', 1, 10, 5, 5, b'tile')
+        for key, age in (('rivers-10-5-5', 3600), ('last_pruned', 120)):
+            os.utime(self.tile_cache.disk_cache._entry_path(key), (time.time() - age, time.time() - age))
+
+        # Act
+        self.tile_cache.set('rivers', 1, 10, 6, 5, b'tile')
+
+        # Assert
+        self.assertIsNone(self.tile_cache.get('rivers', 1, 10, 5, 5))
+        self.assertEqual(self.tile_cache.get('rivers', 1, 10, 6, 5), b'tile')
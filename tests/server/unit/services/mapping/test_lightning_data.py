@@ -0,0 +1,103 @@
+import json
+import os
+import tempfile
+import unittest
+
+from pathlib import Path
+
+import numpy as np
+
+from server.services.mapping.lightning_data import LightningData, LightningDataError
+
+
+class TestLightningData(unittest.TestCase):
+
+    weather_dir = os.path.join(Path(__file__).parents[5], 'weather')
+
+    def test_lightning_file_parsed_into_typed_columns(self):
+        # Arrange
+        lightning_file = os.path.join(self.weather_dir, 'test_lightning.csv')
+
+        # Act
+        lightning_data = LightningData.from_csv(lightning_file)
+
+        # Assert
+        self.assertEqual(332, len(lightning_data), 'Valid file should have 332 bolts')
+        self.assertEqual(lightning_data.times.dtype, np.dtype('datetime64[ns]'))
+        self.assertEqual(lightning_data.latitudes[0], 12.29893)
+        self.assertEqual(lightning_data.longitudes[0], 103.45103)
+        self.assertEqual(lightning_data.amplitudes[0], -2484)
+
+    def test_lightning_data_encoded_as_feature_collection(self):
+        # Arrange
+        lightning_data = LightningData.from_csv(os.path.join(self.weather_dir, 'test_lightning.csv'))
+
+        # Act
+        feature_collection = json.loads(''.join(lightning_data.iter_geojson(batch_size=100)))
+
+        # Assert
+        self.assertEqual(332, len(feature_collection['features']))
+        self.assertEqual(feature_collection['features'][0]['geometry']['coordinates'], [103.45103, 12.29893])
+        self.assertEqual(feature_collection['features'][0]['properties']['lightningTime'],
+                         '2017-08-08T08:08:58.102504442')
+
+    def test_slice_by_time_returns_bolts_in_window(self):
+        # Arrange
+        lightning_data = LightningData.from_csv(os.path.join(self.weather_dir, 'test_lightning.csv')).sort_by_time()
+        window_start = np.datetime64('2017-08-08T08:05:00')
+        window_end = np.datetime64('2017-08-08T08:08:00')
+
+        # Act
+        window = lightning_data.slice_by_time(window_start, window_end)
+
+        # Assert
+        expected_count = int(((lightning_data.times >= window_start) & (lightning_data.times < window_end)).sum())
+        self.assertGreater(expected_count, 0)
+        self.assertEqual(len(window), expected_count)
+        self.assertTrue((window.times[1:] >= window.times[:-1]).all(), 'Window should be sorted by time')
+        self.assertEqual(len(json.loads(''.join(window.iter_geojson()))['features']), expected_count)
+
+    def test_invalid_coordinates_raises_error(self):
+        # Arrange
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write('"LightningTime","Latitude","Longitude","FlashType","Amplitude"\n')
+            f.write('2017-08-08T08:08:58.102504442,12.29893,103.45103,1,-2484\n')
+            f.write('2017-08-08T08:09:00.692404345,95.27681,103.44116,1,3093\n')
+
+        # Act / Assert
+        try:
+            with self.assertRaises(LightningDataError):
+                LightningData.from_csv(f.name)
+        finally:
+            os.remove(f.name)
+
+    def test_blank_lines_and_crlf_ignored(self):
+        # Arrange
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, newline='') as f:
+            f.write('"LightningTime","Latitude","Longitude","FlashType","Amplitude"\r\n')
+            f.write('2017-08-08T08:08:58.102504442,12.29893,103.45103,1,-2484\r\n')
+            f.write('\r\n  \r\n')
+            f.write('2017-08-08T08:09:00.692404345,12.27681,103.44116,1,3093\r\n\r\n')
+
+        # Act
+        try:
+            lightning_data = LightningData.from_csv(f.name)
+        finally:
+            os.remove(f.name)
+
+        # Assert
+        self.assertEqual(2, len(lightning_data))
+        self.assertEqual(lightning_data.time_text[1], '2017-08-08T08:09:00.692404345')
+        self.assertEqual(lightning_data.amplitudes.tolist(), [-2484, 3093])
+
+    def test_lightning_time_escaped_in_geojson(self):
+        # Arrange
+        lightning_data = LightningData(['2017-08-08\\T08:08:58'], ['12.29893'], ['103.45103'], np.array([12.29893]),
+                                       np.array([103.45103]), np.array([1], dtype=np.int8),
+                                       np.array([-2484], dtype=np.int32))
+
+        # Act
+        feature_collection = json.loads(''.join(lightning_data.iter_geojson()))
+
+        # Assert
+        self.assertEqual(feature_collection['features'][0]['properties']['lightningTime'], '2017-08-08\\T08:08:58')
@@ -1,4 +1,11 @@
+import json
+import os
 import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from flask import Flask
+from werkzeug.datastructures import Headers
 
 from server.services.mapping.map_service import MapService, MapServiceClientError
 
@@ -29,4 +36,156 @@ class TestMapService(unittest.TestCase):
 
         # Act / Assert
         with self.assertRaises(MapServiceClientError):
-            MapService.handle_geojson_request(bad_query)
\ No newline at end of file
+            MapService.handle_geojson_request(bad_query)
+
+    def test_lightning_since_parsed_as_utc(self):
+        # Arrange
+        test_query = 'layerSource=earthnetworks_lightning&since=2018-01-25T21:00:59%2B01:00'
+
+        # Act
+        lightning_since = MapService.parse_lightning_since(test_query)
+
+        # Assert
+        self.assertEqual(lightning_since, datetime(2018, 1, 25, 20, 0, 59))
+
+    def test_lightning_window_parsed_as_minutes_before_now(self):
+        # Arrange
+        test_query = 'layerSource=earthnetworks_lightning&window=10'
+
+        # Act
+        lightning_since = MapService.parse_lightning_since(test_query)
+
+        # Assert
+        expected_since = datetime.utcnow() - timedelta(minutes=10)
+        self.assertAlmostEqual(lightning_since.timestamp(), expected_since.timestamp(), delta=5)
+
+    def test_no_lightning_filter_returns_none(self):
+        # Act / Assert
+        self.assertIsNone(MapService.parse_lightning_since('layerSource=earthnetworks_lightning'))
+
+    def test_invalid_lightning_window_raises_error(self):
+        # Act / Assert
+        with self.assertRaises(MapServiceClientError):
+            MapService.parse_lightning_since('layerSource=earthnetworks_lightning&window=tenminutes')
+
+    def test_bbox_parsed_from_query_string(self):
+        # Arrange
+        test_query = 'layerSource=earthnetworks_lightning&bbox=102.5,10.4,107.6,14.7'
+
+        # Act
+        bbox = MapService.parse_bbox(test_query)
+
+        # Assert
+        self.assertEqual(bbox, (102.5, 10.4, 107.6, 14.7))
+
+    def test_invalid_bbox_raises_error(self):
+        # Act / Assert
+        with self.assertRaises(MapServiceClientError):
+            MapService.parse_bbox('layerSource=earthnetworks_lightning&bbox=107.6,14.7,102.5,10.4')
+
+    def test_property_filters_parsed_from_query_string(self):
+        # Arrange
+        test_query = 'layerSource=ktm_pcdm_at_risk_commune&filter=PROVINCE:Kratie&filter=RISK:High:Flood'
+
+        # Act
+        property_filters = MapService.parse_property_filters(test_query)
+
+        # Assert
+        self.assertEqual(property_filters, {'PROVINCE': 'Kratie', 'RISK': 'High:Flood'})
+
+    def test_invalid_property_filter_raises_error(self):
+        # Act / Assert
+        with self.assertRaises(MapServiceClientError):
+            MapService.parse_property_filters('layerSource=ktm_pcdm_at_risk_commune&filter=PROVINCE')
+
+    def test_batch_layer_sources_parsed_without_repeats(self):
+        # Arrange
+        test_query = 'layerSources=ktm_pcdm_at_risk_commune,River-Gauge,ktm_pcdm_at_risk_commune'
+
+        # Act
+        layer_sources = MapService.parse_geojson_batch_request(test_query)
+
+        # Assert
+        self.assertEqual(layer_sources, ['ktm_pcdm_at_risk_commune', 'river-gauge'])
+
+    def test_batch_without_layer_sources_raises_error(self):
+        # Act / Assert
+        with self.assertRaises(MapServiceClientError):
+            MapService.parse_geojson_batch_request('layerSources=,')
+
+    @patch('server.services.mapping.map_service.stream_variant')
+    @patch('server.services.mapping.map_service.GeoJSONCache.ensure_geojson_cached')
+    def test_batch_streams_each_cached_source(self, mock_ensure_geojson_cached, mock_stream_variant):
+        # Arrange
+        cached_bodies = {'ktm_pcdm_at_risk_commune': [b'{"type": "Feature', b'Collection", "features": []}'],
+                         'river-gauge': [b'[{"gauge": 1}]']}
+        mock_stream_variant.side_effect = lambda cache, key, encoding: ({'data_id': 3}, iter(cached_bodies[key]), None)
+
+        # Act
+        batch_body = b''.join(MapService.stream_geojson_batch(['river-gauge', 'ktm_pcdm_at_risk_commune'],
+                                                              {'river-gauge': 3, 'ktm_pcdm_at_risk_commune': 3}))
+
+        # Assert
+        self.assertEqual(json.loads(batch_body.decode('utf-8')), {
+            'river-gauge': [{'gauge': 1}],
+            'ktm_pcdm_at_risk_commune': {'type': 'FeatureCollection', 'features': []}})
+        self.assertEqual(list(json.loads(batch_body.decode('utf-8'))), ['river-gauge', 'ktm_pcdm_at_risk_commune'])
+        mock_ensure_geojson_cached.assert_any_call('river-gauge', 3)
+
+    @patch('server.services.mapping.map_service.geojson_cache')
+    @patch('server.services.mapping.map_service.GeoJSONCache.ensure_geojson_cached')
+    @patch('server.services.mapping.map_service.GeoJSONCache.get_data_version')
+    def test_zoom_for_layer_without_simplified_versions_raises_error(self, mock_get_data_version,
+                                                                      mock_ensure_geojson_cached, mock_geojson_cache):
+        # Arrange
+        app = Flask(__name__)
+        app.config.update(DMIS_SIMPLIFIED_ZOOMS=(6, 9, 12))
+        mock_get_data_version.return_value = 1
+        mock_geojson_cache.get_metadata.return_value = None
+
+        # Act / Assert
+        with app.app_context(), self.assertRaises(MapServiceClientError):
+            MapService.get_simplified_zoom('river-gauge', 'layerSource=river-gauge&zoom=8')
+
+    @patch('server.services.mapping.map_service.DMISFeature.get_feature_collection')
+    @patch('server.services.mapping.map_service.DMISData.get_latest_json_data_for_source')
+    def test_projected_layer_transformed_to_web_mercator_for_vector_tiles(self, mock_get_latest_json,
+                                                                          mock_get_feature_collection):
+        # Arrange, the sample ArcGIS layer is in EPSG:3148, a UTM CRS
+        mock_get_latest_json.return_value = self._get_sample_geojson()
+        mock_get_feature_collection.return_value = json.dumps({
+            'type': 'FeatureCollection', 'crs': {'type': 'name', 'properties': {'name': 'EPSG:3857'}},
+            'features': [{'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [11715433.0, 1466510.0]},
+                          'properties': {'SCHOOL_NAM': 'Chheu Teal'}}]})
+        MapService._vector_tile_layers.pop('ktm_pcdm_affected_school', None)
+
+        # Act
+        vector_tile_layer = MapService.get_vector_tile_layer('ktm_pcdm_affected_school', 1)
+
+        # Assert
+        mock_get_feature_collection.assert_called_once_with('ktm_pcdm_affected_school', srid=3857)
+        self.assertTrue(vector_tile_layer.encode_tile(8, 202, 118), 'Tile holding the school should not be empty')
+        self.assertEqual(vector_tile_layer.encode_tile(8, 0, 0), b'')
+
+    def test_matching_etag_is_not_modified(self):
+        # Arrange
+        request_headers = Headers({'If-None-Match': '"older", "current"'})
+
+        # Act / Assert
+        self.assertTrue(MapService.is_not_modified(request_headers, 'current', None))
+        self.assertFalse(MapService.is_not_modified(request_headers, 'newer', None))
+
+    def test_unchanged_since_last_modified_is_not_modified(self):
+        # Arrange
+        request_headers = Headers({'If-Modified-Since': '25-Jan-2018 20:00:59'})
+
+        # Act / Assert
+        self.assertTrue(MapService.is_not_modified(request_headers, 'current', '25-Jan-2018 20:00:59'))
+        self.assertFalse(MapService.is_not_modified(request_headers, 'current', '25-Jan-2018 20:05:59'))
+
+    @staticmethod
+    def _get_sample_geojson() -> str:
+        sample_path = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'test_files',
+                                   'sample_converted.geojson')
+        with open(sample_path) as sample_file:
+            return sample_file.read()
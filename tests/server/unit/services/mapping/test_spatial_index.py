@@ -0,0 +1,48 @@
+import json
+import os
+import unittest
+
+import numpy as np
+
+from server.services.mapping.spatial_index import FeatureIndex, PackedRTree, geometry_bounds
+
+
+class TestSpatialIndex(unittest.TestCase):
+
+    def test_rtree_search_matches_brute_force(self):
+        # Arrange
+        random = np.random.RandomState(42)
+        min_x, min_y = random.uniform(0, 100, 5000), random.uniform(0, 100, 5000)
+        max_x, max_y = min_x + random.uniform(0, 2, 5000), min_y + random.uniform(0, 2, 5000)
+        rtree = PackedRTree(min_x, min_y, max_x, max_y)
+        bbox = (20, 30, 35, 40)
+
+        # Act
+        found = rtree.search(bbox)
+
+        # Assert
+        expected = np.nonzero((min_x <= 35) & (max_x >= 20) & (min_y <= 40) & (max_y >= 30))[0]
+        np.testing.assert_array_equal(found, expected)
+
+    def test_empty_geometry_has_nan_bounds(self):
+        # Act
+        bounds = geometry_bounds({'type': 'Point', 'coordinates': []})
+
+        # Assert
+        self.assertTrue(np.isnan(bounds).all())
+
+    def test_feature_index_only_returns_features_in_bbox(self):
+        # Arrange
+        geojson_file = os.path.join(os.path.dirname(__file__), '..', 'test_files', 'sample_converted.geojson')
+        with open(geojson_file, encoding='utf-8') as f:
+            feature_collection = json.load(f)
+
+        feature_index = FeatureIndex(feature_collection)
+        first_bounds = geometry_bounds(feature_collection['features'][0]['geometry'])
+
+        # Act
+        filtered_collection = json.loads(feature_index.filter_bbox(first_bounds))
+
+        # Assert
+        self.assertIn(feature_collection['features'][0], filtered_collection['features'])
+        self.assertEqual(filtered_collection['crs'], feature_collection['crs'])
@@ -0,0 +1,46 @@
+import unittest
+
+from server.services.mapping.vector_tile import HALF_WORLD, TILE_EXTENT, VectorTileLayer, _clip_line, \
+    _clip_polygon, _ring_area, get_tile_bounds
+
+
+class TestVectorTile(unittest.TestCase):
+
+    clip_box = (0, 0, TILE_EXTENT, TILE_EXTENT)
+
+    def test_tile_bounds_cover_web_mercator_world(self):
+        # Act / Assert
+        self.assertEqual(get_tile_bounds(0, 0, 0), (-HALF_WORLD, -HALF_WORLD, HALF_WORLD, HALF_WORLD))
+        self.assertEqual(get_tile_bounds(1, 1, 0), (0, 0, HALF_WORLD, HALF_WORLD))
+
+    def test_polygon_clipped_and_oriented(self):
+        # Arrange, anticlockwise exterior with a clockwise hole, partly outside the tile
+        polygon = [[(-100, -100), (-100, 200), (200, 200), (200, -100), (-100, -100)],
+                   [(50, 50), (100, 50), (100, 100), (50, 100), (50, 50)]]
+
+        # Act
+        exterior, hole = _clip_polygon(polygon, self.clip_box)
+
+        # Assert
+        self.assertEqual(sorted(exterior), [(0, 0), (0, 200), (200, 0), (200, 200)])
+        self.assertGreater(_ring_area(exterior), 0, 'Exterior ring should have positive area')
+        self.assertLess(_ring_area(hole), 0, 'Hole should have negative area')
+
+    def test_line_leaving_and_reentering_tile_split_into_parts(self):
+        # Arrange
+        line = [(100, 100), (100, -100), (200, -100), (200, 100)]
+
+        # Act
+        parts = _clip_line(line, self.clip_box)
+
+        # Assert
+        self.assertEqual(parts, [[(100, 100), (100, 0)], [(200, 0), (200, 100)]])
+
+    def test_tile_without_features_is_empty(self):
+        # Arrange
+        layer = VectorTileLayer('test', {'type': 'FeatureCollection', 'features': [
+            {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [104.9, 11.55]}, 'properties': {}}]})
+
+        # Act / Assert
+        self.assertGreater(len(layer.encode_tile(0, 0, 0)), 0)
+        self.assertEqual(layer.encode_tile(1, 0, 0), b'', 'Point is in the north east tile')
@@ -0,0 +1,125 @@
+import copy
+import unittest
+from unittest.mock import patch
+
+from hypothesis import given, settings, strategies as st
+
+from server.services.data_ingest.arcgis2geojson import PythonKernels, arrayIntersectsArray, closeRing, \
+    coordinatesContainCoordinates, convertRingsToGeoJSON, getKernels, ringIsClockwise
+from server.services.data_ingest.geometry_kernels import NumpyKernels
+
+
+def convert_rings_unindexed(rings):
+    """ The original convertRingsToGeoJSON, testing every outer ring against every hole without any prefilters """
+    outerRings = []
+    holes = []
+    for ring in rings:
+        ring = closeRing(ring)
+        if len(ring) < 4:
+            continue
+        if ringIsClockwise(ring):
+            outerRings.append([ring])
+        else:
+            holes.append(ring)
+
+    uncontainedHoles = []
+    while len(holes):
+        hole = holes.pop()
+        for outerRing in reversed(outerRings):
+            if coordinatesContainCoordinates(outerRing[0], hole):
+                outerRing.append(hole)
+                break
+        else:
+            uncontainedHoles.append(hole)
+
+    while len(uncontainedHoles):
+        hole = uncontainedHoles.pop()
+        for outerRing in reversed(outerRings):
+            if arrayIntersectsArray(outerRing[0], hole):
+                outerRing.append(hole)
+                break
+        else:
+            outerRings.append([hole[::-1]])
+
+    if len(outerRings) == 1:
+        return {'type': 'Polygon', 'coordinates': outerRings[0]}
+    return {'type': 'MultiPolygon', 'coordinates': outerRings}
+
+
+# Small grids make touching, overlapping and nested rings likely, floats exercise rounding at the bounds
+coordinates = st.one_of(st.integers(min_value=-5, max_value=5),
+                        st.floats(min_value=-5, max_value=5, allow_nan=False, allow_infinity=False))
+points = st.lists(coordinates, min_size=2, max_size=2)
+rings = st.lists(points, min_size=3, max_size=8)
+
+
+def square(x, y, size, clockwise):
+    ring = [[x, y], [x, y + size], [x + size, y + size], [x + size, y], [x, y]]
+    return ring if clockwise else ring[::-1]
+
+
+class TestArcGIS2GeoJSON(unittest.TestCase):
+
+    @settings(max_examples=500, deadline=None)
+    @given(st.lists(rings, min_size=1, max_size=6))
+    def test_indexed_rings_match_unindexed(self, arcgis_rings):
+        # Arrange
+        expected = convert_rings_unindexed(copy.deepcopy(arcgis_rings))
+
+        # Act
+        converted = convertRingsToGeoJSON(copy.deepcopy(arcgis_rings), 'python')
+
+        # Assert
+        self.assertEqual(converted, expected)
+
+    @settings(max_examples=500, deadline=None)
+    @given(st.lists(rings, min_size=1, max_size=6))
+    def test_numpy_backend_matches_python(self, arcgis_rings):
+        # Arrange
+        expected = convertRingsToGeoJSON(copy.deepcopy(arcgis_rings), 'python')
+
+        # Act
+        converted = convertRingsToGeoJSON(copy.deepcopy(arcgis_rings), 'numpy')
+
+        # Assert
+        self.assertEqual(converted, expected)
+
+    def test_numpy_backend_used_for_large_polygons_with_holes(self):
+        # Arrange
+        outer = square(0, 0, 100, True)
+        hole = square(10, 10, 10, False)
+        large_outer = outer[:1] + [[0, y] for y in range(1, 100)] + outer[1:]
+
+        # Act
+        small_kernels = getKernels([outer, hole])
+        large_kernels = getKernels([large_outer, hole])
+        single_ring_kernels = getKernels([large_outer])
+
+        # Assert
+        self.assertIs(small_kernels, PythonKernels)
+        self.assertIs(large_kernels, NumpyKernels)
+        self.assertIs(single_ring_kernels, PythonKernels)
+
+    @patch('server.services.data_ingest.arcgis2geojson.loadNumpyKernels', return_value=None)
+    def test_falls_back_to_python_without_numpy(self, mock_load):
+        # Act
+        kernels = getKernels([square(0, 0, 10, True)], 'numpy')
+
+        # Assert
+        self.assertIs(kernels, PythonKernels)
+
+    def test_holes_assigned_to_containing_outer_ring(self):
+        # Arrange
+        arcgis_rings = [square(0, 0, 10, True), square(20, 0, 10, True), square(22, 2, 2, False),
+                        square(2, 2, 2, False), square(8, 8, 4, False)]
+
+        # Act
+        converted = convertRingsToGeoJSON(copy.deepcopy(arcgis_rings))
+
+        # Assert
+        self.assertEqual(converted, convert_rings_unindexed(copy.deepcopy(arcgis_rings)))
+        self.assertEqual(converted['type'], 'MultiPolygon')
+        first, second = converted['coordinates']
+        # The hole overlapping the edge is only matched by intersection, after the contained holes
+        self.assertEqual(first, [square(0, 0, 10, True), square(2, 2, 2, False), square(8, 8, 4, False)])
+        self.assertEqual(second, [square(20, 0, 10, True), square(22, 2, 2, False)])
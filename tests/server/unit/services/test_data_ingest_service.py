@@ -1,7 +1,14 @@
+import io
+import re
 import unittest
 import os
 import json
-from server.services.data_ingest.data_ingest_service import DataIngestService
+
+from flask import Flask
+
+from server.models.postgis.dmis_feature import DMISFeature
+from server.services.data_ingest.data_ingest_service import DataIngestService, DataIngestError, \
+    convert_arcgis_features
 
 
 class TestDataIngestService(unittest.TestCase):
@@ -12,11 +19,104 @@ class TestDataIngestService(unittest.TestCase):
         sample_converted_geojson = self._get_json_file('sample_converted.geojson')
 
         # Act
-        actual_converted_geojson = DataIngestService._process_arcgis_json(arcgis_data)
+        actual_converted_geojson = self._convert_to_geojson(self._as_stream(arcgis_data))
 
         # Assert
         self.assertDictEqual(sample_converted_geojson, actual_converted_geojson, "GeoJSON data different from expected")
 
+    def test_parallel_conversion_keeps_feature_order(self):
+        # Arrange
+        arcgis_data = self._get_json_file('sample_arcgis.json')
+        expected_features, _ = convert_arcgis_features(arcgis_data['features'])
+        app = Flask(__name__)
+        app.config.update(ARCGIS_PARALLEL_THRESHOLD=1, ARCGIS_PARALLEL_CHUNK_SIZE=2, ARCGIS_PARALLEL_PROCESSES=2)
+
+        # Act
+        with app.app_context():
+            actual_converted_geojson = self._convert_to_geojson(self._as_stream(arcgis_data))
+
+        # Assert
+        self.assertEqual(actual_converted_geojson['features'], json.loads(json.dumps(expected_features)))
+
+    def test_unconvertible_features_reported(self):
+        # Arrange
+        arcgis_data = {'features': [{'geometry': {'x': 1, 'y': 2}, 'attributes': {'OBJECTID': 1}},
+                                    {'geometry': {'rings': None}, 'attributes': {'OBJECTID': 2}}]}
+
+        # Act / Assert
+        with self.assertRaisesRegex(DataIngestError, r'Unable to convert 1 of 2 features, feature 1 \(id 2\)'):
+            DataIngestService._write_arcgis_feature_rows(self._as_stream(arcgis_data), io.StringIO())
+
+    def test_spatial_reference_read_after_features(self):
+        # Arrange
+        arcgis_stream = io.BytesIO(b'{"features": [{"geometry": {"x": 1.5, "y": 2}, "attributes": {"OBJECTID": 1}}], '
+                                   b'"spatialReference": {"wkid": 32648, "latestWkid": 32648}}')
+
+        # Act
+        actual_converted_geojson = self._convert_to_geojson(arcgis_stream)
+
+        # Assert
+        self.assertEqual(actual_converted_geojson['crs']['properties']['name'], 'EPSG:32648')
+        self.assertEqual(actual_converted_geojson['features'][0]['geometry']['coordinates'], [1.5, 2])
+
+    def test_feature_rows_keyed_on_object_id(self):
+        # Arrange
+        arcgis_stream = io.BytesIO(b'{"spatialReference": {"wkid": 3857}, "features": ['
+                                   b'{"geometry": {"x": 1.5, "y": 2}, "attributes": {"OBJECTID": 7, "NAME": "A\\\\B"}},'
+                                   b'{"geometry": {"x": 3, "y": 4}, "attributes": {"OBJECTID": 7, "NAME": "C"}}, '
+                                   b'{"attributes": {"NAME": "D"}}]}')
+        feature_rows = io.StringIO()
+
+        # Act
+        wkid = DataIngestService._write_arcgis_feature_rows(arcgis_stream, feature_rows)
+
+        # Assert
+        rows = [row.split('\t') for row in feature_rows.getvalue().splitlines()]
+        self.assertEqual(wkid, 3857)
+        self.assertEqual([row[0] for row in rows], ['7', '7#1', '#2'])
+        self.assertEqual(rows[0][3:], ['{"OBJECTID": 7, "NAME": "A\\\\\\\\B"}',
+                                       '{"type": "Point", "coordinates": [1.5, 2]}'])
+        self.assertEqual(rows[2][3:], ['{"NAME": "D"}', '\\N'])
+
+    def test_feature_rows_hash_changes_with_content(self):
+        # Arrange
+        unchanged_row = DMISFeature.get_copy_row('7', 0, '{"NAME": "A"}', '{"type": "Point", "coordinates": [1, 2]}')
+
+        # Act
+        moved_row = DMISFeature.get_copy_row('7', 3, '{"NAME": "A"}', '{"type": "Point", "coordinates": [1, 2]}')
+        updated_row = DMISFeature.get_copy_row('7', 0, '{"NAME": "B"}', '{"type": "Point", "coordinates": [1, 2]}')
+
+        # Assert
+        self.assertEqual(moved_row.split('\t')[1], unchanged_row.split('\t')[1])
+        self.assertNotEqual(updated_row.split('\t')[1], unchanged_row.split('\t')[1])
+
+    def test_invalid_json_reported(self):
+        # Act / Assert
+        with self.assertRaisesRegex(DataIngestError, 'Invalid JSON'):
+            DataIngestService._write_arcgis_feature_rows(io.BytesIO(b'{"features": [{"geometry": '), io.StringIO())
+
+    @staticmethod
+    def _convert_to_geojson(arcgis_stream) -> dict:
+        """ Converts the ArcGIS json as ingest does, and builds the FeatureCollection from the feature rows written """
+        feature_rows = io.StringIO()
+        wkid = DataIngestService._write_arcgis_feature_rows(arcgis_stream, feature_rows)
+
+        features = []
+        for row in feature_rows.getvalue().splitlines():
+            # COPY text format, see DMISFeature.get_copy_row
+            _, _, _, properties, geometry = (None if column == '\\N' else
+                                             re.sub(r'\\(.)', lambda m: {'t': '\t', 'n': '\n', 'r': '\r'}.get(
+                                                 m.group(1), m.group(1)), column)
+                                             for column in row.split('\t'))
+            features.append({'type': 'Feature', 'geometry': None if geometry is None else json.loads(geometry),
+                             'properties': json.loads(properties)})
+
+        return {'type': 'FeatureCollection', 'features': features, 'crs': DataIngestService._get_geojson_crs(wkid)}
+
+    @staticmethod
+    def _as_stream(json_data):
+        return io.BytesIO(json.dumps(json_data).encode('utf-8'))
+
     @staticmethod
     def _get_json_file(json_filename):
         """
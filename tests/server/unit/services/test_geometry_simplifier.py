@@ -0,0 +1,54 @@
+import unittest
+
+from server.services.data_ingest.geometry_simplifier import douglas_peucker, get_precision, \
+    simplify_feature_collection
+
+
+class TestGeometrySimplifier(unittest.TestCase):
+
+    @staticmethod
+    def polygon_feature(ring):
+        return {'type': 'Feature', 'geometry': {'type': 'Polygon', 'coordinates': [ring]}, 'properties': {}}
+
+    def test_douglas_peucker_drops_points_within_tolerance(self):
+        # Arrange
+        line = [(0, 0), (1, 0.01), (2, -0.01), (3, 5), (4, 6), (5, 7)]
+
+        # Act
+        simplified = douglas_peucker(line, 0.1)
+
+        # Assert
+        self.assertEqual(simplified, [(0, 0), (2, -0.01), (3, 5), (5, 7)])
+
+    def test_shared_boundary_simplified_identically(self):
+        # Arrange, two squares sharing a wiggly edge along x=0
+        shared_edge = [[0, 0], [0.001, 0.25], [-0.001, 0.5], [0.001, 0.75], [0, 1]]
+        left = [[-1, 0]] + shared_edge + [[-1, 1], [-1, 0]]
+        right = [[1, 0], [1, 1]] + shared_edge[::-1] + [[1, 0]]
+        feature_collection = {'type': 'FeatureCollection',
+                              'features': [self.polygon_feature(left), self.polygon_feature(right)]}
+
+        # Act
+        simplified = simplify_feature_collection(feature_collection, 0.01)
+
+        # Assert
+        left_ring, right_ring = (feature['geometry']['coordinates'][0] for feature in simplified['features'])
+        self.assertEqual({tuple(point) for point in left_ring if abs(point[0]) < 0.5},
+                         {tuple(point) for point in right_ring if abs(point[0]) < 0.5})
+        self.assertEqual(len(left_ring), 5, 'Wiggles within tolerance should be removed')
+
+    def test_small_ring_not_collapsed(self):
+        # Arrange
+        ring = [[0, 0], [0, 0.001], [0.001, 0.001], [0, 0]]
+        feature_collection = {'type': 'FeatureCollection', 'features': [self.polygon_feature(ring)]}
+
+        # Act
+        simplified = simplify_feature_collection(feature_collection, 1)
+
+        # Assert
+        self.assertEqual(simplified['features'][0]['geometry']['coordinates'][0], ring)
+
+    def test_precision_is_tenth_of_tolerance(self):
+        # Act / Assert
+        self.assertEqual(get_precision(0.022), 3)
+        self.assertEqual(get_precision(38), 0)
@@ -0,0 +1,99 @@
+import io
+import unittest
+from unittest.mock import MagicMock, patch
+
+from flask import Flask
+
+from server.services.data_ingest.data_ingest_service import DataIngestError
+from server.services.data_ingest.ingest_queue_service import IngestQueueService
+
+
+@patch('server.services.data_ingest.ingest_queue_service.db')
+@patch('server.services.data_ingest.ingest_queue_service.DataIngestService.process_data')
+@patch('server.services.data_ingest.ingest_queue_service.IngestJob.claim_next')
+class TestIngestQueueService(unittest.TestCase):
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config.update(INGEST_JOB_MAX_ATTEMPTS=3, INGEST_JOB_TIMEOUT_SECONDS=180,
+                               INGEST_JOB_HEARTBEAT_SECONDS=30)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+
+        self.job = MagicMock(job_id=1, data_source='river-gauge', attempts=1)
+        self.payload = io.BytesIO(b'{"level": 1.2}')
+        self.job.open_payload.return_value.__enter__.return_value = self.payload
+
+    def tearDown(self):
+        self.ctx.pop()
+
+    def test_job_completed_when_ingested(self, mock_claim_next, mock_process_data, mock_db):
+        # Arrange
+        mock_claim_next.return_value = self.job
+
+        # Act
+        processed = IngestQueueService.process_next_job()
+
+        # Assert
+        self.assertTrue(processed)
+        mock_process_data.assert_called_once_with('river-gauge', self.payload)
+        self.job.complete.assert_called_once_with()
+
+    def test_heartbeat_sent_while_job_processed(self, mock_claim_next, mock_process_data, mock_db):
+        # Arrange
+        mock_claim_next.return_value = self.job
+        keep_alive = self.job.keep_alive.return_value
+        mock_process_data.side_effect = lambda data_source, payload: keep_alive.__exit__.assert_not_called()
+
+        # Act
+        IngestQueueService.process_next_job()
+
+        # Assert
+        self.job.keep_alive.assert_called_once_with(30)
+        keep_alive.__exit__.assert_called_once()
+
+    def test_returns_false_when_queue_empty(self, mock_claim_next, mock_process_data, mock_db):
+        # Arrange
+        mock_claim_next.return_value = None
+
+        # Act / Assert
+        self.assertFalse(IngestQueueService.process_next_job())
+        mock_process_data.assert_not_called()
+
+    def test_job_with_bad_data_fails_without_retry(self, mock_claim_next, mock_process_data, mock_db):
+        # Arrange
+        mock_claim_next.return_value = self.job
+        mock_process_data.side_effect = DataIngestError('Unable to convert 1 of 2 features')
+
+        # Act
+        IngestQueueService.process_next_job()
+
+        # Assert
+        self.job.fail.assert_called_once_with('Unable to convert 1 of 2 features')
+        self.job.requeue.assert_not_called()
+
+    def test_job_requeued_after_unexpected_error(self, mock_claim_next, mock_process_data, mock_db):
+        # Arrange
+        mock_claim_next.return_value = self.job
+        mock_process_data.side_effect = ConnectionError('DB unavailable')
+
+        # Act
+        IngestQueueService.process_next_job()
+
+        # Assert
+        mock_db.session.rollback.assert_called_once_with()
+        self.job.requeue.assert_called_once_with()
+        self.job.fail.assert_not_called()
+
+    def test_job_failed_after_max_attempts(self, mock_claim_next, mock_process_data, mock_db):
+        # Arrange
+        self.job.attempts = 3
+        mock_claim_next.return_value = self.job
+        mock_process_data.side_effect = ConnectionError('DB unavailable')
+
+        # Act
+        IngestQueueService.process_next_job()
+
+        # Assert
+        self.job.fail.assert_called_once_with('Unhandled error: DB unavailable')
+        self.job.requeue.assert_not_called()